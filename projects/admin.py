@@ -1,8 +1,10 @@
 # projects/admin.py
 from django.contrib import admin
+from django.utils import timezone
 from .models import School, Project, Expense, SpendingLimit, Event, Document, Milestone
 from .models import Delegation
-from .models import Call, Notification
+from .models import Call, Notification, NotificationArchive, ExpenseRollup, OutboxEmail, Tag
+from .models import DeadlineReminder, UploadSession
 
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
@@ -16,6 +18,8 @@ class ProjectAdmin(admin.ModelAdmin):
     list_filter = ("program", "status", "school")
     search_fields = ("title", "cup", "cig")
     autocomplete_fields = ("school",)
+    # "spent" è mantenuto dai signals sulle Expense (vedi manage.py reconcile_spent)
+    readonly_fields = ("spent",)
 
 
 @admin.register(Expense)
@@ -28,6 +32,15 @@ class ExpenseAdmin(admin.ModelAdmin):
     ordering = ("-date", "-id")
 
 
+@admin.register(ExpenseRollup)
+class ExpenseRollupAdmin(admin.ModelAdmin):
+    """Totali calcolati: si ricostruiscono con manage.py rebuild_rollups."""
+    list_display = ("project", "category", "total", "count")
+    list_filter = ("category",)
+    search_fields = ("project__title",)
+    readonly_fields = ("project", "category", "total", "count")
+
+
 @admin.register(SpendingLimit)
 class SpendingLimitAdmin(admin.ModelAdmin):
     list_display = ("project", "category", "base", "percentage", "created_at", "note")
@@ -38,8 +51,9 @@ class SpendingLimitAdmin(admin.ModelAdmin):
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ("title", "date", "owner", "school", "project")
-    list_filter = ("school", "owner", "date")
+    list_display = ("title", "date", "repeat", "owner", "school", "project")
+    list_select_related = ("owner", "school", "project")
+    list_filter = ("school", "owner", "date", "repeat")
     search_fields = ("title", "description")
 
 
@@ -47,6 +61,7 @@ class EventAdmin(admin.ModelAdmin):
 class DelegationAdmin(admin.ModelAdmin):
     # ATTENZIONE: abbiamo sostituito "status" con "display_status"
     list_display = ("project", "collaborator", "role_label", "admin_status_display", "created_at")
+    list_select_related = ("project", "collaborator")
     list_filter = ("status",)
     search_fields = ("project__title", "collaborator__username", "role_label")
     readonly_fields = ("created_at",)
@@ -69,6 +84,7 @@ class DocumentAdmin(admin.ModelAdmin):
     - usiamo 'uploaded_at' (non 'created_at')
     """
     list_display = ("title", "project", "uploaded_by", "uploaded_at", "is_final")
+    list_select_related = ("project", "uploaded_by")
     list_filter = ("project", "uploaded_by", "is_final")
     search_fields = ("title", "project__title", "uploaded_by__username")
     readonly_fields = ("uploaded_at",)
@@ -77,13 +93,21 @@ class DocumentAdmin(admin.ModelAdmin):
 @admin.register(Call)
 class CallAdmin(admin.ModelAdmin):
     list_display = ("title", "program", "status", "deadline", "budget")
-    list_filter = ("program", "status")
+    list_filter = ("program", "status", "normalized_tags")
     search_fields = ("title", "source", "tags")
     ordering = ("-deadline",)
 
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug")
+    search_fields = ("name", "slug")
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ("user", "message", "delegation", "is_read", "created_at")
+    # str(delegation) legge progetto e collaboratore: senza questo è un N+1
+    list_select_related = ("user", "delegation__project", "delegation__collaborator")
     list_filter = ("is_read", "user")
     search_fields = ("message", "user__username", "delegation__project__title")
     readonly_fields = ("created_at",)
@@ -91,6 +115,47 @@ class NotificationAdmin(admin.ModelAdmin):
 @admin.register(Milestone)
 class MilestoneAdmin(admin.ModelAdmin):
     list_display = ('project', 'title', 'due_date', 'status', 'completed_date')
+    list_select_related = ('project',)
     list_filter = ('status', 'project',)
     search_fields = ('title', 'description')
-    date_hierarchy = 'due_date'
\ No newline at end of file
+    date_hierarchy = 'due_date'
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    """Notifiche lette archiviate da manage.py prune_notifications (sola lettura)."""
+    list_display = ("notification_id", "user_id", "message", "created_at", "archived_at")
+    search_fields = ("message",)
+    readonly_fields = ("notification_id", "user_id", "delegation_id", "message", "created_at", "archived_at")
+
+
+@admin.register(DeadlineReminder)
+class DeadlineReminderAdmin(admin.ModelAdmin):
+    """Registro dei promemoria inviati da manage.py send_deadline_reminders."""
+    list_display = ("kind", "object_id", "window_days", "due_date", "recipients", "sent_at")
+    list_filter = ("kind", "window_days")
+    date_hierarchy = "sent_at"
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """Caricamenti a blocchi; quelli fermi li elimina manage.py prune_uploads."""
+    list_display = ("filename", "user", "received", "size", "document", "updated_at")
+    list_select_related = ("user", "document")
+    readonly_fields = ("received", "expected_sha256", "document", "created_at", "updated_at")
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Coda delle email: le consegna manage.py run_mail_worker."""
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "to")
+    readonly_fields = ("attempts", "last_error", "claim_token", "claimed_at", "created_at", "sent_at")
+    actions = ["requeue"]
+
+    @admin.action(description="Rimetti in coda (anche le non consegnabili)")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status="SENT").update(
+            status="PENDING", attempts=0, next_attempt_at=timezone.now(), claim_token=None,
+        )
+        self.message_user(request, f"{updated} email rimesse in coda.")
@@ -0,0 +1,65 @@
+# projects/amounts.py
+"""
+Importi scritti a mano nei file importati (spese, bandi): "€ 1.500.000,00",
+"1,234.56", "2.500", "12,5".
+
+Se compaiono sia "," sia "." il separatore dei decimali è quello più a
+destra; con un solo tipo di separatore vale la convenzione italiana: una
+sola virgola è decimale, i punti a gruppi di tre cifre sono migliaia.
+Oltre a cifre, separatori, segno, "€"/"EUR" e spazi non si accetta altro:
+un testo come "1e12" è un errore, non 112.
+
+Gli importi hanno al più due decimali: "1,234" o "0,005" non si
+arrotondano in silenzio a 1,23 o 0,00 (probabili migliaia scritte
+all'inglese o refusi), sono righe non valide.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+CENT = Decimal("0.01")
+# Rumore binario dei float dei fogli di calcolo (0.1 + 0.2 = 0.30000000000000004)
+FLOAT_PRECISION = Decimal("0.000001")
+# Valuta e spazi (anche quelli non separabili dei fogli di calcolo) si ignorano
+CURRENCY_RE = re.compile(r"€|euro?|\s", re.IGNORECASE)
+NUMBER_RE = re.compile(r"-?[\d.,]*\d[\d.,]*")
+
+
+def parse_amount(value):
+    """Decimal ai centesimi, None se vuoto; ValueError se non è un importo o ha più di due decimali."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"importo non valido: {value!r}")
+    if isinstance(value, (int, float, Decimal)):
+        # numeri già tipizzati (XLSX, JSON): nessun separatore da interpretare
+        text = str(value)
+    else:
+        if not str(value).strip():
+            return None
+        text = _plain_number(str(value))
+    try:
+        amount = Decimal(text)
+        if isinstance(value, float):
+            amount = amount.quantize(FLOAT_PRECISION)
+        cents = amount.quantize(CENT)
+    except InvalidOperation:
+        raise ValueError(f"importo non valido: {value!r}")
+    if cents != amount:
+        raise ValueError(f"importo con più di due decimali: {value!r}")
+    return cents
+
+
+def _plain_number(text):
+    """Testo dell'importo con il solo punto decimale: "1.234,5" -> "1234.5"."""
+    text = CURRENCY_RE.sub("", text)
+    if not NUMBER_RE.fullmatch(text):
+        raise ValueError(f"importo non valido: {text!r}")
+    if "," in text and "." in text:
+        # il separatore più a destra è quello dei decimali
+        thousands = "." if text.rfind(",") > text.rfind(".") else ","
+        text = text.replace(thousands, "")
+    if "," in text:
+        text = text.replace(",", ".") if text.count(",") == 1 else text.replace(",", "")
+    elif text.count(".") > 1 or re.fullmatch(r"-?\d{1,3}(\.\d{3})+", text):
+        text = text.replace(".", "")           # 1.500.000 all'italiana
+    return text
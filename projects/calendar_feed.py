@@ -0,0 +1,208 @@
+# projects/calendar_feed.py
+"""
+Calendario unificato: eventi dell'utente (Event.date), milestone dei progetti
+(Milestone.due_date) e scadenze dei bandi (Call.deadline) per un intervallo
+di date, raggruppati per giorno.
+
+Una query per fonte, ciascuna su un intervallo dell'indice della data:
+- eventi: event_owner_date_idx (owner, date) più le serie ricorrenti già
+  iniziate, event_owner_series_idx (owner, series_end); le occorrenze si
+  calcolano solo per l'intervallo (projects/recurrence.py)
+- milestone: milestone_due_status_idx (due_date, status), progetto letto per PK
+- bandi: call_deadline_title_idx (deadline, title)
+Il costo dipende dalle voci del mese, non dal numero di progetti della scuola.
+
+Il mese si tiene in cache per (utente, scuola, mese) con chiavi a versioni
+(projects/versioned_cache.py): le scritture incrementano (dopo il commit)
+la versione della fonte toccata e le voci vecchie scadono da sole.
+- Event salvato/eliminato: versione dell'utente proprietario
+- Milestone salvata/eliminata: versione della scuola del progetto (e della
+  vista "tutte le scuole")
+- Call salvato/eliminato: versione globale dei bandi
+- Project salvato/eliminato: elenco dei progetti del modulo "Aggiungi evento"
+  e tutti i mesi (titolo e scuola dei progetti compaiono nelle voci)
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+
+from . import recurrence, versioned_cache
+from .models import Call, Event, Milestone, Project
+from .versioned_cache import VersionedCache, school_scope
+
+CALENDAR_CACHE_TIMEOUT = getattr(settings, "CALENDAR_CACHE_TIMEOUT", 600)
+
+# Milestone annullate: non sono più scadenze
+HIDDEN_MILESTONE_STATUSES = ("CANCELED",)
+
+_CALLS = "calls"
+_PROJECTS = "projects"
+
+_versions = VersionedCache("calendar")
+
+
+class Entry:
+    """Voce del calendario (oggetto semplice: va in cache)."""
+
+    def __init__(self, kind, date, title, detail="", url="", event_id=None, occurrence=None):
+        self.kind = kind                 # "event" | "milestone" | "call"
+        self.date = date
+        self.title = title
+        self.detail = detail             # progetto, programma del bando, ...
+        self.url = url
+        self.event_id = event_id         # solo eventi: per il pulsante elimina
+        self.occurrence = occurrence     # occorrenza di una serie: si elimina solo quella
+
+
+def _user_scope(user_id):
+    return f"user:{user_id}"
+
+
+# --- invalidazione (signals) ------------------------------------------------
+
+def invalidate_user(user_id):
+    _versions.invalidate(_user_scope(user_id))
+
+
+def invalidate_school(school_id):
+    _versions.invalidate(school_scope(school_id), school_scope(None))
+
+
+def invalidate_project(project_id):
+    if not versioned_cache.enabled():
+        return
+    school_id = Project.objects.filter(pk=project_id).values_list("school_id", flat=True).first()
+    invalidate_school(school_id)
+
+
+def invalidate_calls():
+    _versions.invalidate(_CALLS)
+
+
+def invalidate_projects():
+    _versions.invalidate(_PROJECTS)
+
+
+# --- lettura -----------------------------------------------------------------
+
+def fetch_entries(user, school, first, last):
+    """Voci da first a last compresi, senza cache: tre query su indice."""
+    entries = []
+
+    events = Event.objects.filter(owner=user)
+    if school:
+        events = events.filter(school=school)
+    rows = recurrence.overlapping(
+        events.values_list("id", "title", "project__title", *recurrence.RULE_FIELDS), first, last,
+    )
+    for pk, title, project_title, *rule in rows:
+        rule = recurrence.Rule(*rule)
+        for day in rule.between(first, last):
+            entries.append(Entry(
+                "event", day, title, project_title or "", event_id=pk,
+                occurrence=day if rule.repeat else None,
+            ))
+
+    milestones = (
+        Milestone.objects
+        .filter(due_date__gte=first, due_date__lte=last)
+        .exclude(status__in=HIDDEN_MILESTONE_STATUSES)
+    )
+    if school:
+        # "+ 0": l'indice della scuola sui progetti non è utilizzabile, così
+        # SQLite parte dall'intervallo di date delle milestone e legge il
+        # progetto per PK, invece di scorrere tutti i progetti della scuola
+        milestones = milestones.alias(project_school=F("project__school_id") + 0).filter(project_school=school.pk)
+    rows = milestones.order_by().values_list("due_date", "title", "project_id", "project__title")
+    for day, title, project_id, project_title in rows:
+        entries.append(Entry(
+            "milestone", day, title, project_title,
+            url=reverse("project_detail", args=[project_id]),
+        ))
+
+    calls = Call.objects.filter(deadline__gte=first, deadline__lte=last)
+    for pk, day, title, program in calls.order_by().values_list("id", "deadline", "title", "program"):
+        entries.append(Entry("call", day, title, program, url=reverse("bando_detail", args=[pk])))
+
+    return entries
+
+
+def event_columns(user, school, first, last):
+    """
+    Occorrenze degli eventi da first a last in formato a colonne (liste
+    parallele, giorni come scostamento da first, titoli dei progetti una volta
+    sola in "projects"), per le viste settimana/agenda caricate dal browser.
+    Una query: eventi che iniziano nell'intervallo e serie già iniziate.
+    """
+    events = Event.objects.filter(owner=user)
+    if school:
+        events = events.filter(school=school)
+    rows = recurrence.overlapping(
+        events.values_list("id", "title", "project_id", "project__title", *recurrence.RULE_FIELDS), first, last,
+    )
+    occurrences = []
+    projects = {}
+    for pk, title, project_id, project_title, *rule in rows:
+        rule = recurrence.Rule(*rule)
+        if project_id:
+            projects[str(project_id)] = project_title
+        for day in rule.between(first, last):
+            occurrences.append(((day - first).days, title.lower(), pk, title, project_id, bool(rule.repeat)))
+    occurrences.sort()
+    return {
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+        "id": [o[2] for o in occurrences],
+        "day": [o[0] for o in occurrences],
+        "title": [o[3] for o in occurrences],
+        "project": [o[4] for o in occurrences],
+        "series": [int(o[5]) for o in occurrences],
+        "projects": projects,
+    }
+
+
+def by_day(entries):
+    """{data: [Entry, ...]}: eventi, poi milestone, poi bandi; per titolo."""
+    order = {"event": 0, "milestone": 1, "call": 2}
+    days = {}
+    for entry in sorted(entries, key=lambda e: (order[e.kind], e.title.lower())):
+        days.setdefault(entry.date, []).append(entry)
+    return days
+
+
+def month_entries(user, school, first, last):
+    """Voci del mese raggruppate per giorno, dalla cache se possibile."""
+    if not versioned_cache.enabled():
+        return by_day(fetch_entries(user, school, first, last))
+    school_id = school.pk if school else None
+    versions = _versions.versions(_user_scope(user.pk), school_scope(school_id), _CALLS, _PROJECTS)
+    key = "calendar:month:{}:{}:{:%Y-%m-%d}:{:%Y-%m-%d}:{}".format(
+        user.pk, school_id or "none", first, last, ":".join(str(v) for v in versions),
+    )
+    days = cache.get(key)
+    if days is None:
+        days = by_day(fetch_entries(user, school, first, last))
+        cache.set(key, days, CALENDAR_CACHE_TIMEOUT)
+    return days
+
+
+def project_choices(school):
+    """[(id, titolo)] dei progetti collegabili a un evento (in cache)."""
+    school_id = school.pk if school else None
+    if not versioned_cache.enabled():
+        return _project_choices(school_id)
+    [version] = _versions.versions(_PROJECTS)
+    key = f"calendar:projects:{school_id or 'none'}:{version}"
+    choices = cache.get(key)
+    if choices is None:
+        choices = _project_choices(school_id)
+        cache.set(key, choices, CALENDAR_CACHE_TIMEOUT)
+    return choices
+
+
+def _project_choices(school_id):
+    projects = Project.objects.all()
+    if school_id:
+        projects = projects.filter(school_id=school_id)
+    return list(projects.order_by("title").values_list("id", "title"))
@@ -0,0 +1,13 @@
+# projects/context_processors.py
+from . import unread
+
+
+def unread_notifications(request):
+    """
+    {{ unread_notifications }} nei template: numero di notifiche non lette,
+    letto dalla cache solo se il template lo usa davvero.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"unread_notifications": 0}
+    return {"unread_notifications": lambda: unread.unread_count(user.pk)}
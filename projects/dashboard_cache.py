@@ -0,0 +1,82 @@
+# projects/dashboard_cache.py
+"""
+Cache dei blocchi "di scuola" della dashboard: KPI (budget/speso) e progetti
+recenti. Sono uguali per tutti gli utenti della stessa scuola, quindi si
+calcolano una volta e si riusano; notifiche ed eventi restano per utente e
+non passano da qui.
+
+Invalidazione a versioni (projects/versioned_cache.py): la chiave dei blocchi
+contiene una versione globale e una per scuola.
+- Expense (via rollups.apply_delta): versione della scuola del progetto
+- Project salvato/eliminato, ricostruzioni bulk: versione globale
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Project
+from . import versioned_cache
+from .versioned_cache import VersionedCache, school_scope
+
+# Rete di sicurezza per scritture che non passano dai signals (es. UPDATE manuali)
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 600)
+LATEST_PROJECTS = 6
+
+_GLOBAL = "all"
+
+# invalidate_project() senza scuola: si legge dal progetto
+UNKNOWN = object()
+
+_versions = VersionedCache("dashboard")
+
+
+def invalidate_school(school_id):
+    """Le spese della scuola sono cambiate (anche la vista "tutte le scuole")."""
+    _versions.invalidate(school_scope(school_id), school_scope(None))
+
+
+def invalidate_project(project_id, school_id=UNKNOWN):
+    if not versioned_cache.enabled():
+        return
+    if school_id is UNKNOWN:
+        school_id = Project.objects.filter(pk=project_id).values_list("school_id", flat=True).first()
+    invalidate_school(school_id)
+
+
+def invalidate_all():
+    _versions.invalidate(_GLOBAL)
+
+
+def school_blocks(school):
+    """
+    {"totals": {"budget", "spent"}, "latest": [Project, ...]} per la scuola,
+    oppure per tutti i progetti se school è None.
+    """
+    school_id = school.pk if school else None
+    if not versioned_cache.enabled():
+        return _compute_blocks(school_id)
+
+    scope = school_scope(school_id)
+    key = "dashboard:blocks:{}:{}:{}".format(scope, *_versions.versions(_GLOBAL, scope))
+    blocks = cache.get(key)
+    if blocks is None:
+        blocks = _compute_blocks(school_id)
+        cache.set(key, blocks, DASHBOARD_CACHE_TIMEOUT)
+    return blocks
+
+
+def _compute_blocks(school_id):
+    projects_qs = Project.objects.all()
+    if school_id:
+        projects_qs = projects_qs.filter(school_id=school_id)
+
+    totals = projects_qs.aggregate(budget=Sum("budget"), spent=Sum("spent"))
+    totals["budget"] = totals["budget"] or 0
+    totals["spent"] = totals["spent"] or 0
+
+    latest = list(projects_qs.order_by("-start_date", "-id")[:LATEST_PROJECTS])
+    for p in latest:
+        # attributo usato nel template
+        p.spent_from_expenses = p.spent
+
+    return {"totals": totals, "latest": latest}
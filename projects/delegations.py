@@ -0,0 +1,141 @@
+# projects/delegations.py
+"""
+Creazione di deleghe in blocco: uno o più progetti assegnati a molti
+collaboratori con un'unica richiesta.
+
+Progetti e utenti si leggono con una query ciascuno; deleghe e notifiche si
+scrivono con bulk_create nella stessa transazione (servono le chiavi primarie
+restituite dall'INSERT: PostgreSQL e SQLite >= 3.35).
+bulk_create non emette signals: contatore delle non lette e stream SSE
+si aggiornano qui. Le email ai collaboratori passano dall'outbox
+(projects/outbox.py): nessuna attesa del server SMTP nella richiesta.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from django.urls import reverse
+
+from . import live, outbox, unread
+from .models import Delegation, Notification, Project
+
+DEFAULT_BATCH_SIZE = 500
+
+# Stati per cui una nuova delega sullo stesso progetto sarebbe un doppione
+OPEN_STATUSES = ("PENDING", "CONFIRMED")
+
+
+class BatchResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0                 # coppie già delegate
+        self.missing_projects = []
+        self.missing_collaborators = []
+
+
+def assignment_email(collaborator, project_title, notification, base_url=""):
+    """Email di avviso per una delega assegnata (dict per outbox.enqueue/enqueue_many)."""
+    link = base_url.rstrip("/") + reverse("notification_detail", args=[notification.pk])
+    return {
+        "to": collaborator.email,
+        "subject": f"ScuolaHub – nuova delega: {project_title}",
+        "body": (
+            f"Ciao {collaborator.username},\n\n"
+            f"ti è stata assegnata una delega sul progetto '{project_title}'.\n"
+            f"Puoi accettarla o rifiutarla qui: {link}\n"
+        ),
+    }
+
+
+def answer_email(delegation, accepted, notification, base_url=""):
+    """Email al delegante quando il collaboratore accetta o rifiuta."""
+    verb = "accettata" if accepted else "rifiutata"
+    link = base_url.rstrip("/") + reverse("notification_detail", args=[notification.pk])
+    return {
+        "to": delegation.creator.email,
+        "subject": f"ScuolaHub – delega {verb}: {delegation.project.title}",
+        "body": (
+            f"La delega sul progetto '{delegation.project.title}' è stata {verb} "
+            f"da {delegation.collaborator.username}.\n"
+            f"Dettagli: {link}\n"
+        ),
+    }
+
+
+def _ids(values):
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return list(dict.fromkeys(ids))
+
+
+def create_batch(creator, project_ids, collaborator_ids, role_label="", note="",
+                 batch_size=DEFAULT_BATCH_SIZE, base_url=""):
+    """
+    Crea una delega PENDING (con notifica ed email in outbox) per ogni coppia
+    progetto × collaboratore, saltando le coppie con una delega già aperta.
+    base_url: prefisso assoluto dei link nelle email (es. https://host/).
+    """
+    User = get_user_model()
+    result = BatchResult()
+    project_ids = _ids(project_ids)
+    collaborator_ids = _ids(collaborator_ids)
+
+    projects = Project.objects.only("id", "title").in_bulk(project_ids)
+    collaborators = (
+        User.objects.filter(is_active=True).only("id", "username", "email").in_bulk(collaborator_ids)
+    )
+    result.missing_projects = [pk for pk in project_ids if pk not in projects]
+    result.missing_collaborators = [pk for pk in collaborator_ids if pk not in collaborators]
+    if not projects or not collaborators:
+        return result
+
+    existing = set(
+        Delegation.objects
+        .filter(project_id__in=projects, collaborator_id__in=collaborators, status__in=OPEN_STATUSES)
+        .values_list("project_id", "collaborator_id")
+    )
+
+    delegations = [
+        Delegation(
+            project=project,
+            collaborator=collaborator,
+            creator=creator,
+            role_label=role_label or None,
+            note=note or None,
+            status="PENDING",
+        )
+        for project in projects.values()
+        for collaborator in collaborators.values()
+        if (project.pk, collaborator.pk) not in existing
+    ]
+    result.skipped = len(projects) * len(collaborators) - len(delegations)
+
+    with transaction.atomic():
+        delegations = Delegation.objects.bulk_create(delegations, batch_size=batch_size)
+        notifications = Notification.objects.bulk_create(
+            [
+                Notification(
+                    user_id=delegation.collaborator_id,
+                    message=f"Ti è stata assegnata una delega sul progetto '{delegation.project.title}'.",
+                    delegation=delegation,
+                )
+                for delegation in delegations
+            ],
+            batch_size=batch_size,
+        )
+        for user_id, count in Counter(d.collaborator_id for d in delegations).items():
+            unread.adjust(user_id, count)
+        live.publish_on_commit(notifications)
+        outbox.enqueue_many(
+            assignment_email(d.collaborator, d.project.title, n, base_url)
+            for d, n in zip(delegations, notifications)
+            if d.collaborator.email
+        )
+
+    result.created = len(delegations)
+    return result
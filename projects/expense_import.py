@@ -0,0 +1,270 @@
+# projects/expense_import.py
+"""
+Import massivo di spese (Expense) da file CSV o XLSX.
+
+Il file viene letto riga per riga (csv.reader / openpyxl in read_only),
+senza caricarlo in memoria: in memoria resta solo il blocco di righe
+valide in attesa di bulk_create. Tutto l'import avviene in una
+transazione; i totali (Project.spent, ExpenseRollup) vengono aggiornati
+una volta per categoria alla fine, dato che bulk_create non invia signals.
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import amounts, rollups
+from .models import Expense
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Oltre questo numero di errori il report riporta solo il conteggio
+MAX_REPORTED_ERRORS = 500
+
+# Intestazioni accettate (minuscolo) -> campo di Expense
+HEADER_ALIASES = {
+    "date": "date", "data": "date",
+    "vendor": "vendor", "fornitore": "vendor",
+    "category": "category", "categoria": "category",
+    "amount": "amount", "importo": "amount",
+    "document": "document", "documento": "document",
+    "note": "note", "notes": "note",
+}
+
+CATEGORY_KEYS = {key for key, _ in Expense.CATEGORY_CHOICES}
+CATEGORY_BY_LABEL = {label.lower(): key for key, label in Expense.CATEGORY_CHOICES}
+
+
+class ImportFormatError(Exception):
+    """File non leggibile o senza le colonne obbligatorie."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # (numero riga, messaggio)
+        self.rolled_back = False
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+    @property
+    def errors_truncated(self):
+        return self.error_count > len(self.errors)
+
+
+# ---------------------------------------------------------------------
+# Lettura dei file
+# ---------------------------------------------------------------------
+
+def _map_headers(raw_headers):
+    mapping = {}
+    for idx, name in enumerate(raw_headers):
+        field = HEADER_ALIASES.get(str(name or "").strip().lower())
+        if field and field not in mapping:
+            mapping[field] = idx
+    missing = {"date", "category", "amount"} - set(mapping)
+    if missing:
+        raise ImportFormatError(
+            "Colonne obbligatorie mancanti: " + ", ".join(sorted(missing))
+        )
+    return mapping
+
+
+def _iter_csv(uploaded_file):
+    stream = io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", newline="")
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(stream, dialect)
+    try:
+        yield from reader
+    finally:
+        # Evita che il wrapper chiuda il file dell'upload
+        stream.detach()
+
+
+def _iter_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Import XLSX non disponibile: installare openpyxl.")
+    try:
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f"File XLSX non leggibile: {e}")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(uploaded_file):
+    """
+    Restituisce (numero_riga, dict campo -> valore grezzo) per ogni riga dati.
+    Il numero di riga è quello del file (l'intestazione è la riga 1).
+    """
+    name = (uploaded_file.name or "").lower()
+    if name.endswith(".xlsx"):
+        rows = _iter_xlsx(uploaded_file)
+    elif name.endswith(".csv") or name.endswith(".txt"):
+        rows = _iter_csv(uploaded_file)
+    else:
+        raise ImportFormatError("Formato non supportato: caricare un file .csv o .xlsx.")
+
+    try:
+        headers = next(rows)
+    except StopIteration:
+        raise ImportFormatError("Il file è vuoto.")
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"File CSV non leggibile: {e}")
+    mapping = _map_headers(headers)
+
+    for line_no, row in enumerate(rows, start=2):
+        if not row or all(cell in (None, "") for cell in row):
+            continue
+        yield line_no, {
+            field: (row[idx] if idx < len(row) else None)
+            for field, idx in mapping.items()
+        }
+
+
+# ---------------------------------------------------------------------
+# Validazione
+# ---------------------------------------------------------------------
+
+def _text(value):
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    if not text:
+        raise ValueError("data mancante")
+    # Caso più frequente (ISO, AAAA-MM-GG): fromisoformat è molto più veloce di strptime
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for sep in ("/", "-", "."):
+        parts = text.split(sep)
+        if len(parts) == 3 and len(parts[2]) == 4:
+            try:
+                return date(int(parts[2]), int(parts[1]), int(parts[0]))
+            except ValueError:
+                break
+    raise ValueError(f"data non valida '{text}'")
+
+
+def parse_amount(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError("importo mancante")
+    # separatori come nell'import dei bandi (projects/amounts.py)
+    try:
+        amount = amounts.parse_amount(value)
+    except ValueError:
+        amount = None
+    if amount is None or not amount.is_finite() or amount < 0:
+        raise ValueError(f"importo non valido '{value}'")
+    if amount >= Decimal("1e10"):
+        raise ValueError(f"importo troppo grande '{value}'")
+    return amount
+
+
+def parse_category(value):
+    text = _text(value)
+    if not text:
+        raise ValueError("categoria mancante")
+    if text.upper() in CATEGORY_KEYS:
+        return text.upper()
+    if text.lower() in CATEGORY_BY_LABEL:
+        return CATEGORY_BY_LABEL[text.lower()]
+    raise ValueError(f"categoria non valida '{text}'")
+
+
+def build_expense(project, raw):
+    """Crea (senza salvare) una Expense dalla riga; solleva ValueError se non valida."""
+    vendor = _text(raw.get("vendor"))
+    document = _text(raw.get("document"))
+    if vendor and len(vendor) > 255:
+        raise ValueError("fornitore troppo lungo (max 255 caratteri)")
+    if document and len(document) > 255:
+        raise ValueError("documento troppo lungo (max 255 caratteri)")
+    return Expense(
+        project=project,
+        date=parse_date(raw.get("date")),
+        vendor=vendor,
+        category=parse_category(raw.get("category")),
+        amount=parse_amount(raw.get("amount")),
+        document=document,
+        note=_text(raw.get("note")),
+    )
+
+
+# ---------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------
+
+def import_expenses(project, uploaded_file, batch_size=DEFAULT_BATCH_SIZE, skip_invalid=False):
+    """
+    Importa le spese del file nel progetto.
+    - skip_invalid=False: se anche una sola riga non è valida non viene
+      importato nulla (rollback) e si restituisce il report degli errori.
+    - skip_invalid=True: le righe valide vengono importate, le altre riportate.
+    """
+    result = ImportResult()
+    batch = []
+    totals_by_cat = {}
+    counts_by_cat = {}
+
+    def flush():
+        Expense.objects.bulk_create(batch, batch_size=batch_size)
+        result.created += len(batch)
+        batch.clear()
+
+    try:
+        with transaction.atomic():
+            for line_no, raw in iter_rows(uploaded_file):
+                try:
+                    expense = build_expense(project, raw)
+                except ValueError as e:
+                    result.add_error(line_no, str(e))
+                    continue
+                if result.error_count and not skip_invalid:
+                    # Verrà annullato tutto: proseguo solo per validare
+                    continue
+
+                batch.append(expense)
+                totals_by_cat[expense.category] = totals_by_cat.get(expense.category, Decimal("0")) + expense.amount
+                counts_by_cat[expense.category] = counts_by_cat.get(expense.category, 0) + 1
+                if len(batch) >= batch_size:
+                    flush()
+
+            if result.error_count and not skip_invalid:
+                result.rolled_back = True
+                transaction.set_rollback(True)
+            else:
+                if batch:
+                    flush()
+                for category, amount in totals_by_cat.items():
+                    rollups.apply_delta(project.pk, category, amount, counts_by_cat[category], project.school_id)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"File CSV non leggibile: {e}")
+
+    if result.rolled_back:
+        result.created = 0
+    return result
@@ -0,0 +1,44 @@
+# projects/facets.py
+"""
+Conteggi per faccetta (programma, stato, tag) dei bandi filtrati.
+
+Una sola query: UNION ALL di tre GROUP BY con le stesse colonne
+(faccetta, valore, etichetta, conteggio). I bandi si contano sugli indici
+(program, status, ...) e i tag sull'indice (tag, call) di CallTag.
+"""
+from django.db.models import CharField, Count, F, Value
+
+from .models import CallTag
+
+
+def _grouped(queryset, facet, value, label):
+    return (
+        queryset.order_by()
+        .values(facet=Value(facet, output_field=CharField()), value=value, label=label)
+        .annotate(n=Count("pk"))
+        .values_list("facet", "value", "label", "n")
+    )
+
+
+def facet_counts(calls):
+    """
+    calls: queryset di Call già filtrato.
+    {"program": {valore: n}, "status": {valore: n}, "tag": [(slug, nome, n), ...]}
+    con i tag dal più frequente.
+    """
+    calls = calls.order_by()
+    empty = Value("", output_field=CharField())
+    rows = _grouped(calls, "program", F("program"), empty).union(
+        _grouped(calls, "status", F("status"), empty),
+        _grouped(CallTag.objects.filter(call__in=calls.values("pk")), "tag", F("tag__slug"), F("tag__name")),
+        all=True,
+    )
+
+    counts = {"program": {}, "status": {}, "tag": []}
+    for facet, value, label, n in rows:
+        if facet == "tag":
+            counts["tag"].append((value, label, n))
+        else:
+            counts[facet][value] = n
+    counts["tag"].sort(key=lambda item: (-item[2], item[1].lower()))
+    return counts
@@ -0,0 +1,174 @@
+# projects/ical.py
+"""
+Feed iCalendar (RFC 5545) personale: eventi dell'utente e milestone dei
+progetti su cui ha una delega confermata.
+
+I client di calendario interrogano il feed ogni pochi minuti, quasi sempre
+senza modifiche. etag() calcola l'ETag con due aggregati (conteggio, somma
+degli id e ultima modifica) letti dagli indici (owner, updated_at) e
+(project, updated_at): se il client ha già la versione corrente la vista
+risponde 304 senza leggere le righe. Conteggio e somma degli id fanno
+cambiare l'ETag anche quando si elimina qualcosa o si revoca una delega;
+la data del giorno, perché la finestra del feed si sposta ogni giorno.
+Niente Last-Modified: l'ultima modifica non cambia con le eliminazioni e un
+If-Modified-Since risponderebbe 304 con eventi già cancellati.
+
+Il corpo si genera in streaming (una riga alla volta dall'iteratore del
+queryset). Le serie ricorrenti restano una sola VEVENT con RRULE/EXDATE:
+l'espansione la fa il client.
+Non cambiano ETag le modifiche fatte con update() (non aggiornano updated_at)
+e i titoli dei progetti rinominati: compaiono alla modifica successiva.
+"""
+import hashlib
+import secrets
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from . import recurrence
+from .models import CalendarToken, Delegation, Event, Milestone
+
+# Il feed parte da un anno fa: gli eventi più vecchi non servono ai telefoni
+PAST_DAYS = 365
+PRODID = "-//ScuolaHub//Calendario//IT"
+UID_DOMAIN = "scuolahub"
+
+HIDDEN_MILESTONE_STATUSES = ("CANCELED",)
+
+_FREQ = {recurrence.DAILY: "DAILY", recurrence.WEEKLY: "WEEKLY", recurrence.MONTHLY: "MONTHLY"}
+
+
+def new_token(user):
+    """Crea o rigenera il token del feed dell'utente."""
+    token, _ = CalendarToken.objects.update_or_create(user=user, defaults={"token": secrets.token_urlsafe(32)})
+    return token
+
+
+def _events(user):
+    return Event.objects.filter(owner=user)
+
+
+def _milestones(user):
+    delegated = Delegation.objects.filter(collaborator=user, status="CONFIRMED").values("project_id")
+    return Milestone.objects.filter(project_id__in=delegated).exclude(status__in=HIDDEN_MILESTONE_STATUSES)
+
+
+def etag(user, today=None):
+    """ETag del feed, senza leggere le righe."""
+    today = today or timezone.localdate()
+    summary = {"n": Count("id"), "ids": Sum("id"), "last": Max("updated_at")}
+    events = _events(user).aggregate(**summary)
+    milestones = _milestones(user).aggregate(**summary)
+    raw = "{}:{}:{n}:{ids}:{last}:".format(user.pk, today.isoformat(), **events)
+    raw += "{n}:{ids}:{last}".format(**milestones)
+    return '"{}"'.format(hashlib.sha256(raw.encode()).hexdigest()[:32])
+
+
+# --- formato ----------------------------------------------------------------
+
+def escape(text):
+    return (
+        (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "")
+    )
+
+
+def fold(line):
+    """Riga terminata da CRLF, spezzata ogni 75 byte UTF-8 senza tagliare i caratteri."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    chunk, size, limit = [], 0, 75
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(chunk))
+            chunk, size, limit = [], 0, 74          # lo spazio iniziale conta
+        chunk.append(char)
+        size += width
+    parts.append("".join(chunk))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _day(value):
+    return value.strftime("%Y%m%d")
+
+
+def _stamp(value):
+    value = value or datetime.combine(date(2000, 1, 1), time(), tzinfo=dt_timezone.utc)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def rrule(rule):
+    """Proprietà RRULE per una Rule, con lo stesso comportamento mensile di recurrence."""
+    parts = [f"FREQ={_FREQ[rule.repeat]}"]
+    if rule.interval > 1:
+        parts.append(f"INTERVAL={rule.interval}")
+    if rule.repeat == recurrence.MONTHLY and rule.start.day > 28:
+        # recurrence usa l'ultimo giorno dei mesi più corti; RFC 5545 li
+        # salterebbe: l'ultimo tra i giorni 28..N del mese
+        days = ",".join(str(d) for d in range(28, rule.start.day + 1))
+        parts.append(f"BYMONTHDAY={days};BYSETPOS=-1")
+    if rule.count:
+        parts.append(f"COUNT={rule.count}")
+    if rule.until:
+        parts.append(f"UNTIL={_day(rule.until)}")
+    return "RRULE:" + ";".join(parts)
+
+
+def _vevent(uid, stamp, day, summary, description="", rule=None):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{UID_DOMAIN}",
+        f"DTSTAMP:{_stamp(stamp)}",
+        f"DTSTART;VALUE=DATE:{_day(day)}",
+        f"DTEND;VALUE=DATE:{_day(day + timedelta(days=1))}",
+        f"SUMMARY:{escape(summary)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{escape(description)}")
+    if rule and rule.repeat:
+        lines.append(rrule(rule))
+        if rule.exceptions:
+            lines.append("EXDATE;VALUE=DATE:" + ",".join(_day(d) for d in sorted(rule.exceptions)))
+    lines.append("END:VEVENT")
+    return "".join(fold(line) for line in lines)
+
+
+def stream(user, today=None):
+    """Righe del feed (generatore): eventi e serie ancora attive, milestone da un anno fa in poi."""
+    today = today or timezone.localdate()
+    first = today - timedelta(days=PAST_DAYS)
+
+    yield fold("BEGIN:VCALENDAR")
+    yield fold("VERSION:2.0")
+    yield fold(f"PRODID:{PRODID}")
+    yield fold("CALSCALE:GREGORIAN")
+    yield fold("X-WR-CALNAME:ScuolaHub")
+
+    events = recurrence.overlapping(
+        _events(user).values_list(
+            "id", "title", "description", "project__title", "updated_at", *recurrence.RULE_FIELDS,
+        ),
+        first, date.max,
+    )
+    for pk, title, description, project_title, updated_at, *rule in events.iterator(chunk_size=500):
+        rule = recurrence.Rule(*rule)
+        details = "\n".join(part for part in (description, project_title and f"Progetto: {project_title}") if part)
+        yield _vevent(f"event-{pk}", updated_at, rule.start, title, details, rule)
+
+    milestones = (
+        _milestones(user)
+        .filter(due_date__gte=first)
+        .order_by()
+        .values_list("id", "title", "description", "project__title", "updated_at", "due_date")
+    )
+    for pk, title, description, project_title, updated_at, due_date in milestones.iterator(chunk_size=500):
+        details = "\n".join(part for part in (f"Progetto: {project_title}", description) if part)
+        yield _vevent(f"milestone-{pk}", updated_at, due_date, f"Scadenza: {title}", details)
+
+    yield fold("END:VCALENDAR")
@@ -0,0 +1,378 @@
+# projects/ingest.py
+"""
+Import dei bandi (CallForProposal) da file: CSV, JSON (array o JSON Lines),
+RSS 2.0 / Atom.
+
+Pipeline, un record alla volta (i file non si caricano mai interi in memoria):
+1. read_records(path): legge il file in streaming e produce dict grezzi
+   (csv.DictReader, oggetti JSON decodificati uno per volta, iterparse XML);
+2. normalize(raw): nomi di colonna italiani/inglesi, date, importi,
+   programma e stato; ValueError se il record non è importabile;
+3. ingest(): a blocchi di batch_size, una SELECT delle chiavi già presenti
+   con il loro hash; i record con hash invariato si saltano, gli altri vanno
+   in un solo INSERT ... ON CONFLICT (ingest_key) DO UPDATE
+   (bulk_create con update_conflicts).
+Reimportare lo stesso file costa una SELECT per blocco e nessuna scrittura.
+
+La chiave di upsert è internal_code se presente, altrimenti source_url
+(models.call_ingest_key, la stessa dei bandi inseriti a mano).
+Lo stato si imposta solo alla creazione: dopo lo gestisce la segreteria
+(In preparazione, Finanziato, ...), un nuovo import non lo sovrascrive.
+Lo stato ricavato dalla scadenza (nessuno stato nel record) non entra
+nell'hash: passa da OPEN a CLOSED da solo e non è un cambiamento del record.
+"""
+import csv
+import hashlib
+import json
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from functools import lru_cache
+from decimal import Decimal
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import transaction
+from django.utils import timezone
+
+from .amounts import parse_amount
+from .models import CallForProposal, call_ingest_key
+
+DEFAULT_BATCH_SIZE = 1000
+# Errori conservati per il riepilogo (gli altri si contano soltanto)
+MAX_ERRORS = 50
+
+FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "json",
+    ".ndjson": "json",
+    ".xml": "xml",
+    ".rss": "xml",
+    ".atom": "xml",
+}
+
+# Nome del campo -> intestazioni accettate (già normalizzate da _column)
+ALIASES = {
+    "title": ("title", "titolo", "nome", "denominazione"),
+    "program": ("program", "programma", "fondo", "category", "categoria"),
+    "internal_code": ("internal_code", "codice", "code", "codice_bando", "codice_interno", "riferimento", "id"),
+    "source_name": ("source_name", "fonte", "source", "ente", "author", "autore"),
+    "source_url": ("source_url", "url", "link", "sito"),
+    "publication_date": ("publication_date", "data_pubblicazione", "pubblicazione", "pubdate", "published", "updated"),
+    "deadline_date": ("deadline_date", "scadenza", "deadline", "data_scadenza"),
+    "status": ("status", "stato"),
+    "amount_available": ("amount_available", "importo", "amount", "dotazione", "budget"),
+    "summary": ("summary", "sintesi", "descrizione", "description", "abstract"),
+    "requirements": ("requirements", "requisiti", "destinatari"),
+}
+COLUMN_FIELD = {alias: field for field, aliases in ALIASES.items() for alias in aliases}
+
+# Campi scritti dall'import (school e notes restano della segreteria)
+CONTENT_FIELDS = [
+    "title", "program", "internal_code", "source_name", "source_url", "publication_date",
+    "deadline_date", "status", "amount_available", "summary", "requirements",
+]
+UPDATE_FIELDS = [f for f in CONTENT_FIELDS if f != "status"] + ["content_hash", "import_source", "last_update"]
+
+STATUS_SYNONYMS = {"aperto": "OPEN", "open": "OPEN", "chiuso": "CLOSED", "closed": "CLOSED", "scaduto": "CLOSED"}
+
+# 31/12/2026, 31-12-2026, 31.12.2026: senza strptime, che è lento
+DMY_RE = re.compile(r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})")
+
+
+class IngestResult:
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.errors = []                 # [(posizione, motivo), ...] al massimo MAX_ERRORS
+
+    def reject(self, position, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((position, reason))
+
+
+# --- lettura in streaming -----------------------------------------------------
+
+def detect_format(path):
+    fmt = FORMATS.get(Path(path).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"formato non riconosciuto: {path}")
+    return fmt
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        # riga 1: intestazioni
+        for line, row in enumerate(csv.DictReader(f, dialect=dialect), start=2):
+            yield f"riga {line}", row
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """Elementi di un array JSON letti un blocco alla volta."""
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buffer = f.read(chunk_size).lstrip()[1:]      # salta "["
+    position = 0
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                break
+            buffer, position = f.read(chunk_size), 0
+            if not buffer:
+                raise ValueError("array JSON non chiuso")
+        if buffer[position] == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+        yield item
+        buffer, position = buffer[end:], 0
+
+
+def read_json(path):
+    with open(path, encoding="utf-8-sig") as f:
+        head = f.read(1024).lstrip()
+        f.seek(0)
+        if head.startswith("["):
+            for n, item in enumerate(_iter_json_array(f), start=1):
+                yield f"elemento {n}", item
+            return
+        # JSON Lines: un oggetto per riga
+        for line, text in enumerate(f, start=1):
+            if text.strip():
+                yield f"riga {line}", json.loads(text, parse_float=Decimal)
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def read_feed(path):
+    """Elementi <item> (RSS) o <entry> (Atom); le estensioni con namespace per nome locale."""
+    n = 0
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if _local(elem.tag) not in ("item", "entry"):
+            continue
+        n += 1
+        record = {}
+        for child in elem:
+            name = _local(child.tag)
+            text = (child.text or "").strip()
+            if name == "link" and child.get("href"):
+                # Atom: <link rel="alternate" href="..."/>
+                if child.get("rel", "alternate") == "alternate":
+                    record.setdefault("link", child.get("href"))
+            elif name == "category":
+                record.setdefault("category", []).append(child.get("term") or text)
+            elif name == "author":
+                record.setdefault("author", text or "".join(c.text or "" for c in child).strip())
+            elif name == "guid":
+                record["guid"] = text
+            else:
+                record.setdefault(name, text)
+        if "guid" in record and "link" not in record and record["guid"].startswith(("http://", "https://")):
+            record["link"] = record["guid"]
+        yield f"elemento {n}", record
+        elem.clear()                     # libera il sottoalbero già letto
+
+
+READERS = {"csv": read_csv, "json": read_json, "xml": read_feed}
+
+
+def read_records(path, fmt=None):
+    return READERS[fmt or detect_format(path)](path)
+
+
+# --- normalizzazione ----------------------------------------------------------
+
+@lru_cache(maxsize=1024)
+def _column(name):
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value if v not in (None, ""))
+    return " ".join(str(value).split())
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    if not text:
+        return None
+    match = DMY_RE.fullmatch(text)
+    try:
+        if match:
+            day, month, year = map(int, match.groups())
+            return date(year, month, day)
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(text).date()          # RSS: RFC 822
+    except (TypeError, ValueError):
+        raise ValueError(f"data non valida: {text!r}")
+
+
+def _choice_index(choices):
+    """Valore e etichetta normalizzati -> valore, per ogni scelta."""
+    index = {}
+    for key, label in choices:
+        index.setdefault(_column(key), key)
+        index.setdefault(_column(label), key)
+    return index
+
+
+PROGRAMS = _choice_index(CallForProposal.PROGRAM_CHOICES)
+STATUSES = {**STATUS_SYNONYMS, **_choice_index(CallForProposal.STATUS_CHOICES)}
+
+
+def _choice(value, index):
+    for item in value if isinstance(value, (list, tuple)) else [value]:
+        key = index.get(_column(item))
+        if key:
+            return key
+    return None
+
+
+def normalize_url(value):
+    text = _text(value)
+    if not text:
+        return ""
+    parts = urlsplit(text)
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+        raise ValueError(f"URL non valido: {text!r}")
+    url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+    if len(url) > 200:
+        raise ValueError("URL più lungo di 200 caratteri")
+    return url
+
+
+def normalize(raw, default_source="", today=None):
+    """Campi di CallForProposal, ingest_key e content_hash da un record grezzo."""
+    if not isinstance(raw, dict):
+        raise ValueError("il record non è un oggetto")
+    values = {}
+    for column, value in raw.items():
+        field = COLUMN_FIELD.get(_column(column)) if column is not None else None
+        if field and field not in values and value not in (None, "", []):
+            values[field] = value
+
+    record = {
+        "title": _text(values.get("title"))[:255],
+        "internal_code": _text(values.get("internal_code"))[:50] or None,
+        "source_url": normalize_url(values.get("source_url")) or None,
+        "publication_date": parse_date(values.get("publication_date")),
+        "deadline_date": parse_date(values.get("deadline_date")),
+        "amount_available": parse_amount(values.get("amount_available")),
+        "summary": (values.get("summary") and str(values["summary"]).strip()) or None,
+        "requirements": (values.get("requirements") and str(values["requirements"]).strip()) or None,
+    }
+    if not record["title"]:
+        raise ValueError("titolo mancante")
+    key = call_ingest_key(record["internal_code"], record["source_url"])
+    if not key:
+        raise ValueError("né codice né link: impossibile riconoscere il bando ai prossimi import")
+
+    record["source_name"] = (
+        _text(values.get("source_name")) or default_source
+        or (urlsplit(record["source_url"]).netloc if record["source_url"] else "")
+    )[:100]
+    record["program"] = _choice(values.get("program", ""), PROGRAMS) or "ALTRO"
+
+    status = _text(values.get("status"))
+    record["status"] = (
+        (status and _choice(status, STATUSES))
+        or ("CLOSED" if record["deadline_date"] and record["deadline_date"] < (today or timezone.localdate()) else "OPEN")
+    )
+
+    record["ingest_key"] = key
+    record["content_hash"] = content_hash(record, with_status=bool(status))
+    return record
+
+
+def content_hash(record, with_status=True):
+    fields = CONTENT_FIELDS if with_status else [f for f in CONTENT_FIELDS if f != "status"]
+    data = json.dumps({f: record[f] for f in fields}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+# --- scrittura ----------------------------------------------------------------
+
+def _write(batch, result, import_source, dry_run):
+    existing = dict(
+        CallForProposal.objects.filter(ingest_key__in=list(batch)).values_list("ingest_key", "content_hash")
+    )
+    changed = []
+    for key, record in batch.items():
+        if existing.get(key) == record["content_hash"]:
+            result.unchanged += 1
+            continue
+        if key in existing:
+            result.updated += 1
+        else:
+            result.created += 1
+        changed.append(CallForProposal(import_source=import_source, **record))
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            CallForProposal.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["ingest_key"],
+                update_fields=UPDATE_FIELDS,
+            )
+
+
+def ingest(records, batch_size=DEFAULT_BATCH_SIZE, import_source="CSV", default_source="",
+           dry_run=False, result=None):
+    """
+    records: iterabile di (posizione, dict grezzo), es. read_records(path).
+    Restituisce (o aggiorna) un IngestResult.
+    """
+    result = result or IngestResult()
+    today = timezone.localdate()
+    batch = {}
+    for position, raw in records:
+        result.read += 1
+        try:
+            record = normalize(raw, default_source, today)
+        except ValueError as exc:
+            result.reject(position, str(exc))
+            continue
+        # stessa chiave due volte nel blocco: vale l'ultima (un solo ON CONFLICT per riga)
+        batch.pop(record["ingest_key"], None)
+        batch[record["ingest_key"]] = record
+        if len(batch) >= batch_size:
+            _write(batch, result, import_source, dry_run)
+            batch = {}
+    if batch:
+        _write(batch, result, import_source, dry_run)
+    return result
@@ -0,0 +1,136 @@
+# projects/limits.py
+"""
+Valutazione dei limiti di spesa (SpendingLimit).
+
+Un'unica query sui limiti, con il progetto in join e lo speso della
+categoria preso dai rollup (ExpenseRollup) tramite subquery correlata:
+il numero di query non dipende dal numero di progetti.
+Usato sia da project_detail sia dal report dei limiti.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Expense, ExpenseRollup, SpendingLimit
+
+CENTS = Decimal("0.01")
+
+# Soglia (in % del consentito) oltre la quale un limite è "in attenzione"
+WARN_PERCENT = Decimal("80")
+
+STATUS_LABELS = {
+    "OK": "Nei limiti",
+    "WARN": "Oltre l'80%",
+    "BREACHED": "Superato",
+}
+
+BASE_LABELS = {
+    "TOTAL_SPENT": "Percentuale sul totale speso",
+    "TOTAL_BUDGET": "Percentuale sul budget totale",
+}
+
+CATEGORY_LABELS = dict(Expense.CATEGORY_CHOICES)
+
+
+def annotated_limits(limits=None):
+    """Queryset dei limiti con progetto/scuola in join e speso per categoria."""
+    if limits is None:
+        limits = SpendingLimit.objects.all()
+
+    spent_in_cat = (
+        ExpenseRollup.objects
+        .filter(project=OuterRef("project_id"), category=OuterRef("category"))
+        .values("total")[:1]
+    )
+    return (
+        limits
+        .select_related("project", "project__school")
+        .annotate(
+            spent_in_cat=Coalesce(
+                Subquery(spent_in_cat),
+                Value(Decimal("0")),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+        )
+    )
+
+
+def base_total(limit):
+    """Importo su cui si applica la percentuale del limite."""
+    project = limit.project
+    budget = project.budget or Decimal("0")
+    spent = project.spent or Decimal("0")
+    if limit.base in ("TOTAL_SPENT", "SPENT"):
+        return spent
+    if limit.base == "REMAINING":
+        return budget - spent
+    return budget
+
+
+def evaluate(limit):
+    """Calcola consentito / speso / residuo / stato di un limite annotato."""
+    allowed_total = (limit.percentage / Decimal("100")) * base_total(limit)
+    spent_in_cat = limit.spent_in_cat or Decimal("0")
+    remaining = allowed_total - spent_in_cat
+
+    pct_used = Decimal("0")
+    if allowed_total > 0:
+        pct_used = (spent_in_cat * Decimal("100")) / allowed_total
+
+    if spent_in_cat > allowed_total:
+        status = "BREACHED"
+    elif allowed_total > 0 and pct_used >= WARN_PERCENT:
+        status = "WARN"
+    else:
+        status = "OK"
+
+    project = limit.project
+    return {
+        "limit_id": limit.id,
+        "project_id": project.id,
+        "project_title": project.title,
+        "program": project.program,
+        "school_id": project.school_id,
+        "school_name": project.school.name if project.school_id else None,
+        "category": limit.category,
+        "category_label": CATEGORY_LABELS.get(limit.category, limit.category),
+        "base": limit.base,
+        "base_label": BASE_LABELS.get(limit.base, limit.base),
+        "percentage": limit.percentage,
+        "allowed_total": allowed_total.quantize(CENTS),
+        "spent_in_cat": spent_in_cat.quantize(CENTS),
+        "remaining": remaining.quantize(CENTS),
+        # per le barre di avanzamento: massimo 100
+        "pct_used": min(pct_used, Decimal("100")).quantize(CENTS),
+        "pct_used_raw": pct_used.quantize(CENTS),
+        "status": status,
+        "status_label": STATUS_LABELS[status],
+        "note": limit.note,
+    }
+
+
+def evaluate_limits(limits=None):
+    """Valuta tutti i limiti indicati (default: tutti) in una sola query."""
+    qs = annotated_limits(limits).order_by("project_id", "category", "base", "id")
+    for limit in qs.iterator(chunk_size=2000):
+        yield evaluate(limit)
+
+
+def limits_report(school_id=None, program=None, statuses=("WARN", "BREACHED")):
+    """
+    Limiti superati o in attenzione su tutto il portafoglio progetti,
+    ordinati dal più critico.
+    Il report non è paginato né limitato: la lista contiene tutte le righe
+    che passano i filtri (per un portafoglio grande filtrare per scuola o
+    programma).
+    """
+    limits = SpendingLimit.objects.all()
+    if school_id:
+        limits = limits.filter(project__school_id=school_id)
+    if program:
+        limits = limits.filter(project__program=program)
+
+    rows = [row for row in evaluate_limits(limits) if row["status"] in statuses]
+    rows.sort(key=lambda row: (row["status"] != "BREACHED", -row["pct_used_raw"]))
+    return rows
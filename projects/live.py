@@ -0,0 +1,100 @@
+# projects/live.py
+"""
+Notifiche in tempo reale (Server-Sent Events).
+
+NotificationHub è un broadcast in memoria del processo: ogni connessione SSE
+aperta registra una coda asyncio per il proprio utente; quando una
+Notification viene creata (signal post_save o delega multipla), dopo il
+commit il messaggio viene consegnato alle code di quell'utente.
+
+Il hub vale per il singolo processo: con più worker ogni connessione riceve
+le notifiche create dal proprio processo; quelle perse si recuperano alla
+riconnessione tramite Last-Event-ID (vedi views.notifications_stream).
+Lo stream richiede il server ASGI (scuolahub/asgi.py) e NOTIFICATIONS_SSE, es.
+    NOTIFICATIONS_SSE=True gunicorn scuolahub.asgi:application -k uvicorn.workers.UvicornWorker
+Sotto WSGI lo stream si chiude subito e la dashboard usa il polling.
+"""
+import asyncio
+import json
+import threading
+
+from django.db import transaction
+from django.urls import reverse
+
+# Oltre questo numero di messaggi in attesa la connessione è considerata
+# bloccata: i messaggi nuovi si scartano (il client li recupera riconnettendosi)
+QUEUE_SIZE = 100
+
+
+def payload(notification):
+    return {
+        "id": notification.pk,
+        "message": notification.message,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+        "is_read": notification.is_read,
+        "url": reverse("notification_detail", args=[notification.pk]),
+    }
+
+
+class NotificationHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}   # user_id -> {(loop, queue), ...}
+
+    def subscribe(self, user_id):
+        """Coda asyncio che riceve i payload destinati a user_id (da chiamare nel loop)."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(entry)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            entries = self._subscribers.get(user_id, set())
+            entries.difference_update({e for e in entries if e[1] is queue})
+            if not entries:
+                self._subscribers.pop(user_id, None)
+
+    def connections(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(entries) for entries in self._subscribers.values())
+
+    def publish(self, user_id, data):
+        """Thread-safe: può essere chiamato da codice sincrono (viste, signals)."""
+        with self._lock:
+            entries = list(self._subscribers.get(user_id, ()))
+        for loop, queue in entries:
+            try:
+                loop.call_soon_threadsafe(_put, queue, data)
+            except RuntimeError:
+                # loop già chiuso: la connessione verrà rimossa dal suo finally
+                pass
+
+
+def _put(queue, data):
+    try:
+        queue.put_nowait(data)
+    except asyncio.QueueFull:
+        pass
+
+
+hub = NotificationHub()
+
+
+def publish_on_commit(notifications):
+    """Invia le notifiche ai client connessi, solo se la transazione va a buon fine."""
+    messages = [(n.user_id, payload(n)) for n in notifications]
+    if not messages:
+        return
+
+    def send():
+        for user_id, data in messages:
+            hub.publish(user_id, data)
+    transaction.on_commit(send)
+
+
+def format_event(data):
+    return f"id: {data['id']}\nevent: notification\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,159 @@
+# projects/management/commands/benchmark_views.py
+"""
+Misura le viste principali tramite il client di test di Django sul database
+configurato (tipicamente popolato con manage.py seed_scale).
+Per ogni vista riporta in JSON: numero di query, tempo SQL, tempo totale
+(min/mediana/max su --repeat esecuzioni) e picco di memoria Python.
+
+Durante la misura il QueryInspectorMiddleware (attivo con DEBUG) viene
+tolto: le sue analisi per richiesta falserebbero tempi e memoria.
+DEBUG resta com'è, perché con DEBUG=False lo storage dei file statici
+richiede il manifest di collectstatic.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from projects.models import Call, Document, Event, Expense, ExpenseRollup, Notification, Project
+
+User = get_user_model()
+
+INSPECTOR_MIDDLEWARE = "projects.middleware.QueryInspectorMiddleware"
+
+
+class Command(BaseCommand):
+    help = "Benchmark delle viste principali (query, tempo SQL, tempo totale, memoria) in JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username con cui eseguire le richieste (default: primo superuser).")
+        parser.add_argument("--project", type=int, help="Progetto per project_detail (default: quello con più spese).")
+        parser.add_argument("--repeat", type=int, default=5, help="Esecuzioni cronometrate per vista (default: 5).")
+        parser.add_argument("--output", help="File JSON di destinazione (default: stdout).")
+        parser.add_argument("--view", action="append", dest="views",
+                            help="Misura solo questa vista (ripetibile, default: tutte).")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        project_id = options["project"] or self.biggest_project()
+        if project_id is None:
+            raise CommandError("Nessun progetto nel database: eseguire prima manage.py seed_scale.")
+
+        targets = [
+            ("dashboard", reverse("dashboard")),
+            ("projects_list", reverse("projects_list")),
+            ("project_detail", reverse("project_detail", args=[project_id])),
+            ("calendar_view", reverse("calendar")),
+            ("documents_view", reverse("documents")),
+            ("deleghe_view", reverse("deleghe")),
+            ("bandi_list", reverse("bandi_list")),
+        ]
+        if options["views"]:
+            unknown = set(options["views"]) - {name for name, _ in targets}
+            if unknown:
+                raise CommandError(f"Viste sconosciute: {', '.join(sorted(unknown))}.")
+            targets = [(name, url) for name, url in targets if name in options["views"]]
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "user": user.username,
+            "repeat": options["repeat"],
+            "dataset": self.dataset_size(),
+            "views": {},
+        }
+        middleware = [m for m in settings.MIDDLEWARE if m != INSPECTOR_MIDDLEWARE]
+        with override_settings(MIDDLEWARE=middleware):
+            client = Client(SERVER_NAME="localhost")
+            client.force_login(user)
+            for name, url in targets:
+                report["views"][name] = self.measure(client, url, options["repeat"])
+                self.stderr.write(f"{name}: {report['views'][name]['wall_ms']['median']} ms")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"Utente '{username}' inesistente.")
+        user = User.objects.filter(is_superuser=True).order_by("pk").first()
+        if user is None:
+            raise CommandError("Nessun superuser: indicare --user (deleghe_view richiede un superuser).")
+        return user
+
+    def biggest_project(self):
+        row = (
+            ExpenseRollup.objects
+            .values("project_id")
+            .annotate(n=Sum("count"))
+            .order_by("-n", "project_id")
+            .first()
+        )
+        if row:
+            return row["project_id"]
+        return Project.objects.order_by("pk").values_list("pk", flat=True).first()
+
+    def dataset_size(self):
+        return {
+            model.__name__: model.objects.count()
+            for model in (Project, Expense, Event, Document, Notification, Call)
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def measure(self, client, url, repeat):
+        # riscaldamento (cache dei template, connessione, ...)
+        self.request(client, url)
+
+        walls = []
+        for _ in range(max(1, repeat)):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = self.request(client, url)
+                walls.append((time.perf_counter() - start) * 1000)
+            # copia subito: ogni nuova richiesta azzera connection.queries
+            queries = list(ctx.captured_queries)
+
+        sql_ms = sum(float(q["time"]) for q in queries) * 1000
+
+        # Memoria misurata in un passaggio separato: tracemalloc rallenta l'esecuzione
+        tracemalloc.start()
+        self.request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "url": url,
+            "status": response.status_code,
+            "queries": len(queries),
+            "sql_ms": round(sql_ms, 2),
+            "wall_ms": {
+                "min": round(min(walls), 2),
+                "median": round(statistics.median(walls), 2),
+                "max": round(max(walls), 2),
+            },
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
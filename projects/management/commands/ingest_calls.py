@@ -0,0 +1,82 @@
+# projects/management/commands/ingest_calls.py
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa bandi da file CSV, JSON / JSON Lines o RSS / Atom (anche un'intera cartella). "
+        "Aggiorna i bandi già presenti (per codice o link) solo se il contenuto è cambiato."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="File o cartelle da importare.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(set(ingest.FORMATS.values())),
+            help="Formato dei file (default: dall'estensione).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ingest.DEFAULT_BATCH_SIZE,
+            help=f"Record per blocco/transazione (default: {ingest.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--source-name",
+            default="",
+            help="Fonte per i record che non la indicano (default: dominio del link).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Conta soltanto, senza scrivere.")
+
+    def files(self, paths, fmt):
+        for name in paths:
+            path = Path(name)
+            if path.is_dir():
+                # nelle cartelle solo le estensioni conosciute, in ordine
+                yield from sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in ingest.FORMATS)
+            elif path.is_file():
+                yield path
+            else:
+                raise CommandError(f"File o cartella inesistente: {name}")
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        total = ingest.IngestResult()
+        started = time.monotonic()
+
+        for path in self.files(options["paths"], fmt):
+            result = ingest.IngestResult()
+            try:
+                ingest.ingest(
+                    ingest.read_records(path, fmt),
+                    batch_size=options["batch_size"],
+                    default_source=options["source_name"],
+                    dry_run=options["dry_run"],
+                    result=result,
+                )
+            except (ValueError, OSError, UnicodeDecodeError, ingest.ET.ParseError) as exc:
+                # i blocchi già scritti restano: un nuovo import riparte senza doppioni
+                self.stderr.write(self.style.ERROR(f"{path}: lettura interrotta: {exc}"))
+
+            self.stdout.write(
+                f"{path}: {result.read} letti, {result.created} nuovi, {result.updated} aggiornati, "
+                f"{result.unchanged} invariati, {result.rejected} scartati."
+            )
+            for position, reason in result.errors:
+                self.stderr.write(f"  {position}: {reason}")
+            if result.rejected > len(result.errors):
+                self.stderr.write(f"  ... e altri {result.rejected - len(result.errors)} scartati.")
+
+            for attr in ("read", "created", "updated", "unchanged", "rejected"):
+                setattr(total, attr, getattr(total, attr) + getattr(result, attr))
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Totale: {total.read} letti, {total.created} nuovi, {total.updated} aggiornati, "
+            f"{total.unchanged} invariati, {total.rejected} scartati in {time.monotonic() - started:.1f}s."
+        ))
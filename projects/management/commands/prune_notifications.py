@@ -0,0 +1,74 @@
+# projects/management/commands/prune_notifications.py
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from projects import retention
+
+DURATION_RE = re.compile(r"^(\d+)([dw]?)$")
+
+
+def parse_older_than(value):
+    """"180", "180d" -> 180 giorni; "26w" -> 26 settimane."""
+    match = DURATION_RE.match(str(value).strip().lower())
+    if not match:
+        raise CommandError(f"--older-than non valido: '{value}' (es. 180, 180d, 26w).")
+    amount, unit = int(match.group(1)), match.group(2)
+    return timedelta(weeks=amount) if unit == "w" else timedelta(days=amount)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archivia in NotificationArchive e cancella le notifiche lette più vecchie "
+        "del limite, a blocchi di chiave primaria con transazioni brevi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            default=str(getattr(settings, "NOTIFICATION_RETENTION_DAYS", 180)),
+            help="Età minima delle notifiche da archiviare: giorni (180, 180d) o settimane (26w). "
+                 "Default: settings.NOTIFICATION_RETENTION_DAYS o 180.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=retention.DEFAULT_BATCH_SIZE,
+            help=f"Ampiezza dell'intervallo di id per blocco (default: {retention.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Secondi di pausa tra un blocco e l'altro (default: 0).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Conta le notifiche da archiviare senza modificare nulla.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - parse_older_than(options["older_than"])
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size deve essere positivo.")
+
+        total = chunks = 0
+        for last_id, archived in retention.prune_notifications(
+            cutoff,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            pause=options["pause"],
+        ):
+            total += archived
+            chunks += 1
+            if archived and options["verbosity"] >= 2:
+                self.stdout.write(f"Fino all'id {last_id}: {archived} notifiche.")
+
+        verb = "da archiviare (--dry-run, nessuna modifica)" if options["dry_run"] else "archiviate e cancellate"
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} notifiche lette precedenti al {cutoff:%d/%m/%Y} {verb} in {chunks} blocchi."
+        ))
@@ -0,0 +1,23 @@
+# projects/management/commands/prune_uploads.py
+from django.core.management.base import BaseCommand
+
+from projects import uploads
+from projects.management.commands.prune_notifications import parse_older_than
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina i caricamenti a blocchi fermi da troppo tempo: file parziali "
+        "dei caricamenti abbandonati e sessioni già completate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            default="2",
+            help="Giorni (2, 2d) o settimane (1w) senza blocchi ricevuti. Default: 2 giorni.",
+        )
+
+    def handle(self, *args, **options):
+        count = uploads.prune(parse_older_than(options["older_than"]))
+        self.stdout.write(self.style.SUCCESS(f"Caricamenti eliminati: {count}"))
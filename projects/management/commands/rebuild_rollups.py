@@ -0,0 +1,20 @@
+# projects/management/commands/rebuild_rollups.py
+from django.core.management.base import BaseCommand
+
+from projects import rollups
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce da zero i totali di spesa per progetto/categoria (ExpenseRollup)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Numero di righe per ogni INSERT bulk (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        created = rollups.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rollup ricostruiti: {created} righe."))
@@ -0,0 +1,25 @@
+# projects/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from projects import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricrea (se mancano) gli indici full-text di bandi e call e li riallinea ai dati. "
+        "Da eseguire dopo una migrazione SQLite che ricrea la tabella di Call o CallForProposal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.available(connection):
+            self.stdout.write(self.style.WARNING(
+                f"Nessun indice full-text per il database '{connection.vendor}': la ricerca usa icontains."
+            ))
+            return
+        search.install(connection)
+        self.stdout.write(self.style.SUCCESS("Indici full-text aggiornati."))
@@ -0,0 +1,38 @@
+# projects/management/commands/reconcile_spent.py
+from django.core.management.base import BaseCommand
+
+from projects import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Confronta Project.spent con la somma reale delle Expense "
+        "e corregge i progetti non allineati."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Progetti letti/aggiornati per blocco (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Mostra le differenze senza correggerle.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        drift = rollups.reconcile_spent(batch_size=options["batch_size"], dry_run=dry_run)
+
+        for project_id, stored, actual in drift:
+            self.stdout.write(f"Progetto {project_id}: salvato € {stored}, reale € {actual}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Nessuna differenza: Project.spent è allineato."))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} progetti non allineati (nessuna modifica, --dry-run)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(drift)} progetti corretti."))
@@ -0,0 +1,60 @@
+# projects/management/commands/run_mail_worker.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from projects import outbox
+
+
+class Command(BaseCommand):
+    help = "Consegna le email dell'outbox a blocchi, su una connessione SMTP riusata per blocco."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.DEFAULT_BATCH_SIZE,
+            help=f"Email per blocco/connessione (default: {outbox.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Secondi di attesa quando la coda è vuota (default: 5).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Svuota la coda (email già scadute) ed esce, es. da cron.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total_sent = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    sent, failed = outbox.deliver_batch(batch_size)
+                except Exception as exc:
+                    # connessione al server di posta non riuscita: blocco rilasciato
+                    self.stderr.write(f"Connessione non riuscita: {type(exc).__name__}: {exc}")
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+                    continue
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Blocco: {sent} inviate, {failed} fallite.")
+
+                if sent + failed < batch_size:
+                    # coda (momentaneamente) vuota
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Totale: {total_sent} inviate, {total_failed} fallite."))
@@ -0,0 +1,257 @@
+# projects/management/commands/seed_scale.py
+"""
+Genera un dataset sintetico e deterministico (stesso --seed => stessi dati)
+per misurare ScuolaHub a dimensioni realistiche. Tutti gli inserimenti
+passano da bulk_create; alla fine vengono ricostruiti i totali di spesa.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from projects import rollups, tags
+from projects.models import (
+    Call, Delegation, Document, Event, Expense, Milestone, Notification,
+    Project, School, SpendingLimit, UserProfile,
+)
+
+User = get_user_model()
+
+VENDORS = [
+    "Tecnoscuola Srl", "Arredi Didattici SpA", "Formazione Plus", "Digital Lab Srl",
+    "Edilizia Nord", "Cartoleria Centrale", "Servizi Integrati Coop", "Elettronica Sud",
+]
+LIMIT_CATEGORIES = [key for key, _ in SpendingLimit.CATEGORY_CHOICES]
+EXPENSE_CATEGORIES = [key for key, _ in Expense.CATEGORY_CHOICES]
+PROGRAMS = [key for key, _ in Project.PROGRAM_CHOICES]
+CALL_TAGS = ["digitale", "inclusione", "STEM", "laboratori", "mobilità", "edilizia", "formazione", "lingue"]
+
+
+class Command(BaseCommand):
+    help = "Genera dati sintetici deterministici per benchmark (scuole, progetti, spese, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schools", type=int, default=10)
+        parser.add_argument("--projects-per-school", type=int, default=20)
+        parser.add_argument("--expenses-per-project", type=int, default=200)
+        parser.add_argument("--users-per-school", type=int, default=5)
+        parser.add_argument("--events-per-user", type=int, default=20)
+        parser.add_argument("--calls", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--anchor-date", default="2025-09-01",
+                            help="Data di riferimento per le date generate (AAAA-MM-GG).")
+        parser.add_argument("--prefix", default="scale",
+                            help="Prefisso per nomi utente e scuole generate.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.anchor = date.fromisoformat(options["anchor_date"])
+        prefix = options["prefix"]
+
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(
+                f"Esistono già utenti con prefisso '{prefix}_': usa un --prefix diverso."
+            )
+
+        with transaction.atomic():
+            admin, users_by_school, schools = self.create_schools_and_users(prefix, options)
+            projects = self.create_projects(schools, options["projects_per_school"])
+            self.create_expenses(projects, options["expenses_per_project"])
+            self.create_limits_and_milestones(projects)
+            self.create_documents(projects, users_by_school)
+            self.create_delegations(projects, admin, users_by_school)
+            self.create_events(users_by_school, projects, options["events_per_user"])
+            self.create_calls(options["calls"])
+
+            rollups.rebuild()
+            rollups.reconcile_spent()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset generato: {len(schools)} scuole, {len(projects)} progetti, "
+            f"{len(projects) * options['expenses_per_project']} spese. "
+            f"Utente amministratore: {admin.username}"
+        ))
+
+    # ------------------------------------------------------------------
+
+    def day(self, low, high):
+        return self.anchor + timedelta(days=self.rng.randint(low, high))
+
+    def moment(self, low, high):
+        return timezone.make_aware(datetime.combine(self.day(low, high), time(self.rng.randint(7, 19), 0)))
+
+    def create_schools_and_users(self, prefix, options):
+        password = make_password("scuolahub")
+
+        admin = User.objects.create(
+            username=f"{prefix}_admin", email=f"{prefix}_admin@example.com",
+            password=password, is_staff=True, is_superuser=True,
+        )
+
+        schools = School.objects.bulk_create([
+            School(name=f"{prefix.capitalize()} Istituto {i:04d}", code=f"{prefix[:4].upper()}{i:06d}")
+            for i in range(options["schools"])
+        ])
+
+        users = []
+        for i, school in enumerate(schools):
+            for j in range(options["users_per_school"]):
+                users.append(User(
+                    username=f"{prefix}_s{i:04d}_u{j:02d}",
+                    email=f"{prefix}_s{i:04d}_u{j:02d}@example.com",
+                    password=password,
+                ))
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        per_school = options["users_per_school"]
+        users_by_school = {
+            school.pk: users[i * per_school:(i + 1) * per_school]
+            for i, school in enumerate(schools)
+        }
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, school_id=school_id)
+             for school_id, school_users in users_by_school.items() for user in school_users],
+            batch_size=self.batch_size,
+        )
+        return admin, users_by_school, schools
+
+    def create_projects(self, schools, per_school):
+        projects = []
+        for school in schools:
+            for k in range(per_school):
+                start = self.day(-720, 180)
+                projects.append(Project(
+                    school=school,
+                    title=f"{school.name} – Progetto {k:03d}",
+                    program=self.rng.choice(PROGRAMS),
+                    start_date=start,
+                    end_date=start + timedelta(days=self.rng.randint(180, 900)),
+                    budget=Decimal(self.rng.randint(20, 500)) * 1000,
+                    cup=f"CUP{self.rng.randint(10**9, 10**10 - 1)}",
+                    cig=f"CIG{self.rng.randint(10**6, 10**7 - 1)}",
+                    status=self.rng.choice(["DRAFT", "ACTIVE", "ACTIVE", "CLOSED"]),
+                ))
+        return Project.objects.bulk_create(projects, batch_size=self.batch_size)
+
+    def create_expenses(self, projects, per_project):
+        # A blocchi: non tiene in memoria tutte le spese
+        batch = []
+        for project in projects:
+            for n in range(per_project):
+                batch.append(Expense(
+                    project=project,
+                    date=self.day(-720, 0),
+                    vendor=self.rng.choice(VENDORS),
+                    category=self.rng.choice(EXPENSE_CATEGORIES),
+                    amount=Decimal(self.rng.randint(1000, 500000)) / 100,
+                    document=f"FT {n + 1}/{self.anchor.year}",
+                ))
+                if len(batch) >= self.batch_size:
+                    Expense.objects.bulk_create(batch)
+                    batch = []
+        if batch:
+            Expense.objects.bulk_create(batch)
+
+    def create_limits_and_milestones(self, projects):
+        limits, milestones = [], []
+        for project in projects:
+            for category in self.rng.sample(LIMIT_CATEGORIES, 2):
+                limits.append(SpendingLimit(
+                    project=project, category=category, base="TOTAL_BUDGET",
+                    percentage=Decimal(self.rng.choice([10, 20, 30, 40])),
+                ))
+            for m in range(4):
+                due = project.start_date + timedelta(days=90 * (m + 1))
+                milestones.append(Milestone(
+                    project=project, title=f"Milestone {m + 1}", due_date=due,
+                    status="COMPLETED" if due < self.anchor else "PENDING",
+                ))
+        SpendingLimit.objects.bulk_create(limits, batch_size=self.batch_size)
+        Milestone.objects.bulk_create(milestones, batch_size=self.batch_size)
+
+    def create_documents(self, projects, users_by_school):
+        documents = []
+        for project in projects:
+            for d in range(2):
+                documents.append(Document(
+                    title=f"Documento {d + 1} – {project.title}",
+                    # solo metadati: nessun file viene scritto su disco
+                    file=f"documents/seed/{project.pk}_{d + 1}.pdf",
+                    project=project,
+                    uploaded_by=self.rng.choice(users_by_school[project.school_id]),
+                    uploaded_at=self.moment(-365, 0),
+                    is_final=self.rng.random() < 0.3,
+                ))
+        Document.objects.bulk_create(documents, batch_size=self.batch_size)
+
+    def create_delegations(self, projects, admin, users_by_school):
+        delegations = []
+        for project in projects:
+            for collaborator in self.rng.sample(users_by_school[project.school_id], min(2, len(users_by_school[project.school_id]))):
+                delegations.append(Delegation(
+                    project=project, creator=admin, collaborator=collaborator,
+                    role_label="Referente", status=self.rng.choice(["PENDING", "CONFIRMED", "REJECTED"]),
+                ))
+        delegations = Delegation.objects.bulk_create(delegations, batch_size=self.batch_size)
+
+        notifications = []
+        for delegation in delegations:
+            notifications.append(Notification(
+                user=delegation.collaborator, delegation=delegation,
+                message=f"Ti è stata assegnata una delega sul progetto '{delegation.project.title}'.",
+                is_read=delegation.status != "PENDING",
+            ))
+            if delegation.status != "PENDING":
+                verb = "ACCETTATA" if delegation.status == "CONFIRMED" else "RIFIUTATA"
+                notifications.append(Notification(
+                    user=admin, delegation=delegation,
+                    message=f"La delega per '{delegation.project.title}' è stata {verb} da {delegation.collaborator.username}.",
+                    is_read=self.rng.random() < 0.5,
+                ))
+        Notification.objects.bulk_create(notifications, batch_size=self.batch_size)
+
+    def create_events(self, users_by_school, projects, per_user):
+        projects_by_school = {}
+        for project in projects:
+            projects_by_school.setdefault(project.school_id, []).append(project)
+
+        events = []
+        for school_id, users in users_by_school.items():
+            for user in users:
+                for e in range(per_user):
+                    project = self.rng.choice(projects_by_school.get(school_id) or [None])
+                    events.append(Event(
+                        school_id=school_id, project=project, owner=user,
+                        title=f"Riunione {e + 1}", date=self.day(-180, 365),
+                    ))
+                if len(events) >= self.batch_size:
+                    Event.objects.bulk_create(events)
+                    events = []
+        if events:
+            Event.objects.bulk_create(events)
+
+    def create_calls(self, count):
+        statuses = [key for key, _ in Call.STATUS_CHOICES]
+        calls = [
+            Call(
+                title=f"Bando {self.rng.choice(CALL_TAGS)} {n:05d}",
+                program=self.rng.choice(PROGRAMS),
+                source=self.rng.choice(["MIM", "Regione", "Agenzia Erasmus+", "Fondazione"]),
+                deadline=self.day(-365, 365),
+                budget=Decimal(self.rng.randint(10, 5000)) * 1000,
+                status=self.rng.choice(statuses),
+                tags=", ".join(self.rng.sample(CALL_TAGS, 2)),
+            )
+            for n in range(count)
+        ]
+        calls = Call.objects.bulk_create(calls, batch_size=self.batch_size)
+        # bulk_create non emette signals: tag normalizzati a blocchi
+        for start in range(0, len(calls), self.batch_size):
+            tags.sync(calls[start:start + self.batch_size])
@@ -0,0 +1,50 @@
+# projects/management/commands/send_deadline_reminders.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "Invia le notifiche di promemoria per milestone e bandi in scadenza. "
+        "Idempotente: da eseguire ogni giorno (cron), anche più volte."
+    )
+
+    def add_arguments(self, parser):
+        default = ",".join(str(d) for d in reminders.DEFAULT_WINDOWS)
+        parser.add_argument(
+            "--windows",
+            default=default,
+            help=f"Finestre in giorni prima della scadenza, separate da virgola (default: {default}).",
+        )
+        parser.add_argument("--today", help="Data di riferimento AAAA-MM-GG (default: oggi).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=reminders.DEFAULT_BATCH_SIZE,
+            help=f"Scadenze per blocco/transazione (default: {reminders.DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Conta soltanto, senza scrivere.")
+
+    def handle(self, *args, **options):
+        try:
+            windows = [int(value) for value in options["windows"].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError(f"Finestre non valide: {options['windows']!r}")
+        if not windows or min(windows) < 0:
+            raise CommandError("Serve almeno una finestra di giorni non negativa.")
+        try:
+            today = date.fromisoformat(options["today"]) if options["today"] else None
+        except ValueError:
+            raise CommandError(f"Data non valida: {options['today']!r}")
+
+        result = reminders.send_reminders(
+            windows, today=today, batch_size=options["batch_size"], dry_run=options["dry_run"],
+        )
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Promemoria: {result.milestones} milestone, {result.calls} bandi, "
+            f"{result.notifications} notifiche ({result.already_sent} già inviati)."
+        ))
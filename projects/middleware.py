@@ -0,0 +1,56 @@
+# projects/middleware.py
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .queryinspect import N_PLUS_ONE_THRESHOLD, QUERY_BUDGETS, QueryInspector
+
+logger = logging.getLogger("projects.queries")
+
+
+class QueryInspectorMiddleware:
+    """
+    Solo sviluppo/test (attivato in settings quando DEBUG è True).
+    Conta le query di ogni richiesta, segnala nei log le impronte ripetute
+    (N+1) con la riga di template/vista che le ha generate e il superamento
+    del budget dichiarato in QUERY_BUDGETS. Aggiunge l'header X-Query-Count.
+    Sotto ASGI le richieste passano senza ispezione: le viste asincrone
+    (es. lo stream SSE) non vengono forzate in un thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.get_response(request)
+        with QueryInspector() as inspector:
+            response = self.get_response(request)
+            if response.streaming:
+                # le query di uno streaming partono dopo: qui non si vedono
+                return response
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match else None
+        response["X-Query-Count"] = str(inspector.count)
+
+        duplicates = inspector.duplicates(N_PLUS_ONE_THRESHOLD)
+        if duplicates:
+            logger.warning(
+                "Possibile N+1 su %s (%s): %d query\n%s",
+                request.path, url_name, inspector.count, inspector.report(N_PLUS_ONE_THRESHOLD),
+            )
+
+        budget = QUERY_BUDGETS.get(url_name) if request.method in ("GET", "HEAD") else None
+        if budget is not None and inspector.count > budget:
+            logger.warning(
+                "Budget query superato su %s (%s): %d query, budget %d",
+                request.path, url_name, inspector.count, budget,
+            )
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:46
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    Expense = apps.get_model("projects", "Expense")
+    ExpenseRollup = apps.get_model("projects", "ExpenseRollup")
+    grouped = (
+        Expense.objects
+        .values("project_id", "category")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by()
+    )
+    ExpenseRollup.objects.bulk_create(
+        [
+            ExpenseRollup(
+                project_id=row["project_id"],
+                category=row["category"],
+                total=row["total"] or Decimal("0"),
+                count=row["count"],
+            )
+            for row in grouped
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0018_alter_expense_category_delete_expensecategory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('MATERIALS', 'Materiali'), ('SERVICES', 'Servizi'), ('TRAINING', 'Formazione'), ('OTHER', 'Altro'), ('DOTAZIONI DIGITALI', 'Dotazioni digitali'), ('ARREDI', 'Arredi'), ('INTERVENTI EDILIZI', 'Interventi edilizi'), ('TECNICO-OPERATIVE', 'Tecnico-operative')], max_length=32)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_rollups', to='projects.project')),
+            ],
+            options={
+                'ordering': ['project', 'category'],
+                'unique_together': {('project', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
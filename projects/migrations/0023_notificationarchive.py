@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0022_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(unique=True)),
+                ('user_id', models.BigIntegerField(db_index=True)),
+                ('delegation_id', models.BigIntegerField(blank=True, null=True)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notifica archiviata',
+                'verbose_name_plural': 'Notifiche archiviate',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Indici full-text per Call e CallForProposal (vedi projects/search.py):
+# FTS5 + trigger su SQLite, colonna tsvector generata + GIN su PostgreSQL.
+# SQL scritto qui per intero: la migrazione non deve cambiare se cambia search.py.
+
+from django.db import migrations
+
+CALL_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS projects_call_fts USING fts5("
+    "title, tags, source, notes, content='projects_call', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_ai AFTER INSERT ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(rowid, title, tags, source, notes) "
+    "VALUES (new.id, new.title, new.tags, new.source, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_ad AFTER DELETE ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(projects_call_fts, rowid, title, tags, source, notes) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.source, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_au AFTER UPDATE ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(projects_call_fts, rowid, title, tags, source, notes) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.source, old.notes); "
+    "INSERT INTO projects_call_fts(rowid, title, tags, source, notes) "
+    "VALUES (new.id, new.title, new.tags, new.source, new.notes); END",
+    "INSERT INTO projects_call_fts(projects_call_fts) VALUES ('rebuild')",
+]
+
+CALLFORPROPOSAL_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS projects_callforproposal_fts USING fts5("
+    "title, summary, requirements, content='projects_callforproposal', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_ai AFTER INSERT ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(rowid, title, summary, requirements) "
+    "VALUES (new.id, new.title, new.summary, new.requirements); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_ad AFTER DELETE ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts, rowid, title, summary, requirements) "
+    "VALUES ('delete', old.id, old.title, old.summary, old.requirements); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_au AFTER UPDATE ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts, rowid, title, summary, requirements) "
+    "VALUES ('delete', old.id, old.title, old.summary, old.requirements); "
+    "INSERT INTO projects_callforproposal_fts(rowid, title, summary, requirements) "
+    "VALUES (new.id, new.title, new.summary, new.requirements); END",
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts) VALUES ('rebuild')",
+]
+
+INSTALL = {
+    "sqlite": CALL_FTS_SQLITE + CALLFORPROPOSAL_FTS_SQLITE,
+    "postgresql": [
+        "ALTER TABLE projects_call ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('italian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('italian', coalesce(tags, '')), 'B') || "
+        "setweight(to_tsvector('italian', coalesce(source, '')), 'C') || "
+        "setweight(to_tsvector('italian', coalesce(notes, '')), 'D')) STORED",
+        "CREATE INDEX IF NOT EXISTS projects_call_search_idx ON projects_call USING GIN (search_vector)",
+        "ALTER TABLE projects_callforproposal ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('italian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('italian', coalesce(summary, '')), 'B') || "
+        "setweight(to_tsvector('italian', coalesce(requirements, '')), 'C')) STORED",
+        "CREATE INDEX IF NOT EXISTS projects_callforproposal_search_idx "
+        "ON projects_callforproposal USING GIN (search_vector)",
+    ],
+}
+
+UNINSTALL = {
+    "sqlite": [
+        f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}"
+        for table in ("projects_call", "projects_callforproposal") for suffix in ("ai", "ad", "au")
+    ] + [
+        "DROP TABLE IF EXISTS projects_call_fts",
+        "DROP TABLE IF EXISTS projects_callforproposal_fts",
+    ],
+    "postgresql": [
+        "DROP INDEX IF EXISTS projects_call_search_idx",
+        "ALTER TABLE projects_call DROP COLUMN IF EXISTS search_vector",
+        "DROP INDEX IF EXISTS projects_callforproposal_search_idx",
+        "ALTER TABLE projects_callforproposal DROP COLUMN IF EXISTS search_vector",
+    ],
+}
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql, params=None)
+
+
+def install(apps, schema_editor):
+    _run(schema_editor, INSTALL)
+
+
+def uninstall(apps, schema_editor):
+    _run(schema_editor, UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0023_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:18
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# Trigger FTS di projects_call come in 0024_fulltext_search
+CALL_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS projects_call_fts USING fts5("
+    "title, tags, source, notes, content='projects_call', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_ai AFTER INSERT ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(rowid, title, tags, source, notes) "
+    "VALUES (new.id, new.title, new.tags, new.source, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_ad AFTER DELETE ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(projects_call_fts, rowid, title, tags, source, notes) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.source, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_call_fts_au AFTER UPDATE ON projects_call BEGIN "
+    "INSERT INTO projects_call_fts(projects_call_fts, rowid, title, tags, source, notes) "
+    "VALUES ('delete', old.id, old.title, old.tags, old.source, old.notes); "
+    "INSERT INTO projects_call_fts(rowid, title, tags, source, notes) "
+    "VALUES (new.id, new.title, new.tags, new.source, new.notes); END",
+    "INSERT INTO projects_call_fts(projects_call_fts) VALUES ('rebuild')",
+]
+
+
+def split_tags(apps, schema_editor):
+    """Divide i Call.tags esistenti ("a, b; c") in Tag + CallTag (slug univoci)."""
+    Call = apps.get_model("projects", "Call")
+    Tag = apps.get_model("projects", "Tag")
+    CallTag = apps.get_model("projects", "CallTag")
+
+    names = {}
+    links = set()
+    for call_id, text in Call.objects.exclude(tags__isnull=True).exclude(tags="").values_list("pk", "tags").iterator():
+        for raw in re.split(r"[,;]", text):
+            name = " ".join(raw.split())[:50]
+            slug = slugify(name)[:50]
+            if slug:
+                names.setdefault(slug, name)
+                links.add((call_id, slug))
+
+    Tag.objects.bulk_create([Tag(slug=slug, name=name) for slug, name in names.items()], batch_size=500)
+    tag_ids = dict(Tag.objects.values_list("slug", "pk"))
+    CallTag.objects.bulk_create(
+        [CallTag(call_id=call_id, tag_id=tag_ids[slug]) for call_id, slug in sorted(links)],
+        batch_size=500,
+    )
+
+
+def reinstall_search(apps, schema_editor):
+    # AddField ricrea la tabella projects_call su SQLite: i trigger FTS vanno
+    # ricreati (su PostgreSQL la colonna generata resta)
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CALL_FTS_SQLITE:
+            schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0024_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CallTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.call')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='call',
+            name='normalized_tags',
+            field=models.ManyToManyField(blank=True, related_name='calls', through='projects.CallTag', to='projects.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='calltag',
+            index=models.Index(fields=['tag', 'call'], name='calltag_tag_call_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='calltag',
+            constraint=models.UniqueConstraint(fields=('call', 'tag'), name='calltag_unique'),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+        migrations.RunPython(split_tags, migrations.RunPython.noop),
+    ]
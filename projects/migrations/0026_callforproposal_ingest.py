@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+from django.db import migrations, models
+
+# Trigger FTS di projects_callforproposal come in 0024_fulltext_search
+CALLFORPROPOSAL_FTS_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS projects_callforproposal_fts USING fts5("
+    "title, summary, requirements, content='projects_callforproposal', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_ai AFTER INSERT ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(rowid, title, summary, requirements) "
+    "VALUES (new.id, new.title, new.summary, new.requirements); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_ad AFTER DELETE ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts, rowid, title, summary, requirements) "
+    "VALUES ('delete', old.id, old.title, old.summary, old.requirements); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_callforproposal_fts_au AFTER UPDATE ON projects_callforproposal BEGIN "
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts, rowid, title, summary, requirements) "
+    "VALUES ('delete', old.id, old.title, old.summary, old.requirements); "
+    "INSERT INTO projects_callforproposal_fts(rowid, title, summary, requirements) "
+    "VALUES (new.id, new.title, new.summary, new.requirements); END",
+    "INSERT INTO projects_callforproposal_fts(projects_callforproposal_fts) VALUES ('rebuild')",
+]
+
+
+def reinstall_search(apps, schema_editor):
+    # AddField ricrea la tabella projects_callforproposal su SQLite: i trigger
+    # FTS vanno ricreati (su PostgreSQL la colonna generata resta)
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CALLFORPROPOSAL_FTS_SQLITE:
+            schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0025_call_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callforproposal',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='callforproposal',
+            name='ingest_key',
+            field=models.CharField(blank=True, editable=False, max_length=300, null=True, unique=True),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0026_callforproposal_ingest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadlineReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('MILESTONE', 'Milestone'), ('CALL', 'Bando')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('window_days', models.PositiveSmallIntegerField()),
+                ('due_date', models.DateField()),
+                ('recipients', models.PositiveIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='milestone',
+            index=models.Index(fields=['due_date', 'status'], name='milestone_due_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='deadlinereminder',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'window_days', 'due_date'), name='deadline_reminder_unique'),
+        ),
+    ]
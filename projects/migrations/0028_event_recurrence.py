@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0027_deadline_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='repeat',
+            field=models.CharField(blank=True, choices=[('', 'Nessuna'), ('DAILY', 'Ogni giorno'), ('WEEKLY', 'Ogni settimana'), ('MONTHLY', 'Ogni mese')], default='', max_length=10, verbose_name='Ripetizione'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='repeat_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Numero di occorrenze'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='repeat_exceptions',
+            field=models.JSONField(blank=True, default=list, verbose_name='Date escluse'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='repeat_interval',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Ogni'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='repeat_until',
+            field=models.DateField(blank=True, null=True, verbose_name='Fino al'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series_end',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['owner', 'series_end'], name='event_owner_series_idx'),
+        ),
+    ]
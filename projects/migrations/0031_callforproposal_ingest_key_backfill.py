@@ -0,0 +1,41 @@
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations
+
+
+def call_ingest_key(internal_code, source_url):
+    # Copia di projects.models.call_ingest_key com'era a questa migrazione
+    code = " ".join((internal_code or "").split())[:50]
+    if code:
+        return f"code:{code}"
+    url = (source_url or "").strip()
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return "url:" + urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+def backfill_ingest_key(apps, schema_editor):
+    # Bandi inseriti a mano prima dell'import: stessa chiave dell'import, così
+    # il primo import li aggiorna invece di duplicarli. Doppioni: solo il primo.
+    CallForProposal = apps.get_model("projects", "CallForProposal")
+    taken = set(CallForProposal.objects.exclude(ingest_key=None).values_list("ingest_key", flat=True))
+    changed = []
+    for call in CallForProposal.objects.filter(ingest_key=None).order_by("pk").only("internal_code", "source_url"):
+        key = call_ingest_key(call.internal_code, call.source_url)
+        if key and key not in taken:
+            taken.add(key)
+            call.ingest_key = key
+            changed.append(call)
+    CallForProposal.objects.bulk_update(changed, ["ingest_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0030_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ingest_key, migrations.RunPython.noop),
+    ]
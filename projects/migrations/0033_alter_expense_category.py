@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0032_upload_claim'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.CharField(choices=[('MATERIALS', 'Materiali'), ('SERVICES', 'Servizi'), ('TRAINING', 'Formazione'), ('OTHER', 'Altro'), ('DOTAZIONI DIGITALI', 'Dotazioni digitali'), ('ARREDI', 'Arredi'), ('INTERVENTI EDILIZI', 'Interventi edilizi'), ('TECNICO-OPERATIVE', 'Tecnico-operative')], default='OTHER', max_length=32),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:21
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0033_alter_expense_category'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='spent',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
 from django.utils import timezone
 from decimal import Decimal
 from django.conf import settings
 
+from . import recurrence
+
 
 
 class School(models.Model):
@@ -34,15 +39,35 @@ class Project(models.Model):
     end_date = models.DateField(blank=True, null=True)
 
     budget = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
-    spent = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    # Contatore denormalizzato (vedi projects/rollups.py): stesse cifre di ExpenseRollup.total
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
 
     cup = models.CharField(max_length=32, blank=True, null=True)
     cig = models.CharField(max_length=32, blank=True, null=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="ACTIVE")
 
+    class Meta:
+        indexes = [
+            # elenco progetti e menu a tendina ordinati per titolo
+            models.Index(fields=["title", "id"], name="project_title_idx"),
+            # "progetti recenti" in dashboard
+            models.Index(fields=["-start_date", "-id"], name="project_start_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # spent cambia con UPDATE ... F() dai signals di Expense: un save()
+        # completo riscriverebbe il valore letto in memoria, perdendo gli
+        # incrementi concorrenti. Si salva solo se indicato in update_fields.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != "spent"
+            ]
+        super().save(*args, **kwargs)
+
 
 class Expense(models.Model):
     CATEGORY_CHOICES = [
@@ -66,11 +91,43 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [
+            # elenco spese del progetto (project_detail, export, paginazione)
+            models.Index(fields=["project", "-date", "-id"], name="expense_project_date_idx"),
+            # totali per (progetto, categoria): rebuild_rollups, filtro categoria
+            models.Index(fields=["project", "category"], name="expense_project_cat_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Salvataggio e aggiornamento dei totali (ExpenseRollup, via signals)
+        # nella stessa transazione: o entrambi o nessuno.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.project} - € {self.amount}"
 
 
+class ExpenseRollup(models.Model):
+    """
+    Totali delle spese per (progetto, categoria), mantenuti in modo incrementale
+    dai signals su Expense (vedi projects/rollups.py).
+    Evita di rifare SUM(amount) su tutte le Expense a ogni caricamento pagina.
+    Ricostruibile da zero con: manage.py rebuild_rollups
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="expense_rollups")
+    category = models.CharField(max_length=32, choices=Expense.CATEGORY_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["project", "category"]
+        unique_together = (("project", "category"),)
+
+    def __str__(self):
+        return f"{self.project} – {self.category}: € {self.total} ({self.count})"
+
+
 class SpendingLimit(models.Model):
     # Base di calcolo: coerente con le viste
     BASE_CHOICES = [
@@ -107,6 +164,8 @@ class Event(models.Model):
     - una scuola (opzionale)
     - un progetto (opzionale)
     - un utente (owner) -> calendario personale
+    Può ripetersi (repeat*): una riga per serie, occorrenze calcolate al
+    volo per l'intervallo mostrato (projects/recurrence.py).
     """
     school = models.ForeignKey(
         School,
@@ -133,10 +192,38 @@ class Event(models.Model):
     date = models.DateField(default=timezone.now)
     all_day = models.BooleanField(default=True)
 
+    # Ricorrenza: date è la prima occorrenza della serie
+    repeat = models.CharField(
+        "Ripetizione", max_length=10, choices=recurrence.FREQUENCY_CHOICES, blank=True, default="",
+    )
+    repeat_interval = models.PositiveSmallIntegerField("Ogni", default=1)
+    repeat_until = models.DateField("Fino al", null=True, blank=True)
+    repeat_count = models.PositiveIntegerField("Numero di occorrenze", null=True, blank=True)
+    repeat_exceptions = models.JSONField("Date escluse", default=list, blank=True)
+    # Ultima occorrenza possibile (date.max: senza fine); NULL per gli eventi singoli
+    series_end = models.DateField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # feed iCalendar: ETag (projects/ical.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [
+            # calendario e prossimi eventi: owner + intervallo di date
+            models.Index(fields=["owner", "date"], name="event_owner_date_idx"),
+            # serie iniziate prima dell'intervallo e non ancora finite
+            models.Index(fields=["owner", "series_end"], name="event_owner_series_idx"),
+            # feed iCalendar: conteggio e ultima modifica letti dall'indice
+            models.Index(fields=["owner", "updated_at"], name="event_owner_updated_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.series_end = recurrence.series_end(self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "series_end", "updated_at"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} ({self.date})"
@@ -176,9 +263,15 @@ class Document(models.Model):
     )
     uploaded_at = models.DateTimeField(default=timezone.now)
     is_final = models.BooleanField(default=False)
+    # calcolati durante il caricamento a blocchi (projects/uploads.py)
+    size = models.BigIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
 
     class Meta:
         ordering = ["-uploaded_at"]
+        indexes = [
+            models.Index(fields=["-uploaded_at"], name="document_uploaded_idx"),
+        ]
 
     def __str__(self):
         if self.project:
@@ -250,11 +343,33 @@ class Delegation(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # "le mie deleghe" e deleghe in attesa per collaboratore
+            models.Index(fields=["collaborator", "status"], name="delegation_collab_status_idx"),
+            # elenco deleghe (deleghe_view), dalla più recente
+            models.Index(fields=["-created_at"], name="delegation_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.collaborator} → {self.project} ({self.get_status_display()})"
 
 
+def call_ingest_key(internal_code, source_url):
+    """
+    Chiave di upsert di un bando (stessa regola dell'import, projects/ingest.py):
+    "code:<codice>" se c'è il codice interno, altrimenti "url:<link>" con
+    schema e host in minuscolo e senza frammento; None se mancano entrambi.
+    """
+    code = " ".join((internal_code or "").split())[:50]
+    if code:
+        return f"code:{code}"
+    url = (source_url or "").strip()
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return "url:" + urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
 class CallForProposal(models.Model):
     """
     Bando unificato: rappresenta bandi PNRR, FESR, FSE, Erasmus+, ecc.
@@ -340,11 +455,29 @@ class CallForProposal(models.Model):
     imported_at = models.DateTimeField("Inserito il", auto_now_add=True)
     last_update = models.DateTimeField("Ultimo aggiornamento", auto_now=True)
 
+    # Import automatico (projects/ingest.py): chiave di upsert ricavata da
+    # internal_code o, in mancanza, da source_url (call_ingest_key), anche per
+    # i bandi inseriti a mano, così l'import li aggiorna invece di duplicarli
+    ingest_key = models.CharField(max_length=300, unique=True, blank=True, null=True, editable=False)
+    # SHA-256 del record normalizzato: se non cambia, il record non si riscrive
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
     class Meta:
         ordering = ["-deadline_date", "title"]
         verbose_name = "Bando"
         verbose_name_plural = "Bandi"
 
+    def save(self, *args, **kwargs):
+        key = call_ingest_key(self.internal_code, self.source_url)
+        if key != self.ingest_key:
+            # chiave già di un altro bando (doppione inserito a mano): resta vuota
+            taken = key and CallForProposal.objects.filter(ingest_key=key).exclude(pk=self.pk).exists()
+            self.ingest_key = None if taken else key
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "ingest_key"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.title
 
@@ -369,7 +502,12 @@ class Call(models.Model):
     deadline = models.DateField(blank=True, null=True)
     budget = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="APERTO")
+    # Testo libero separato da virgole, come inserito (admin, import);
+    # normalized_tags ne è la versione normalizzata, allineata da projects/tags.py
     tags = models.CharField(max_length=255, blank=True, null=True)
+    normalized_tags = models.ManyToManyField(
+        "Tag", through="CallTag", related_name="calls", blank=True,
+    )
     link = models.URLField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
 
@@ -377,11 +515,47 @@ class Call(models.Model):
 
     class Meta:
         ordering = ["-deadline", "title"]
+        indexes = [
+            # bandi_list: ordinamento per scadenza, titolo
+            models.Index(fields=["deadline", "title"], name="call_deadline_title_idx"),
+            # bandi_list con filtri programma/stato
+            models.Index(fields=["program", "status", "deadline"], name="call_program_status_idx"),
+            models.Index(fields=["status", "deadline"], name="call_status_deadline_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class Tag(models.Model):
+    """Tag normalizzato dei bandi: slug univoco (minuscolo, senza accenti)."""
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=50, unique=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class CallTag(models.Model):
+    call = models.ForeignKey(Call, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["call", "tag"], name="calltag_unique"),
+        ]
+        indexes = [
+            # filtro per tag e conteggi per tag senza leggere la tabella
+            models.Index(fields=["tag", "call"], name="calltag_tag_call_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.call_id} – {self.tag_id}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -404,6 +578,17 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # notifiche dell'utente, dalla più recente
+            models.Index(fields=["user", "-created_at"], name="notification_user_created_idx"),
+            # solo le non lette: "segna tutte come lette" e il conteggio del
+            # badge non scorrono lo storico già letto
+            models.Index(
+                fields=["user", "created_at"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+        ]
 
     def __str__(self):
         txt = self.message
@@ -412,39 +597,69 @@ class Notification(models.Model):
         return f"{self.user} – {txt}"
 
 
+class NotificationArchive(models.Model):
+    """
+    Notifiche lette rimosse da manage.py prune_notifications.
+    Copia compatta: niente chiavi esterne (utente/delega possono sparire),
+    solo gli id originali e il testo.
+    """
+    notification_id = models.BigIntegerField(unique=True)
+    user_id = models.BigIntegerField(db_index=True)
+    delegation_id = models.BigIntegerField(null=True, blank=True)
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
-class Milestone(models.Model):
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Notifica archiviata"
+        verbose_name_plural = "Notifiche archiviate"
+
+    def __str__(self):
+        return f"#{self.notification_id} ({self.created_at:%d/%m/%Y})"
+
+
+class OutboxEmail(models.Model):
+    """
+    Email in uscita: le viste la accodano qui (nella loro transazione) e
+    manage.py run_mail_worker la consegna a blocchi (vedi projects/outbox.py).
+    """
     STATUS_CHOICES = [
-        ("PENDING", "In attesa"),
-        ("COMPLETED", "Completata"),
-        ("DELAYED", "In ritardo"),
-        ("CANCELED", "Annullata"),
+        ("PENDING", "In coda"),
+        ("SENDING", "In invio"),
+        ("SENT", "Inviata"),
+        ("DEAD", "Non consegnabile"),
     ]
 
-    project = models.ForeignKey(
-        "Project",
-        on_delete=models.CASCADE,
-        related_name="milestones",
-        verbose_name="Progetto"
-    )
-    title = models.CharField(max_length=200, verbose_name="Titolo Milestone")
-    description = models.TextField(blank=True, null=True, verbose_name="Descrizione")
-    due_date = models.DateField(verbose_name="Data di Scadenza")
-    status = models.CharField(
-        max_length=10,
-        choices=STATUS_CHOICES,
-        default="PENDING",
-        verbose_name="Stato"
-    )
-    completed_date = models.DateField(blank=True, null=True, verbose_name="Data di Completamento")
+    to = models.TextField(help_text="Destinatari separati da virgola")
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        ordering = ["due_date"]
-        verbose_name = "Milestone"
-        verbose_name_plural = "Milestone"
+        ordering = ["next_attempt_at", "id"]
+        verbose_name = "Email in uscita"
+        verbose_name_plural = "Email in uscita"
+        indexes = [
+            # il worker cerca solo le email in coda già scadute
+            models.Index(fields=["status", "next_attempt_at", "id"], name="outbox_due_idx"),
+            models.Index(fields=["claim_token"], name="outbox_claim_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.project.title} - {self.title}"
+        return f"{self.subject} → {self.to} ({self.get_status_display()})"
+
 
 
 class UserProfile(models.Model):
@@ -492,11 +707,105 @@ class Milestone(models.Model):
         verbose_name="Stato"
     )
     completed_date = models.DateField(blank=True, null=True, verbose_name="Data di Completamento")
+    # feed iCalendar: ETag (projects/ical.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["due_date"]
         verbose_name = "Milestone"
         verbose_name_plural = "Milestone"
+        indexes = [
+            # promemoria scadenze: intervalli di date, stato letto dall'indice
+            models.Index(fields=["due_date", "status"], name="milestone_due_status_idx"),
+            # feed iCalendar: conteggio e ultima modifica per progetto dall'indice
+            models.Index(fields=["project", "updated_at"], name="milestone_project_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.project.title} - {self.title}"
+
+
+class DeadlineReminder(models.Model):
+    """
+    Registro dei promemoria di scadenza inviati (projects/reminders.py): uno
+    per oggetto, finestra e data di scadenza. Rende idempotenti le esecuzioni
+    ripetute; se la scadenza viene spostata il promemoria riparte.
+    """
+    KIND_CHOICES = [
+        ("MILESTONE", "Milestone"),
+        ("CALL", "Bando"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    window_days = models.PositiveSmallIntegerField()
+    due_date = models.DateField()
+    recipients = models.PositiveIntegerField(default=0)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "window_days", "due_date"],
+                name="deadline_reminder_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} – {self.window_days} giorni"
+
+
+class CalendarToken(models.Model):
+    """
+    Chiave segreta del feed iCalendar personale (/calendario/feed/<token>.ics):
+    i client di calendario non hanno la sessione, il token identifica l'utente.
+    Rigenerarlo disattiva il link precedente.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="calendar_token",
+    )
+    token = models.CharField(max_length=64, unique=True)
+    issued_at = models.DateTimeField(auto_now=True)     # ultima (ri)generazione
+
+    class Meta:
+        verbose_name = "Token calendario"
+        verbose_name_plural = "Token calendario"
+
+    def __str__(self):
+        return f"{self.user} ({self.issued_at:%d/%m/%Y})"
+
+
+class UploadSession(models.Model):
+    """
+    Caricamento a blocchi in corso (projects/uploads.py): i blocchi si
+    accodano a un file parziale e `received` conta i byte confermati, da cui
+    riprende un caricamento interrotto. Completato, diventa un Document.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    title = models.CharField(max_length=200)
+    project = models.ForeignKey(Project, on_delete=models.SET_NULL, null=True, blank=True)
+    is_final = models.BooleanField(default=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # SHA-256 atteso dal client (facoltativo): verificato alla fine
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
+    # Prenotazione del blocco in scrittura (come OutboxEmail): una sola
+    # richiesta alla volta scrive sul file parziale
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Caricamento in corso"
+        verbose_name_plural = "Caricamenti in corso"
+        indexes = [
+            # pulizia dei caricamenti abbandonati
+            models.Index(fields=["updated_at"], name="upload_updated_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.project.title} - {self.title}"
\ No newline at end of file
+        return f"{self.filename} ({self.received}/{self.size})"
@@ -0,0 +1,177 @@
+# projects/outbox.py
+"""
+Outbox delle email.
+
+Le viste non parlano mai con il server SMTP: enqueue() scrive una riga
+OutboxEmail nella stessa transazione della richiesta (se la richiesta fallisce
+l'email non parte). Il processo manage.py run_mail_worker chiama
+deliver_batch() in ciclo:
+1. "prenota" un blocco di email scadute con un UPDATE condizionato
+   (status PENDING -> SENDING + claim_token): più worker non si pestano i piedi
+   anche senza SELECT ... FOR UPDATE (che SQLite non ha);
+2. apre UNA connessione (get_connection) e la riusa per tutto il blocco;
+3. le email riuscite diventano SENT; le fallite tornano PENDING con attesa
+   esponenziale, oppure DEAD dopo MAX_ATTEMPTS tentativi.
+Se la connessione non si apre (server giù) il problema non è delle email:
+il blocco torna PENDING tra BACKOFF_BASE senza consumare tentativi e
+l'errore risale al worker, altrimenti un'interruzione del server SMTP
+manderebbe in DEAD l'intera coda.
+Le prenotazioni di un worker morto a metà tornano disponibili dopo
+CLAIM_TIMEOUT e la ripresa conta come tentativo: un'email che fa cadere il
+worker finisce in DEAD invece di essere ripresa all'infinito.
+Un worker solo lento può quindi perdere la prenotazione: prima di ogni invio
+la rinnova (UPDATE condizionato sul proprio claim_token) e scrive l'esito solo
+sulle righe che hanno ancora il suo claim_token, così non sovrascrive né
+invia una seconda volta le email che un altro worker ha ripreso.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+DEFAULT_BATCH_SIZE = 50
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 6)
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def _recipients(to):
+    if isinstance(to, str):
+        to = to.split(",")
+    return ",".join(addr.strip() for addr in to if addr and addr.strip())
+
+
+def enqueue(to, subject, body, html_body="", from_email=""):
+    """Accoda un'email; None se non ci sono destinatari validi."""
+    to = _recipients(to)
+    if not to:
+        return None
+    return OutboxEmail.objects.create(
+        to=to, subject=subject[:255], body=body, html_body=html_body, from_email=from_email,
+    )
+
+
+def enqueue_many(messages, batch_size=500):
+    """messages: iterabile di dict con le chiavi di enqueue(). Un solo bulk_create."""
+    rows = []
+    for message in messages:
+        to = _recipients(message["to"])
+        if to:
+            rows.append(OutboxEmail(
+                to=to,
+                subject=message["subject"][:255],
+                body=message["body"],
+                html_body=message.get("html_body", ""),
+                from_email=message.get("from_email", ""),
+            ))
+    return OutboxEmail.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def backoff(attempts):
+    """Attesa prima del tentativo successivo: 1, 2, 4, ... minuti (max 6 ore)."""
+    return min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+
+
+def claim(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """Prenota fino a batch_size email da inviare e le restituisce."""
+    now = now or timezone.now()
+    pending = Q(status="PENDING", next_attempt_at__lte=now)
+    stale = Q(status="SENDING", claimed_at__lt=now - CLAIM_TIMEOUT)
+    candidates = list(
+        OutboxEmail.objects.filter(pending | stale)
+        .order_by("next_attempt_at", "id")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+
+    token = uuid.uuid4()
+    rows = OutboxEmail.objects.filter(pk__in=candidates)
+    rows.filter(pending).update(status="SENDING", claim_token=token, claimed_at=now)
+    # prenotazione scaduta: il worker si è fermato durante l'invio, è un tentativo
+    rows.filter(stale, attempts__gte=MAX_ATTEMPTS - 1).update(
+        status="DEAD", attempts=F("attempts") + 1, claim_token=None,
+        last_error="Invio interrotto: prenotazione scaduta",
+    )
+    rows.filter(stale).update(status="SENDING", claim_token=token, claimed_at=now, attempts=F("attempts") + 1)
+    return list(OutboxEmail.objects.filter(claim_token=token).order_by("next_attempt_at", "id"))
+
+
+def _message(row, connection):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email or None,
+        to=row.to.split(","),
+        connection=connection,
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, "text/html")
+    return message
+
+
+def _failed(row, error, now):
+    row.attempts += 1
+    row.last_error = f"{type(error).__name__}: {error}"[:2000]
+    row.claim_token = None
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = "DEAD"
+    else:
+        row.status = "PENDING"
+        row.next_attempt_at = now + backoff(row.attempts)
+
+
+def deliver_batch(batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    """
+    Invia un blocco di email su un'unica connessione.
+    Restituisce (inviate, fallite); (0, 0) se la coda è vuota.
+    Se la connessione non si apre rilascia il blocco e rilancia l'errore.
+    """
+    rows = claim(batch_size)
+    if not rows:
+        return 0, 0
+
+    token = rows[0].claim_token
+    now = timezone.now()
+    connection = connection or get_connection(fail_silently=False)
+    delivered, failures = [], []
+    try:
+        connection.open()
+    except Exception as exc:
+        # server non raggiungibile: il blocco riprova più tardi, senza tentativi consumati
+        OutboxEmail.objects.filter(claim_token=token).update(
+            status="PENDING", claim_token=None, next_attempt_at=now + BACKOFF_BASE,
+            last_error=f"{type(exc).__name__}: {exc}"[:2000],
+        )
+        raise
+
+    try:
+        for row in rows:
+            # rinnova la prenotazione; 0 righe: ripresa da un altro worker
+            if not OutboxEmail.objects.filter(pk=row.pk, claim_token=token).update(claimed_at=timezone.now()):
+                continue
+            try:
+                connection.send_messages([_message(row, connection)])
+            except Exception as exc:
+                _failed(row, exc, now)
+                failures.append(row)
+            else:
+                delivered.append(row.pk)
+    finally:
+        connection.close()
+
+    mine = OutboxEmail.objects.filter(claim_token=token)
+    if delivered:
+        mine.filter(pk__in=delivered).update(status="SENT", sent_at=timezone.now(), claim_token=None, last_error="")
+    for row in failures:
+        mine.filter(pk=row.pk).update(
+            status=row.status, attempts=row.attempts, next_attempt_at=row.next_attempt_at,
+            last_error=row.last_error, claim_token=None,
+        )
+    return len(delivered), len(failures)
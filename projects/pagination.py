@@ -0,0 +1,110 @@
+# projects/pagination.py
+"""
+Paginazione "keyset" (a cursore) per liste lunghe.
+
+Invece di OFFSET, ogni pagina riparte dai valori dell'ultima riga vista
+(es. data e id), con una condizione WHERE sugli stessi campi dell'ordinamento:
+la pagina N costa come la prima. Il cursore passato nell'URL è opaco
+(JSON in base64 url-safe); un cursore non valido riporta alla prima pagina.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    """Valori del cursore, oppure None se mancante o non valido."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    if not all(isinstance(v, (str, int)) and not isinstance(v, bool) for v in values):
+        return None
+    return values
+
+
+def _beyond(fields, values, descending):
+    """
+    Condizione "(f1, f2, ...) dopo (v1, v2, ...)" nell'ordinamento dato:
+    f1 < v1 OR (f1 = v1 AND f2 < v2) OR ...  (con > se crescente)
+    """
+    op = "lt" if descending else "gt"
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f"{field}__{op}": values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field: prev_value})
+        condition |= step
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_other_pages(self):
+        return bool(self.next_cursor or self.prev_cursor)
+
+
+def keyset_page(qs, fields, after=None, before=None, size=PAGE_SIZE, descending=True):
+    """
+    Una pagina di qs ordinata per fields (tutti decrescenti o tutti crescenti;
+    l'ultimo campo deve essere univoco, es. "id").
+    after: cursore per la pagina successiva; before: per la precedente.
+    """
+    fields = list(fields)
+    order = [f"-{f}" if descending else f for f in fields]
+    reverse_order = [f if descending else f"-{f}" for f in fields]
+
+    after_values = decode_cursor(after, len(fields))
+    before_values = decode_cursor(before, len(fields)) if after_values is None else None
+
+    try:
+        if before_values is not None:
+            page_qs = qs.filter(_beyond(fields, before_values, not descending))
+        elif after_values is not None:
+            page_qs = qs.filter(_beyond(fields, after_values, descending))
+        else:
+            page_qs = qs
+    except (ValidationError, ValueError, TypeError):
+        # Valori del cursore non validi per i campi (es. data malformata,
+        # testo al posto dell'id, numero al posto della data)
+        page_qs, after_values, before_values = qs, None, None
+
+    if before_values is not None:
+        # Pagina precedente: leggo all'indietro e poi ribalto
+        rows = list(page_qs.order_by(*reverse_order)[:size + 1])
+        has_more = len(rows) > size
+        items = rows[:size][::-1]
+        has_prev, has_next = has_more, True
+    else:
+        rows = list(page_qs.order_by(*order)[:size + 1])
+        items = rows[:size]
+        has_prev, has_next = after_values is not None, len(rows) > size
+
+    def cursor_of(obj):
+        return encode_cursor([getattr(obj, f) for f in fields])
+
+    return KeysetPage(
+        items,
+        next_cursor=cursor_of(items[-1]) if items and has_next else None,
+        prev_cursor=cursor_of(items[0]) if items and has_prev else None,
+    )
@@ -0,0 +1,155 @@
+# projects/queryinspect.py
+"""
+Ispezione delle query SQL eseguite durante una richiesta (o un blocco di codice).
+
+Ogni statement viene ridotto a una "impronta" (SQL con i segnaposto, liste IN
+compattate): la stessa impronta ripetuta più volte nella stessa richiesta è il
+sintomo tipico di un N+1 (es. d.project.title in un ciclo senza select_related).
+Per ogni impronta si ricorda da dove è partita la prima query: riga del
+template e/o funzione del progetto (vista, modello, ...).
+
+QUERY_BUDGETS dichiara il numero massimo di query per URL name: il middleware
+lo segnala nei log in sviluppo, i test in projects/tests.py lo fanno rispettare.
+"""
+import os
+import re
+import sys
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.template.base import Node
+
+# Stessa impronta ripetuta almeno N volte in una richiesta => probabile N+1
+N_PLUS_ONE_THRESHOLD = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 3)
+
+# Numero massimo di query per URL name in GET, a cache vuota
+# (include sessione e utente autenticato).
+QUERY_BUDGETS = {
+    "dashboard": 8,         # prossimi eventi: singoli + serie ricorrenti già iniziate
+    "projects_list": 4,
+    "project_detail": 7,
+    "projects_by_school": 5,
+    "expenses_export_csv": 4,
+    "expense_import": 3,
+    "calendar": 7,          # eventi, milestone, bandi, progetti del modulo (in cache dopo la prima), link del feed
+    "calendar_view": 7,
+    "calendar_ics": 5,      # token, due aggregati per ETag, eventi, milestone
+    "calendar_week": 3,     # solo struttura: eventi dal JSON
+    "calendar_agenda": 3,
+    "calendar_events_json": 3,
+    "documents": 4,
+    "deleghe": 5,
+    "bandi_list": 6,        # bandi, tag (prefetch), conteggi; con ?q= anche l'indice full-text
+    "bando_detail": 3,
+    "notification_detail": 4,
+    "notifications_inbox": 4,
+    "limits_report": 4,
+    "limits_report_json": 3,
+    "unread_notifications_json": 3,
+}
+
+_IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)")
+_SPACES_RE = re.compile(r"\s+")
+_BULK_INSERT_RE = re.compile(r"^INSERT .* VALUES \([^)]*\), \(", re.DOTALL)
+
+_PROJECT_DIR = str(settings.BASE_DIR)
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def fingerprint(sql):
+    """Forma della query, indipendente dai valori dei parametri."""
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def _template_origin(frame_self):
+    # type() e non isinstance(): quest'ultimo legge __class__ e risolverebbe
+    # oggetti lazy (es. request.user) eseguendo altre query
+    if not issubclass(type(frame_self), Node):
+        return None
+    token = getattr(frame_self, "token", None)
+    origin = getattr(frame_self, "origin", None)
+    if token is None or origin is None:
+        return None
+    name = getattr(origin, "template_name", None) or origin.name
+    return f"{name}:{token.lineno}"
+
+
+def query_origin():
+    """
+    Riga del template e prima funzione del progetto che hanno causato la query
+    corrente, es. "deleghe.html:176 via projects/views.py:826 (deleghe_view)".
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        if template is None:
+            template = _template_origin(frame.f_locals.get("self"))
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            code is None
+            and filename.startswith(_PROJECT_DIR)
+            and filename != _THIS_FILE
+            and "site-packages" not in filename
+        ):
+            relative = os.path.relpath(filename, _PROJECT_DIR)
+            code = f"{relative}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+
+    if template and code:
+        return f"{template} via {code}"
+    return template or code or "?"
+
+
+class QueryInspector:
+    """
+    Context manager che registra le query eseguite su una connessione:
+
+        with QueryInspector() as inspector:
+            ...
+        inspector.count, inspector.duplicates()
+    """
+
+    def __init__(self, connection=None, with_origin=True):
+        self.connection = connection or default_connection
+        self.with_origin = with_origin
+        self.count = 0
+        self.shapes = {}   # impronta -> [numero esecuzioni, origine della prima]
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if _BULK_INSERT_RE.search(sql):
+            # bulk_create diviso in blocchi dal limite di parametri del database:
+            # INSERT multi-riga ripetuti non sono un N+1
+            return execute(sql, params, many, context)
+        key = fingerprint(sql)
+        entry = self.shapes.get(key)
+        if entry is None:
+            self.shapes[key] = [1, query_origin() if self.with_origin else None]
+        else:
+            entry[0] += 1
+        return execute(sql, params, many, context)
+
+    def duplicates(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(impronta, esecuzioni, origine)] delle query ripetute, le più frequenti prima."""
+        repeated = [
+            (key, times, origin)
+            for key, (times, origin) in self.shapes.items()
+            if times >= threshold
+        ]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def report(self, threshold=N_PLUS_ONE_THRESHOLD):
+        lines = [
+            f"{times}x {key[:200]}\n    da {origin}"
+            for key, times, origin in self.duplicates(threshold)
+        ]
+        return "\n".join(lines)
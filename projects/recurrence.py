@@ -0,0 +1,169 @@
+# projects/recurrence.py
+"""
+Eventi ricorrenti (regole in stile RRULE, salvate una volta per serie su Event).
+
+- repeat: DAILY, WEEKLY, MONTHLY (vuoto = evento singolo)
+- repeat_interval: ogni N giorni/settimane/mesi
+- repeat_until / repeat_count: fine della serie (facoltativi, anche insieme:
+  vale il primo raggiunto)
+- repeat_exceptions: date ISO delle occorrenze saltate
+
+Le occorrenze non diventano righe: si calcolano solo per l'intervallo
+mostrato. La n-esima occorrenza si ottiene per aritmetica sulle date, senza
+scorrere la serie dall'inizio: una serie settimanale di dieci anni costa
+quanto un evento singolo.
+Mensile: stesso giorno del mese; nei mesi più corti l'ultimo giorno del mese
+(il 31 diventa 30, 29 o 28), il mese non viene saltato.
+
+Event.series_end (ultima occorrenza possibile, date.max se la serie non
+finisce; NULL per gli eventi singoli) permette di leggere le serie iniziate
+prima dell'intervallo con una ricerca sull'indice (owner, series_end).
+"""
+import calendar
+import copy
+import heapq
+from datetime import date, timedelta
+from itertools import islice
+
+DAILY = "DAILY"
+WEEKLY = "WEEKLY"
+MONTHLY = "MONTHLY"
+
+FREQUENCY_CHOICES = [
+    ("", "Nessuna"),
+    (DAILY, "Ogni giorno"),
+    (WEEKLY, "Ogni settimana"),
+    (MONTHLY, "Ogni mese"),
+]
+
+# Limiti dei moduli: intervallo entro PositiveSmallIntegerField, numero di
+# occorrenze entro date ragionevoli anche per le serie giornaliere
+MAX_INTERVAL = 999
+MAX_COUNT = 5000
+
+# Colonne di Event che descrivono la regola, nell'ordine di Rule()
+RULE_FIELDS = ("date", "repeat", "repeat_interval", "repeat_until", "repeat_count", "repeat_exceptions")
+
+
+def _add_months(day, months, anchor_day):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+class Rule:
+    """Regola di ripetizione di una serie, a partire dalla data del primo evento."""
+
+    def __init__(self, start, repeat="", interval=1, until=None, count=None, exceptions=()):
+        self.start = start
+        self.repeat = repeat or ""
+        self.interval = max(int(interval or 1), 1)
+        self.until = until
+        self.count = count
+        self.exceptions = {date.fromisoformat(d) if isinstance(d, str) else d for d in exceptions or ()}
+
+    @classmethod
+    def for_event(cls, event):
+        return cls(*(getattr(event, name) for name in RULE_FIELDS))
+
+    def nth(self, n):
+        """Data della n-esima occorrenza (da 0), eccezioni e fine serie escluse."""
+        if self.repeat == DAILY:
+            return self.start + timedelta(days=n * self.interval)
+        if self.repeat == WEEKLY:
+            return self.start + timedelta(weeks=n * self.interval)
+        if self.repeat == MONTHLY:
+            return _add_months(self.start, n * self.interval, self.start.day)
+        return self.start
+
+    def _first_index(self, day):
+        """Indice della prima occorrenza in data >= day."""
+        if day <= self.start or not self.repeat:
+            return 0
+        if self.repeat == MONTHLY:
+            months = (day.year - self.start.year) * 12 + day.month - self.start.month
+            n = months // self.interval
+        else:
+            step = self.interval * (7 if self.repeat == WEEKLY else 1)
+            n = (day - self.start).days // step
+        # al più un passo oltre la stima
+        while self.nth(n) < day:
+            n += 1
+        return n
+
+    def end(self):
+        """Ultima occorrenza possibile (date.max se la serie non finisce)."""
+        if not self.repeat:
+            return self.start
+        last = date.max
+        if self.count:
+            try:
+                last = self.nth(self.count - 1)
+            except (OverflowError, ValueError):   # oltre date.max: la serie non finisce prima
+                pass
+        if self.until:
+            last = min(last, self.until)
+        return last
+
+    def between(self, first, last=None):
+        """Date delle occorrenze da first a last compresi (senza last: generatore infinito)."""
+        if not self.repeat:
+            if first <= self.start and (last is None or self.start <= last):
+                yield self.start
+            return
+        end = self.end()
+        if last is not None:
+            end = min(end, last)
+        n = self._first_index(first)
+        while True:
+            try:
+                day = self.nth(n)
+            except (OverflowError, ValueError):   # oltre date.max
+                return
+            if day > end or (self.count and n >= self.count):
+                return
+            if day not in self.exceptions:
+                yield day
+            n += 1
+
+
+def series_end(event):
+    """Valore di Event.series_end: NULL per gli eventi singoli."""
+    return Rule.for_event(event).end() if event.repeat else None
+
+
+def overlapping(queryset, first, last):
+    """
+    Eventi di queryset con almeno un'occorrenza possibile tra first e last:
+    eventi (e serie) che iniziano nell'intervallo, più le serie iniziate prima
+    e non ancora finite. Un'unica query, due ricerche su indice (UNION ALL).
+    """
+    starting = queryset.filter(date__gte=first, date__lte=last)
+    running = queryset.filter(date__lt=first, series_end__gte=first)
+    return starting.order_by().union(running.order_by(), all=True)
+
+
+def occurrence(event, day):
+    """Copia dell'evento spostata sulla data dell'occorrenza (per i template)."""
+    if day == event.date:
+        return event
+    copied = copy.copy(event)
+    copied.date = day
+    return copied
+
+
+def upcoming(queryset, today, limit):
+    """
+    Prime `limit` occorrenze da today in poi, per data: eventi singoli e serie
+    in ordine di inizio (limitati) più le serie già iniziate, due ricerche su
+    indice; ogni serie si espande solo fino a `limit` occorrenze.
+    """
+    starting = list(queryset.filter(date__gte=today).order_by("date", "id")[:limit])
+    running = list(queryset.filter(date__lt=today, series_end__gte=today).order_by())
+    streams = [_stream(event, today, limit) for event in starting + running]
+    return [occurrence(event, day) for day, _, event in islice(heapq.merge(*streams), limit)]
+
+
+def _stream(event, first, limit):
+    for day in islice(Rule.for_event(event).between(first), limit):
+        yield day, event.pk, event
@@ -0,0 +1,214 @@
+# projects/reminders.py
+"""
+Promemoria delle scadenze: milestone aperte (Milestone.due_date) e bandi
+aperti (Call.deadline).
+
+Le finestre (es. 30, 7, 1 giorni) dividono il calendario in fasce:
+[oggi, oggi+1], (oggi+1, oggi+7], (oggi+7, oggi+30]. Ogni oggetto riceve il
+promemoria della fascia in cui cade la sua scadenza, una volta sola per
+finestra: il registro DeadlineReminder rende innocue le esecuzioni ripetute
+e recupera i giorni in cui il job non è girato.
+
+Ogni fascia si legge giorno per giorno con ricerche sull'indice della data
+(milestone_due_status_idx, call_status_deadline_idx), per id crescente:
+non si carica mai l'intera tabella. Per ogni blocco:
+registro già inviato, destinatari, bulk_create di notifiche e registro in
+una transazione breve.
+
+Destinatari: per le milestone i delegati confermati del progetto e il
+personale della scuola del progetto. I bandi non appartengono a una scuola:
+il promemoria va a tutti gli amministratori delle scuole (utenti is_staff
+con profilo collegato a una scuola), senza tagli: per restare entro
+MAX_NOTIFICATIONS_PER_BATCH notifiche per transazione si riducono i bandi
+per blocco (almeno uno: un bando va a tutti nella stessa transazione).
+Due esecuzioni sovrapposte: la seconda trova il registro già scritto
+(vincolo univoco), annulla il proprio blocco e lo conta come già inviato.
+Le notifiche create dal job arrivano agli utenti al prossimo caricamento o
+riconnessione dello stream (il job gira fuori dal processo web).
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import unread
+from .models import Call, DeadlineReminder, Delegation, Milestone, Notification, UserProfile
+
+DEFAULT_WINDOWS = tuple(getattr(settings, "REMINDER_WINDOWS", (30, 7, 1)))
+DEFAULT_BATCH_SIZE = 2000
+# Bandi: tetto alle notifiche scritte per transazione
+MAX_NOTIFICATIONS_PER_BATCH = 10000
+
+OPEN_MILESTONE_STATUSES = ("PENDING", "DELAYED")
+
+
+class ReminderResult:
+    def __init__(self):
+        self.milestones = 0              # oggetti ricordati
+        self.calls = 0
+        self.notifications = 0
+        self.already_sent = 0
+
+
+def bands(windows, today):
+    """[(finestra, primo giorno, ultimo giorno), ...] dalla finestra più corta."""
+    result = []
+    start = today
+    for days in sorted(set(windows)):
+        end = today + timedelta(days=days)
+        result.append((days, start, end))
+        start = end + timedelta(days=1)
+    return result
+
+
+def _when(due_date, today):
+    days = (due_date - today).days
+    if days <= 0:
+        return "oggi"
+    if days == 1:
+        return "domani"
+    return f"tra {days} giorni"
+
+
+def _chunks(queryset, date_field, first, last, batch_size):
+    """
+    Righe (values_list con id per primo) con data tra first e last, a blocchi.
+    Si legge un giorno alla volta (ricerca esatta sull'indice della data),
+    per id crescente dentro il giorno: nessun ordinamento dell'intera fascia.
+    """
+    buffer = []
+    day = first
+    while day <= last:
+        day_qs = queryset.filter(**{date_field: day}).order_by("id")
+        last_id = 0
+        while True:
+            rows = list(day_qs.filter(id__gt=last_id)[:batch_size])
+            buffer.extend(rows)
+            if len(buffer) >= batch_size:
+                yield buffer
+                buffer = []
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+        day += timedelta(days=1)
+    if buffer:
+        yield buffer
+
+
+def _school_staff(school_ids):
+    staff = defaultdict(set)
+    profiles = UserProfile.objects.filter(school_id__in=school_ids, user__is_active=True)
+    for school_id, user_id in profiles.values_list("school_id", "user_id"):
+        staff[school_id].add(user_id)
+    return staff
+
+
+def _already_sent(kind, window, object_ids):
+    return set(
+        DeadlineReminder.objects
+        .filter(kind=kind, window_days=window, object_id__in=object_ids)
+        .values_list("object_id", "due_date")
+    )
+
+
+def _send(kind, window, rows, recipients_for, message_for, result, dry_run):
+    """rows: [(id, scadenza, ...)]. Scrive notifiche e registro per le righe non ancora ricordate."""
+    sent = _already_sent(kind, window, [row[0] for row in rows])
+    todo = [row for row in rows if (row[0], row[1]) not in sent]
+    result.already_sent += len(rows) - len(todo)
+    if not todo:
+        return 0
+
+    recipients = recipients_for(todo)
+    notifications = []
+    ledger = []
+    for row in todo:
+        users = recipients.get(row[0], ())
+        message = message_for(row)
+        notifications.extend(Notification(user_id=user_id, message=message) for user_id in sorted(users))
+        ledger.append(DeadlineReminder(
+            kind=kind, object_id=row[0], window_days=window, due_date=row[1], recipients=len(users),
+        ))
+
+    if not dry_run:
+        try:
+            with transaction.atomic():
+                # il vincolo univoco del registro fa fallire (e annullare) un'esecuzione concorrente
+                DeadlineReminder.objects.bulk_create(ledger)
+                Notification.objects.bulk_create(notifications, batch_size=1000)
+                for user_id, count in Counter(n.user_id for n in notifications).items():
+                    unread.adjust(user_id, count)
+        except IntegrityError:
+            # blocco già registrato da un'altra esecuzione: niente doppioni
+            result.already_sent += len(todo)
+            return 0
+    result.notifications += len(notifications)
+    return len(todo)
+
+
+def remind_milestones(windows, today, result, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    rows_qs = (
+        Milestone.objects
+        .filter(status__in=OPEN_MILESTONE_STATUSES)
+        .values_list("id", "due_date", "title", "project_id", "project__title", "project__school_id")
+    )
+
+    def recipients_for(rows):
+        project_ids = {row[3] for row in rows}
+        delegates = defaultdict(set)
+        confirmed = Delegation.objects.filter(
+            project_id__in=project_ids, status="CONFIRMED", collaborator__is_active=True,
+        )
+        for project_id, user_id in confirmed.values_list("project_id", "collaborator_id"):
+            delegates[project_id].add(user_id)
+        staff = _school_staff({row[5] for row in rows if row[5]})
+        return {row[0]: delegates[row[3]] | staff.get(row[5], set()) for row in rows}
+
+    def message_for(row):
+        return (
+            f"⏰ La milestone '{row[2]}' del progetto '{row[4]}' scade "
+            f"{_when(row[1], today)} ({row[1]:%d/%m/%Y})."
+        )
+
+    for window, first, last in bands(windows, today):
+        for rows in _chunks(rows_qs, "due_date", first, last, batch_size):
+            result.milestones += _send("MILESTONE", window, rows, recipients_for, message_for, result, dry_run)
+
+
+def call_recipients():
+    """Id degli amministratori delle scuole (is_staff con profilo di scuola)."""
+    admins = (
+        UserProfile.objects
+        .filter(school__isnull=False, user__is_active=True, user__is_staff=True)
+        .values_list("user_id", flat=True)
+    )
+    return set(admins)
+
+
+def remind_calls(windows, today, result, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    staff = call_recipients()
+    if not staff:
+        return
+    # ogni bando produce len(staff) notifiche: blocchi più piccoli
+    batch_size = max(1, min(batch_size, MAX_NOTIFICATIONS_PER_BATCH // len(staff)))
+    rows_qs = Call.objects.filter(status="APERTO").values_list("id", "deadline", "title")
+
+    def recipients_for(rows):
+        return {row[0]: staff for row in rows}
+
+    def message_for(row):
+        return f"⏰ Il bando '{row[2]}' scade {_when(row[1], today)} ({row[1]:%d/%m/%Y})."
+
+    for window, first, last in bands(windows, today):
+        for rows in _chunks(rows_qs, "deadline", first, last, batch_size):
+            result.calls += _send("CALL", window, rows, recipients_for, message_for, result, dry_run)
+
+
+def send_reminders(windows=DEFAULT_WINDOWS, today=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    today = today or timezone.localdate()
+    result = ReminderResult()
+    remind_milestones(windows, today, result, batch_size, dry_run)
+    remind_calls(windows, today, result, batch_size, dry_run)
+    return result
@@ -0,0 +1,70 @@
+# projects/retention.py
+"""
+Conservazione delle notifiche: le notifiche già lette più vecchie del limite
+vengono copiate in NotificationArchive e cancellate.
+
+Il lavoro procede per intervalli di chiave primaria [start, start + batch_size):
+ogni intervallo è una transazione breve (lettura su indice della PK, insert
+nell'archivio, delete per id), così i lock in scrittura durano millisecondi
+sia su SQLite sia su PostgreSQL e gli utenti possono continuare a lavorare.
+Le notifiche nascono con id crescente e created_at crescente: appena un
+intervallo contiene solo notifiche più recenti del limite ci si ferma.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .models import Notification, NotificationArchive
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def prune_notifications(cutoff, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, pause=0.0):
+    """
+    Archivia e cancella le notifiche lette con created_at < cutoff.
+    Generatore: produce (ultimo_id_esaminato, archiviate_nel_blocco) per ogni blocco.
+    """
+    bounds = Notification.objects.aggregate(first=Min("pk"), last=Max("pk"))
+    if bounds["first"] is None:
+        return
+
+    start = bounds["first"]
+    while start <= bounds["last"]:
+        end = start + batch_size
+        in_range = Notification.objects.filter(pk__gte=start, pk__lt=end)
+
+        with transaction.atomic():
+            rows = list(
+                in_range
+                .filter(is_read=True, created_at__lt=cutoff)
+                .order_by("pk")
+                .values_list("pk", "user_id", "delegation_id", "message", "created_at")
+            )
+            if rows and not dry_run:
+                NotificationArchive.objects.bulk_create(
+                    [
+                        NotificationArchive(
+                            notification_id=pk, user_id=user_id, delegation_id=delegation_id,
+                            message=message, created_at=created_at,
+                        )
+                        for pk, user_id, delegation_id, message, created_at in rows
+                    ],
+                    ignore_conflicts=True,   # già archiviate da un'esecuzione interrotta
+                )
+                # solo notifiche lette: il contatore delle non lette non cambia
+                Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+        yield end - 1, len(rows)
+
+        start = end
+        if not rows:
+            # Nulla da archiviare qui: si salta alla notifica successiva
+            # (supera i buchi lasciati da potature precedenti) e ci si ferma
+            # se è già più recente del limite
+            following = Notification.objects.filter(pk__gte=end).order_by("pk").values_list("pk", "created_at").first()
+            if following is None or following[1] >= cutoff:
+                break
+            start = following[0]
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,124 @@
+# projects/rollups.py
+"""
+Totali di spesa mantenuti in modo incrementale:
+- Project.spent: totale speso del progetto (contatore denormalizzato)
+- ExpenseRollup: totale e numero di spese per (progetto, categoria)
+
+Le viste leggono questi totali invece di rifare SUM(amount) su tutte le
+Expense a ogni richiesta. L'aggiornamento avviene nei signals di Expense
+(vedi projects/signals.py), nella stessa transazione della scrittura della
+spesa, con espressioni F(): è atomico anche con più richieste concorrenti.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from . import dashboard_cache
+from .models import Expense, ExpenseRollup, Project
+
+# Su SQLite SUM() di colonne decimali passa per i float: si riporta ai centesimi
+CENTS = Decimal("0.01")
+
+
+def apply_delta(project_id, category, amount, count, school_id=dashboard_cache.UNKNOWN):
+    """
+    Somma amount a Project.spent e (amount, count) alla riga di rollup
+    (project_id, category). school_id (scuola del progetto, se già nota)
+    evita di rileggerla per invalidare la dashboard.
+    La riga viene creata solo se si sta aggiungendo una spesa (count > 0):
+    in rimozione una riga mancante significa che il progetto è in cancellazione.
+    """
+    if not project_id or (not amount and not count):
+        return
+
+    if amount:
+        Project.objects.filter(pk=project_id).update(spent=F("spent") + amount)
+        dashboard_cache.invalidate_project(project_id, school_id)
+
+    rows = ExpenseRollup.objects.filter(project_id=project_id, category=category)
+    updated = rows.update(total=F("total") + amount, count=F("count") + count)
+    if updated or count <= 0:
+        return
+
+    try:
+        with transaction.atomic():
+            ExpenseRollup.objects.create(
+                project_id=project_id, category=category, total=amount, count=count,
+            )
+    except IntegrityError:
+        # Creata nel frattempo da un'altra richiesta: riprovo con l'UPDATE
+        rows.update(total=F("total") + amount, count=F("count") + count)
+
+
+def category_totals(project):
+    """Mappa categoria -> totale speso per un singolo progetto."""
+    rows = ExpenseRollup.objects.filter(project=project).values_list("category", "total")
+    return {category: total for category, total in rows}
+
+
+def rebuild(batch_size=1000):
+    """
+    Ricostruisce da zero la tabella di rollup con un'unica query raggruppata
+    sulle Expense e inserimenti bulk. Restituisce il numero di righe create.
+    """
+    grouped = (
+        Expense.objects
+        .values("project_id", "category")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        ExpenseRollup.objects.all().delete()
+        created = ExpenseRollup.objects.bulk_create(
+            [
+                ExpenseRollup(
+                    project_id=row["project_id"],
+                    category=row["category"],
+                    total=(row["total"] or Decimal("0")).quantize(CENTS),
+                    count=row["count"],
+                )
+                for row in grouped.iterator()
+            ],
+            batch_size=batch_size,
+        )
+        dashboard_cache.invalidate_all()
+    return len(created)
+
+
+def reconcile_spent(batch_size=500, dry_run=False):
+    """
+    Ricalcola il totale speso di ogni progetto con un'unica query raggruppata
+    sulle Expense e corregge i Project.spent che non coincidono, con
+    bulk_update a blocchi di batch_size.
+    Restituisce la lista (project_id, spent_salvato, spent_reale) delle derive.
+    """
+    actual = dict(
+        Expense.objects
+        .values("project_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+        .values_list("project_id", "total")
+    )
+
+    drift = []
+    with transaction.atomic():
+        to_fix = []
+        projects = Project.objects.only("id", "spent").order_by("pk")
+        for project in projects.iterator(chunk_size=batch_size):
+            expected = (actual.get(project.pk) or Decimal("0")).quantize(CENTS)
+            if project.spent == expected:
+                continue
+            drift.append((project.pk, project.spent, expected))
+            if dry_run:
+                continue
+            project.spent = expected
+            to_fix.append(project)
+            if len(to_fix) >= batch_size:
+                Project.objects.bulk_update(to_fix, ["spent"])
+                to_fix = []
+        if to_fix:
+            Project.objects.bulk_update(to_fix, ["spent"])
+        if drift and not dry_run:
+            dashboard_cache.invalidate_all()
+    return drift
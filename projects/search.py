@@ -0,0 +1,237 @@
+# projects/search.py
+"""
+Ricerca full-text su Call e CallForProposal.
+
+- SQLite: una tabella virtuale FTS5 per modello ("external content": il testo
+  resta nella tabella del modello, l'FTS contiene solo l'indice), tenuta
+  allineata da trigger AFTER INSERT/UPDATE/DELETE. I trigger coprono anche
+  bulk_create, update() e SQL grezzo, che non emettono signals.
+  Ordinamento per bm25 con pesi per colonna.
+- PostgreSQL: colonna generata search_vector (tsvector, configurazione
+  'italian', setweight A/B/C/D per colonna) con indice GIN; ordinamento
+  per ts_rank. La colonna generata si aggiorna da sola a ogni scrittura.
+- Altri database: search() restituisce None e il chiamante ripiega su icontains.
+
+Attenzione (SQLite): quando una migrazione ricrea la tabella di Call o di
+CallForProposal (AlterField, RemoveField, ...) i trigger vengono persi con la
+tabella vecchia. Basta eseguire `manage.py rebuild_search_index` (o
+chiamare install() da una RunPython nella migrazione stessa).
+"""
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+# Risultati massimi restituiti da una ricerca
+MAX_RESULTS = 500
+# Parole della ricerca considerate (le altre si ignorano)
+MAX_TERMS = 10
+# Le parole di almeno tante lettere valgono anche come inizio di parola
+MIN_PREFIX = 3
+
+PG_CONFIG = "italian"
+
+WORD_RE = re.compile(r"\w+")
+
+
+class Index:
+    """Colonne indicizzate di un modello, dalla più importante, con il loro peso bm25."""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns          # ((colonna, peso), ...)
+
+    @property
+    def fts_table(self):
+        return f"{self.table}_fts"
+
+    @property
+    def names(self):
+        return [name for name, _ in self.columns]
+
+
+INDEXES = {
+    "projects.call": Index(
+        "projects_call", (("title", 10.0), ("tags", 5.0), ("source", 2.0), ("notes", 1.0)),
+    ),
+    "projects.callforproposal": Index(
+        "projects_callforproposal", (("title", 10.0), ("summary", 3.0), ("requirements", 1.0)),
+    ),
+}
+
+
+def available(connection):
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+# --- installazione (migrazioni / rebuild_search_index) ----------------------
+
+def _sqlite_install(cursor, index):
+    cols = ", ".join(index.names)
+    new = ", ".join(f"new.{name}" for name in index.names)
+    old = ", ".join(f"old.{name}" for name in index.names)
+    fts = index.fts_table
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{index.table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='3')"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {index.table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {index.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {index.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    # riallinea l'indice al contenuto attuale della tabella
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _pg_vector(index):
+    weights = "ABCD"
+    parts = [
+        f"setweight(to_tsvector('{PG_CONFIG}', coalesce({name}, '')), '{weights[min(i, 3)]}')"
+        for i, name in enumerate(index.names)
+    ]
+    return " || ".join(parts)
+
+
+def _pg_install(cursor, index):
+    cursor.execute(
+        f"ALTER TABLE {index.table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({_pg_vector(index)}) STORED"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {index.table}_search_idx ON {index.table} USING GIN (search_vector)"
+    )
+
+
+def install(connection):
+    """Crea (se mancano) indici full-text e trigger; idempotente."""
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            if connection.vendor == "sqlite":
+                _sqlite_install(cursor, index)
+            elif connection.vendor == "postgresql":
+                _pg_install(cursor, index)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            if connection.vendor == "sqlite":
+                for suffix in ("ai", "ad", "au"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {index.fts_table}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {index.fts_table}")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {index.table}_search_idx")
+                cursor.execute(f"ALTER TABLE {index.table} DROP COLUMN IF EXISTS search_vector")
+
+
+# --- ricerca ----------------------------------------------------------------
+
+def terms(text):
+    """Parole della ricerca, senza la sintassi FTS (virgolette, operatori, ...)."""
+    return WORD_RE.findall(text or "")[:MAX_TERMS]
+
+
+def _is_prefix(word):
+    # Prefissi di una o due lettere espandono a migliaia di termini:
+    # le parole così corte si cercano intere
+    return len(word) >= MIN_PREFIX
+
+
+def _match_text(connection, words):
+    """Parole come espressione MATCH di FTS5 o come tsquery di PostgreSQL."""
+    if connection.vendor == "sqlite":
+        return " ".join(f'"{word}"*' if _is_prefix(word) else f'"{word}"' for word in words)
+    return " & ".join(f"{word}:*" if _is_prefix(word) else word for word in words)
+
+
+def _ranked_ids_sql(connection, index, words, base):
+    """
+    SQL e parametri per gli id che contengono tutte le parole, dal più
+    pertinente. base: (sql, params) del queryset filtrato, unito in JOIN
+    (SQLite e PostgreSQL lo appiattiscono in una ricerca per chiave primaria
+    su ogni riga trovata dall'indice; un IN (subquery) materializzerebbe
+    invece tutte le righe del filtro).
+    """
+    if connection.vendor == "sqlite":
+        fts = index.fts_table
+        weights = ", ".join(str(weight) for _, weight in index.columns)
+        match = _match_text(connection, words)
+        sql = f"SELECT {fts}.rowid FROM {fts}"
+        params = []
+        if base:
+            sql += f" JOIN ({base[0]}) base ON base.pk = {fts}.rowid"
+            params += base[1]
+        sql += f" WHERE {fts} MATCH %s ORDER BY bm25({fts}, {weights}), {fts}.rowid LIMIT %s"
+        return sql, params + [match]
+
+    query = f"to_tsquery('{PG_CONFIG}', %s)"
+    tsquery = _match_text(connection, words)
+    sql = f"SELECT t.id FROM {index.table} t"
+    params = []
+    if base:
+        sql += f" JOIN ({base[0]}) base ON base.pk = t.id"
+        params += base[1]
+    sql += f" WHERE t.search_vector @@ {query} ORDER BY ts_rank(t.search_vector, {query}) DESC, t.id LIMIT %s"
+    return sql, params + [tsquery, tsquery]
+
+
+def search(queryset, text, limit=None):
+    """
+    Oggetti di queryset che contengono tutte le parole di text (quelle di
+    almeno MIN_PREFIX lettere anche come inizio di parola), dal più
+    pertinente, al più limit (default MAX_RESULTS). I filtri del queryset
+    si applicano dentro la query sull'indice, prima del limite.
+    None se il database non ha un indice full-text: il chiamante ripiega
+    sulla propria ricerca.
+    """
+    connection = connections[queryset.db]
+    index = INDEXES.get(queryset.model._meta.label_lower)
+    if index is None or not available(connection):
+        return None
+
+    words = terms(text)
+    if not words:
+        return []
+
+    base = None
+    if queryset.query.where:
+        base = queryset.order_by().values("pk").query.get_compiler(queryset.db).as_sql()
+    sql, params = _ranked_ids_sql(connection, index, words, base)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit or MAX_RESULTS])
+        ids = [row[0] for row in cursor.fetchall()]
+
+    objects = queryset.order_by().in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def matching(queryset, text):
+    """
+    Queryset di tutti gli oggetti che contengono le parole di text, senza
+    ordinamento per pertinenza né limite: per contare l'intero insieme dei
+    risultati (es. le faccette di bandi_list). None come search().
+    """
+    connection = connections[queryset.db]
+    index = INDEXES.get(queryset.model._meta.label_lower)
+    if index is None or not available(connection):
+        return None
+
+    words = terms(text)
+    if not words:
+        return queryset.none()
+    if connection.vendor == "sqlite":
+        sql = f"SELECT rowid FROM {index.fts_table} WHERE {index.fts_table} MATCH %s"
+    else:
+        sql = f"SELECT id FROM {index.table} WHERE search_vector @@ to_tsquery('{PG_CONFIG}', %s)"
+    return queryset.filter(pk__in=RawSQL(sql, [_match_text(connection, words)]))
@@ -1,15 +1,208 @@
 # projects/signals.py
-from django.db.models.signals import post_save
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
-from .models import Profile  # se hai il modello Profile
+
+from . import calendar_feed, dashboard_cache, live, rollups, tags, unread
+from .models import Call, Event, Expense, Milestone, Notification, Project
+
+try:
+    from .models import Profile  # se hai il modello Profile
+except ImportError:
+    Profile = None
 
 User = get_user_model()
 
+_UNKNOWN = object()
+
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
-    if created:
+    if created and Profile is not None:
         try:
             Profile.objects.create(user=instance)
         except Exception:
             pass
+
+
+# ---------------------------------------------------------------------
+# Expense -> ExpenseRollup (totali per progetto/categoria)
+# ---------------------------------------------------------------------
+
+ROLLUP_FIELDS = {"project", "project_id", "category", "amount"}
+
+
+def _school_id(expense):
+    """Scuola del progetto della spesa, se il progetto è già caricato (niente query)."""
+    if Expense.project.is_cached(expense) and expense.project.pk == expense.project_id:
+        return expense.project.school_id
+    return dashboard_cache.UNKNOWN
+
+
+@receiver(pre_save, sender=Expense)
+def expense_remember_previous(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Memorizza i valori già salvati, per poter calcolare la differenza in post_save."""
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not ROLLUP_FIELDS.intersection(update_fields):
+        return
+    instance._rollup_previous = (
+        Expense.objects
+        .filter(pk=instance.pk)
+        .values_list("project_id", "category", "amount", "project__school_id")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Expense)
+def expense_update_rollup(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if not created and update_fields is not None and not ROLLUP_FIELDS.intersection(update_fields):
+        return
+
+    amount = instance.amount or Decimal("0")
+    previous = getattr(instance, "_rollup_previous", None)
+    instance._rollup_previous = None
+
+    school_id = _school_id(instance)
+    if previous is None:
+        rollups.apply_delta(instance.project_id, instance.category, amount, 1, school_id)
+        return
+
+    old_project_id, old_category, old_amount, old_school_id = previous
+    old_amount = old_amount or Decimal("0")
+    if old_project_id == instance.project_id:
+        school_id = old_school_id
+    if (old_project_id, old_category) == (instance.project_id, instance.category):
+        rollups.apply_delta(instance.project_id, instance.category, amount - old_amount, 0, school_id)
+    else:
+        rollups.apply_delta(old_project_id, old_category, -old_amount, -1, old_school_id)
+        rollups.apply_delta(instance.project_id, instance.category, amount, 1, school_id)
+
+
+def _deleting_project(origin):
+    """La cancellazione parte da un progetto (istanza o queryset di Project)."""
+    return isinstance(origin, Project) or getattr(origin, "model", None) is Project
+
+
+@receiver(post_delete, sender=Expense)
+def expense_remove_from_rollup(sender, instance, origin=None, **kwargs):
+    # Spese cancellate in cascata col progetto: rollup e contatore spariscono
+    # con lui, i delta riga per riga sarebbero due UPDATE inutili per spesa
+    if _deleting_project(origin):
+        return
+    rollups.apply_delta(
+        instance.project_id, instance.category, -(instance.amount or Decimal("0")), -1, _school_id(instance),
+    )
+
+
+# ---------------------------------------------------------------------
+# Project -> cache della dashboard
+# ---------------------------------------------------------------------
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_invalidate_dashboard(sender, instance, raw=False, **kwargs):
+    # Il progetto può anche aver cambiato scuola: si invalidano tutte
+    if not raw:
+        dashboard_cache.invalidate_all()
+        calendar_feed.invalidate_projects()
+
+
+# ---------------------------------------------------------------------
+# Event / Milestone / Call -> cache del calendario (projects/calendar_feed.py)
+# ---------------------------------------------------------------------
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_invalidate_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        calendar_feed.invalidate_user(instance.owner_id)
+
+
+@receiver(post_save, sender=Milestone)
+@receiver(post_delete, sender=Milestone)
+def milestone_invalidate_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        calendar_feed.invalidate_project(instance.project_id)
+
+
+@receiver(post_save, sender=Call)
+@receiver(post_delete, sender=Call)
+def call_invalidate_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        calendar_feed.invalidate_calls()
+
+
+# ---------------------------------------------------------------------
+# Call.tags -> tag normalizzati (projects/tags.py)
+# ---------------------------------------------------------------------
+
+@receiver(post_init, sender=Call)
+def call_remember_tags(sender, instance, **kwargs):
+    # __dict__: se il campo è differito non si fa una query solo per ricordarlo
+    instance._tags_previous = None if instance.pk is None else instance.__dict__.get("tags", _UNKNOWN)
+
+
+@receiver(post_save, sender=Call)
+def call_sync_tags(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and "tags" not in update_fields:
+        return
+    previous = getattr(instance, "_tags_previous", _UNKNOWN)
+    instance._tags_previous = instance.tags
+    if created and not instance.tags:
+        return
+    if not created and previous == instance.tags:
+        return
+    tags.sync([instance])
+
+
+# ---------------------------------------------------------------------
+# Notification -> contatore non lette (projects/unread.py)
+# ---------------------------------------------------------------------
+
+@receiver(post_init, sender=Notification)
+def notification_remember_read(sender, instance, **kwargs):
+    # Stato letto/non letto al caricamento: nessuna query in pre_save
+    instance._unread_previous = None if instance.pk is None else (instance.user_id, instance.is_read)
+
+
+@receiver(post_save, sender=Notification)
+def notification_update_unread(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_unread_previous", None)
+    instance._unread_previous = (instance.user_id, instance.is_read)
+
+    if created or previous is None:
+        if not instance.is_read:
+            unread.adjust(instance.user_id, 1)
+        return
+    if update_fields is not None and not {"is_read", "user", "user_id"}.intersection(update_fields):
+        return
+
+    if previous == instance._unread_previous:
+        return
+    old_user_id, old_is_read = previous
+    if not old_is_read:
+        unread.adjust(old_user_id, -1)
+    if not instance.is_read:
+        unread.adjust(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_remove_unread(sender, instance, **kwargs):
+    if not instance.is_read:
+        unread.adjust(instance.user_id, -1)
+
+
+@receiver(post_save, sender=Notification)
+def notification_push_live(sender, instance, created, raw=False, **kwargs):
+    # Stream SSE dei client connessi (projects/live.py)
+    if created and not raw:
+        live.publish_on_commit([instance])
@@ -0,0 +1,66 @@
+# projects/tags.py
+"""
+Tag normalizzati dei bandi.
+
+Call.tags resta il testo libero inserito ("Digitale, STEM; mobilità"):
+parse() lo divide su virgola / punto e virgola e ricava per ogni tag uno slug
+(minuscolo, senza accenti) che lo identifica: "STEM" e "stem" sono lo stesso
+tag. sync() allinea i collegamenti CallTag al testo con un numero fisso di
+query, qualunque sia il numero di bandi: lo chiamano il signal post_save di
+Call e, dopo un bulk_create (che non emette signals), chi importa i bandi.
+"""
+import re
+
+from django.utils.text import slugify
+
+from .models import CallTag, Tag
+
+MAX_LENGTH = 50
+
+SEPARATOR_RE = re.compile(r"[,;]")
+
+
+def parse(text):
+    """[(slug, nome), ...] dei tag di un testo, nell'ordine e senza doppioni."""
+    found = {}
+    for raw in SEPARATOR_RE.split(text or ""):
+        name = " ".join(raw.split())[:MAX_LENGTH]
+        slug = slugify(name)[:MAX_LENGTH]
+        if slug and slug not in found:
+            found[slug] = name
+    return list(found.items())
+
+
+def get_or_create_many(pairs):
+    """{slug: Tag} per le coppie (slug, nome); crea i tag mancanti con un bulk_create."""
+    names = dict(pairs)
+    if not names:
+        return {}
+    tags = Tag.objects.in_bulk(list(names), field_name="slug")
+    missing = [Tag(slug=slug, name=name) for slug, name in names.items() if slug not in tags]
+    if missing:
+        # ignore_conflicts: un'altra richiesta può averli appena creati
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        tags = Tag.objects.in_bulk(list(names), field_name="slug")
+    return tags
+
+
+def sync(calls):
+    """Allinea i tag normalizzati dei bandi (già salvati) al loro campo tags."""
+    wanted = {call.pk: [slug for slug, _ in parse(call.tags)] for call in calls}
+    if not wanted:
+        return
+    tags = get_or_create_many(pair for call in calls for pair in parse(call.tags))
+    desired = {(call_id, tags[slug].pk) for call_id, slugs in wanted.items() for slug in slugs}
+
+    current = {
+        (call_id, tag_id): pk
+        for pk, call_id, tag_id in CallTag.objects.filter(call_id__in=list(wanted)).values_list("pk", "call_id", "tag_id")
+    }
+    stale = [pk for pair, pk in current.items() if pair not in desired]
+    if stale:
+        CallTag.objects.filter(pk__in=stale).delete()
+    CallTag.objects.bulk_create(
+        [CallTag(call_id=call_id, tag_id=tag_id) for call_id, tag_id in desired if (call_id, tag_id) not in current],
+        ignore_conflicts=True,
+    )
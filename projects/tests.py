@@ -1,3 +1,1887 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import re
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from projects import amounts, calendar_feed, expense_import, facets, ical, ingest, limits, outbox, pagination, recurrence, reminders, search, tags, unread, uploads
+from projects.models import (
+    Call, CallForProposal, CallTag, DeadlineReminder, Delegation, Document, Event, Expense, ExpenseRollup, Notification, NotificationArchive, OutboxEmail, Project,
+    Milestone, School, SpendingLimit, Tag, UploadSession, UserProfile,
+)
+from projects.live import hub
+from projects.queryinspect import QUERY_BUDGETS, QueryInspector
+from projects.versioned_cache import VersionedCache
+
+User = get_user_model()
+
+
+class ExpenseRollupTests(TestCase):
+    """Rollup per (progetto, categoria) aggiornati dai signals di Expense."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(title="Laboratorio", budget=Decimal("1000"))
+
+    def rollups(self, project=None):
+        rows = ExpenseRollup.objects.filter(project=project or self.project)
+        return {r.category: (r.total, r.count) for r in rows}
+
+    def fresh_aggregate(self):
+        rows = Expense.objects.values("project_id", "category").annotate(total=Sum("amount"), count=Count("id"))
+        return {(r["project_id"], r["category"]): (r["total"].quantize(Decimal("0.01")), r["count"]) for r in rows}
+
+    def test_create_update_delete(self):
+        first = Expense.objects.create(project=self.project, category="MATERIALS", amount=Decimal("10.50"))
+        Expense.objects.create(project=self.project, category="MATERIALS", amount=Decimal("4.50"))
+        self.assertEqual(self.rollups(), {"MATERIALS": (Decimal("15.00"), 2)})
+
+        first.amount = Decimal("20.50")
+        first.save()
+        self.assertEqual(self.rollups(), {"MATERIALS": (Decimal("25.00"), 2)})
+
+        first.category = "SERVICES"
+        first.save()
+        self.assertEqual(self.rollups(), {"MATERIALS": (Decimal("4.50"), 1), "SERVICES": (Decimal("20.50"), 1)})
+
+        # update_fields senza campi dei totali: nessun delta
+        first.note = "nota"
+        first.save(update_fields=["note"])
+        first.delete()
+        self.assertEqual(self.rollups(), {"MATERIALS": (Decimal("4.50"), 1), "SERVICES": (Decimal("0.00"), 0)})
+
+    def test_move_to_other_project(self):
+        other = Project.objects.create(title="Palestra")
+        expense = Expense.objects.create(project=self.project, category="TRAINING", amount=Decimal("8"))
+        expense.project = other
+        expense.save()
+        self.assertEqual(self.rollups(), {"TRAINING": (Decimal("0.00"), 0)})
+        self.assertEqual(self.rollups(other), {"TRAINING": (Decimal("8.00"), 1)})
+
+    def test_rebuild_matches_fresh_aggregate(self):
+        other = Project.objects.create(title="Palestra")
+        for i, category in enumerate(["MATERIALS", "SERVICES", "MATERIALS", "ARREDI"]):
+            Expense.objects.create(project=other if i % 2 else self.project, category=category, amount=Decimal(i) + Decimal("0.25"))
+        incremental = {(r.project_id, r.category): (r.total, r.count) for r in ExpenseRollup.objects.exclude(count=0)}
+        ExpenseRollup.objects.update(total=0, count=0)
+
+        out = StringIO()
+        call_command("rebuild_rollups", stdout=out)
+        rebuilt = {(r.project_id, r.category): (r.total, r.count) for r in ExpenseRollup.objects.all()}
+        self.assertEqual(rebuilt, self.fresh_aggregate())
+        self.assertEqual(rebuilt, incremental)
+        self.assertIn("3 righe", out.getvalue())
+
+    def test_project_delete_skips_per_row_deltas(self):
+        doomed = Project.objects.create(title="Da eliminare")
+        for category in ("MATERIALS", "SERVICES", "TRAINING"):
+            Expense.objects.create(project=doomed, category=category, amount=Decimal("1"))
+        with CaptureQueriesContext(connection) as ctx:
+            doomed.delete()
+        touched = [q["sql"] for q in ctx.captured_queries if "expenserollup" in q["sql"] and q["sql"].startswith("UPDATE")]
+        self.assertEqual(touched, [])
+        self.assertFalse(ExpenseRollup.objects.filter(project_id=doomed.pk).exists())
+
+
+class ProjectSpentTests(TestCase):
+    """Project.spent segue le Expense e reconcile_spent ne corregge le derive."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(title="Laboratorio", budget=Decimal("1000"))
+
+    def spent(self, project=None):
+        return Project.objects.values_list("spent", flat=True).get(pk=(project or self.project).pk)
+
+    def test_counter_follows_expenses(self):
+        expense = Expense.objects.create(project=self.project, category="MATERIALS", amount=Decimal("10.00"))
+        Expense.objects.create(project=self.project, category="SERVICES", amount=Decimal("2.50"))
+        self.assertEqual(self.spent(), Decimal("12.50"))
+        expense.amount = Decimal("7.00")
+        expense.save()
+        self.assertEqual(self.spent(), Decimal("9.50"))
+        other = Project.objects.create(title="Palestra")
+        expense.project = other
+        expense.save()
+        self.assertEqual((self.spent(), self.spent(other)), (Decimal("2.50"), Decimal("7.00")))
+        expense.delete()
+        self.assertEqual(self.spent(other), Decimal("0.00"))
+
+    def test_full_save_keeps_concurrent_increments(self):
+        stale = Project.objects.get(pk=self.project.pk)
+        Expense.objects.create(project=self.project, category="MATERIALS", amount=Decimal("40.00"))
+        stale.title = "Laboratorio STEM"
+        stale.save()
+        self.assertEqual(self.spent(), Decimal("40.00"))
+        self.assertEqual(Project.objects.get(pk=self.project.pk).title, "Laboratorio STEM")
+        # scrittura esplicita (es. reconcile): si salva
+        stale.spent = Decimal("1.00")
+        stale.save(update_fields=["spent"])
+        self.assertEqual(self.spent(), Decimal("1.00"))
+
+    def test_reconcile_spent(self):
+        Expense.objects.create(project=self.project, category="MATERIALS", amount=Decimal("30.00"))
+        clean = Project.objects.create(title="Allineato")
+        Project.objects.filter(pk=self.project.pk).update(spent=Decimal("99.00"))
+
+        out = StringIO()
+        call_command("reconcile_spent", "--dry-run", stdout=out)
+        self.assertIn(f"Progetto {self.project.pk}: salvato € 99.00, reale € 30.00", out.getvalue())
+        self.assertEqual(self.spent(), Decimal("99.00"))
+
+        out = StringIO()
+        call_command("reconcile_spent", "--batch-size", "1", stdout=out)
+        self.assertIn("1 progetti corretti", out.getvalue())
+        self.assertEqual((self.spent(), self.spent(clean)), (Decimal("30.00"), Decimal("0.00")))
+
+        out = StringIO()
+        call_command("reconcile_spent", stdout=out)
+        self.assertIn("Nessuna differenza", out.getvalue())
+
+
+class SpendingLimitReportTests(TestCase):
+    """Stato dei limiti per ogni base di calcolo e filtri del report."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.project = Project.objects.create(title="Laboratorio", program="PNRR", budget=Decimal("1000"))
+        Expense.objects.create(project=cls.project, category="MATERIALS", amount=Decimal("150"))
+        Expense.objects.create(project=cls.project, category="SERVICES", amount=Decimal("50"))
+        # speso 200, residuo 800
+        cls.limit_ids = {
+            key: SpendingLimit.objects.create(project=cls.project, category=category, base=base, percentage=pct).pk
+            for key, category, base, pct in [
+                ("budget", "MATERIALS", "BUDGET", 10),         # consentiti 100 -> superato
+                ("spent", "MATERIALS", "SPENT", 80),           # 160 -> 93,75%, attenzione
+                ("remaining", "SERVICES", "REMAINING", 50),    # 400 -> 12,5%, ok
+                ("spent_low", "SERVICES", "SPENT", 10),        # 20 -> superato
+            ]
+        }
+
+    def test_status_per_base(self):
+        rows = {row["limit_id"]: row for row in limits.evaluate_limits()}
+        expected = {
+            "budget": ("100.00", "150.00", "-50.00", "BREACHED"),
+            "spent": ("160.00", "150.00", "10.00", "WARN"),
+            "remaining": ("400.00", "50.00", "350.00", "OK"),
+            "spent_low": ("20.00", "50.00", "-30.00", "BREACHED"),
+        }
+        for key, (allowed, spent, remaining, status) in expected.items():
+            row = rows[self.limit_ids[key]]
+            self.assertEqual(
+                (row["allowed_total"], row["spent_in_cat"], row["remaining"], row["status"]),
+                (Decimal(allowed), Decimal(spent), Decimal(remaining), status),
+                key,
+            )
+        self.assertEqual(rows[self.limit_ids["spent"]]["pct_used_raw"], Decimal("93.75"))
+        self.assertEqual(rows[self.limit_ids["budget"]]["pct_used"], Decimal("100.00"))
+
+    def test_report_order_and_status_filter(self):
+        ids = [row["limit_id"] for row in limits.limits_report()]
+        # superati per primi (dal più critico), poi in attenzione; gli OK esclusi
+        self.assertEqual(ids, [self.limit_ids["spent_low"], self.limit_ids["budget"], self.limit_ids["spent"]])
+        self.assertEqual([row["limit_id"] for row in limits.limits_report(statuses=("WARN",))], [self.limit_ids["spent"]])
+        self.assertEqual(limits.limits_report(program="FESR"), [])
+
+    def test_json_shape(self):
+        self.client.force_login(self.user)
+        data = self.client.get(reverse("limits_report_json"), {"status": "WARN", "program": "PNRR"}).json()
+        self.assertEqual(data["filters"], {"school": None, "program": "PNRR", "status": "WARN"})
+        self.assertEqual(data["count"], 1)
+        row = data["results"][0]
+        self.assertEqual(
+            {k: row[k] for k in ("limit_id", "base", "category", "allowed_total", "spent_in_cat", "remaining", "status")},
+            {"limit_id": self.limit_ids["spent"], "base": "SPENT", "category": "MATERIALS",
+             "allowed_total": "160.00", "spent_in_cat": "150.00", "remaining": "10.00", "status": "WARN"},
+        )
+        # stato non valido: filtro ignorato
+        data = self.client.get(reverse("limits_report_json"), {"status": "OK"}).json()
+        self.assertEqual(data["count"], 3)
+
+
+class ExpenseExportTests(TestCase):
+    """Export CSV in streaming delle spese di un progetto."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.project = Project.objects.create(title="Laboratorio")
+        Expense.objects.create(project=cls.project, date=date(2025, 3, 1), category="MATERIALS",
+                               amount=Decimal("1234.5"), vendor="Rossi; figli", document="FT-1")
+        Expense.objects.create(project=cls.project, date=date(2025, 3, 2), category="SERVICES",
+                               amount=Decimal("99"), vendor="Bianchi", note="manutenzione")
+        Expense.objects.create(project=cls.project, date=date(2025, 3, 3), category="MATERIALS",
+                               amount=Decimal("0.10"), vendor="Bianchi")
+
+    def export(self, **params):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("expenses_export_csv", args=[self.project.pk]), params)
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode("utf-8")
+        return response, body.splitlines()
+
+    def test_header_rows_and_disposition(self):
+        response, lines = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="spese_progetto_{self.project.pk}.csv"')
+        self.assertEqual(lines[0], "\ufeffdata;fornitore;categoria;importo;documento;note;categoria_descrizione")
+        self.assertEqual(lines[1:], [
+            "2025-03-03;Bianchi;MATERIALS;0.10;;;Materiali",
+            "2025-03-02;Bianchi;SERVICES;99.00;;manutenzione;Servizi",
+            '2025-03-01;"Rossi; figli";MATERIALS;1234.50;FT-1;;Materiali',
+        ])
+
+    def test_filters(self):
+        _, lines = self.export(category="MATERIALS", vendor="bianchi")
+        self.assertEqual(lines[1:], ["2025-03-03;Bianchi;MATERIALS;0.10;;;Materiali"])
+        _, lines = self.export(category="TRAINING")
+        self.assertEqual(len(lines), 1)
+
+
+# "SCAN tabella" senza "USING INDEX": lettura completa della tabella
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN è specifico di SQLite")
+class QueryPlanTests(TestCase):
+    """
+    Esegue EXPLAIN QUERY PLAN su ogni SELECT delle viste principali e fallisce
+    se una query legge un'intera tabella invece di usare un indice.
+    """
+
+    # Letture complete volute: aggregati su tutti i progetti (utente senza
+    # scuola) e l'elenco scuole nel filtro del report limiti.
+    ALLOWED_FULL_SCANS = {
+        "dashboard": {"projects_project"},
+        "projects_list": {"projects_project"},
+        "limits_report": {"projects_school"},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        school = School.objects.create(name="IC Test")
+        cls.project = Project.objects.create(title="Progetto", school=school, budget=Decimal("1000"))
+        Expense.objects.create(project=cls.project, category="MATERIALS", amount=Decimal("10"), vendor="ACME")
+        SpendingLimit.objects.create(project=cls.project, category="MATERIALS", base="TOTAL_BUDGET", percentage=10)
+        Event.objects.create(owner=cls.user, title="Riunione")
+        Event.objects.create(owner=cls.user, title="Collegio", date=timezone.localdate() - timedelta(days=60), repeat="WEEKLY")
+        Milestone.objects.create(project=cls.project, title="Collaudo", due_date=timezone.localdate())
+        delegation = Delegation.objects.create(project=cls.project, collaborator=cls.user, creator=cls.user)
+        cls.notification = Notification.objects.create(user=cls.user, message="Delega", delegation=delegation)
+        Call.objects.create(title="Bando", program="PNRR", source="MIM", tags="Digitale, STEM")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def full_scans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+        scans = []
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql.replace("%", "%%"))
+                plan = [row[-1] for row in cursor.fetchall()]
+            for line in plan:
+                match = FULL_SCAN_RE.match(line)
+                if match:
+                    scans.append((match.group(1), sql))
+        return scans
+
+    def assertNoFullScans(self, url_name, url):
+        allowed = self.ALLOWED_FULL_SCANS.get(url_name, set())
+        scans = [(table, sql) for table, sql in self.full_scans(url) if table not in allowed]
+        self.assertFalse(
+            scans,
+            "\n".join(f"{url}: full scan di {table}\n  {sql}" for table, sql in scans),
+        )
+
+    def test_dashboard(self):
+        self.assertNoFullScans("dashboard", reverse("dashboard"))
+
+    def test_projects_list(self):
+        self.assertNoFullScans("projects_list", reverse("projects_list"))
+
+    def test_project_detail(self):
+        url = reverse("project_detail", args=[self.project.pk])
+        self.assertNoFullScans("project_detail", url)
+        self.assertNoFullScans("project_detail", url + "?category=MATERIALS")
+        self.assertNoFullScans("project_detail", url + "?vendor=acme")
+
+    def test_expenses_export(self):
+        self.assertNoFullScans("expenses_export_csv", reverse("expenses_export_csv", args=[self.project.pk]))
+
+    def test_calendar(self):
+        self.assertNoFullScans("calendar", reverse("calendar"))
+
+    def test_calendar_events_json(self):
+        today = timezone.localdate()
+        url = reverse("calendar_events_json") + f"?start={today - timedelta(days=3)}&end={today + timedelta(days=3)}"
+        self.assertNoFullScans("calendar_events_json", url)
+
+    def test_calendar_ics(self):
+        self.assertNoFullScans("calendar_ics", reverse("calendar_ics", args=[ical.new_token(self.user).token]))
+
+    def test_deleghe(self):
+        self.assertNoFullScans("deleghe", reverse("deleghe"))
+
+    def test_bandi_list(self):
+        url = reverse("bandi_list")
+        self.assertNoFullScans("bandi_list", url)
+        self.assertNoFullScans("bandi_list", url + "?program=PNRR")
+        self.assertNoFullScans("bandi_list", url + "?program=PNRR&status=APERTO")
+        self.assertNoFullScans("bandi_list", url + "?status=APERTO")
+        self.assertNoFullScans("bandi_list", url + "?q=bando")
+        self.assertNoFullScans("bandi_list", url + "?q=bando&program=PNRR")
+        self.assertNoFullScans("bandi_list", url + "?tag=digitale")
+
+    def test_limits_report(self):
+        self.assertNoFullScans("limits_report", reverse("limits_report"))
+        self.assertNoFullScans("limits_report", reverse("limits_report_json") + "?program=PNRR")
+
+    def test_notification_detail(self):
+        self.assertNoFullScans("notification_detail", reverse("notification_detail", args=[self.notification.pk]))
+
+    def test_notifications_inbox(self):
+        self.assertNoFullScans("notifications_inbox", reverse("notifications_inbox"))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Ogni vista elencata in QUERY_BUDGETS deve restare nel proprio budget di
+    query e non ripetere la stessa query per ogni riga mostrata (N+1).
+    I dati hanno più righe per tabella, così un N+1 non passa inosservato.
+    """
+
+    ROWS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.school = School.objects.create(name="IC Test")
+        today = timezone.localdate()
+        for i in range(cls.ROWS):
+            collaborator = User.objects.create_user(f"prof{i}", password="pwd")
+            project = Project.objects.create(title=f"Progetto {i}", school=cls.school, budget=Decimal("1000"))
+            Expense.objects.create(project=project, category="MATERIALS", amount=Decimal("10"), vendor="ACME")
+            Expense.objects.create(project=project, category="SERVICES", amount=Decimal("5"), vendor="Beta")
+            SpendingLimit.objects.create(project=project, category="MATERIALS", base="TOTAL_BUDGET", percentage=10)
+            Event.objects.create(owner=cls.user, project=project, title=f"Riunione {i}", date=today)
+            Document.objects.create(title=f"Doc {i}", file=f"documents/{i}.pdf", project=project, uploaded_by=collaborator)
+            delegation = Delegation.objects.create(project=project, collaborator=collaborator, creator=cls.user)
+            cls.notification = Notification.objects.create(user=cls.user, message="Delega", delegation=delegation)
+            cls.call = Call.objects.create(title=f"Bando {i}", program="PNRR", source="MIM")
+            Milestone.objects.create(project=project, title=f"Collaudo {i}", due_date=today)
+        cls.project = project
+        cls.feed_token = ical.new_token(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def url_for(self, url_name):
+        args = {
+            "project_detail": [self.project.pk],
+            "projects_by_school": [self.school.pk],
+            "expenses_export_csv": [self.project.pk],
+            "expense_import": [self.project.pk],
+            "bando_detail": [self.call.pk],
+            "notification_detail": [self.notification.pk],
+            "calendar_ics": [self.feed_token.token],
+        }.get(url_name, [])
+        query = {
+            "calendar_events_json": "?start=2025-01-01&end=2025-01-31",
+        }.get(url_name, "")
+        return reverse(url_name, args=args) + query
+
+    def test_views_within_budget(self):
+        for url_name, budget in QUERY_BUDGETS.items():
+            with self.subTest(url_name):
+                url = self.url_for(url_name)
+                with QueryInspector() as inspector:
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertFalse(inspector.duplicates(), f"{url}: query ripetute\n{inspector.report()}")
+                self.assertLessEqual(inspector.count, budget, f"{url}: {inspector.count} query, budget {budget}")
+
+    def test_detects_n_plus_one(self):
+        with QueryInspector() as inspector:
+            titles = [d.project.title for d in Delegation.objects.all()]
+        self.assertEqual(len(titles), self.ROWS)
+        [(shape, times, origin)] = inspector.duplicates()
+        self.assertEqual(times, self.ROWS)
+        self.assertIn('FROM "projects_project"', shape)
+        self.assertIn("projects/tests.py", origin)
+
+
+class ScaleBenchmarkTests(TestCase):
+    """Smoke test di seed_scale + benchmark_views su un dataset minimo."""
+
+    def test_seed_and_benchmark_one_view(self):
+        call_command(
+            "seed_scale", "--schools", "1", "--projects-per-school", "2", "--expenses-per-project", "3",
+            "--users-per-school", "1", "--events-per-user", "1", "--calls", "2", "--prefix", "smoke",
+            stdout=StringIO(),
+        )
+        self.assertEqual(Expense.objects.count(), 6)
+        self.assertEqual(ExpenseRollup.objects.aggregate(n=Sum("count"))["n"], 6)
+
+        out = StringIO()
+        with mock.patch("projects.middleware.QueryInspectorMiddleware.__call__") as inspector:
+            call_command("benchmark_views", "--view", "projects_list", "--repeat", "1", stdout=out, stderr=StringIO())
+        inspector.assert_not_called()
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report["views"]), ["projects_list"])
+        self.assertEqual(report["views"]["projects_list"]["status"], 200)
+        self.assertEqual(report["dataset"]["Project"], 2)
+
+        with self.assertRaisesMessage(CommandError, "Viste sconosciute: nope"):
+            call_command("benchmark_views", "--view", "nope", stdout=StringIO())
+
+
+@override_settings(VERSIONED_CACHE_ENABLED=True)
+class DashboardCacheTests(TestCase):
+    """KPI e progetti recenti in cache per scuola, invalidati dalle scritture."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Progetto", budget=Decimal("1000"))
+        Expense.objects.create(project=cls.project, category="MATERIALS", amount=Decimal("10"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_warm_hit_skips_project_queries(self):
+        self.client.get(reverse("dashboard"))
+        # sessione, utente, notifiche, badge (COUNT: cache per processo),
+        # eventi (singoli e serie già iniziate)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["totals"]["spent"], Decimal("10"))
+
+    def test_expense_write_invalidates(self):
+        self.client.get(reverse("dashboard"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(project=self.project, category="SERVICES", amount=Decimal("5"))
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["totals"]["spent"], Decimal("15"))
+        self.assertEqual(response.context["latest"][0].spent_from_expenses, Decimal("15"))
+
+    def test_project_write_invalidates(self):
+        self.client.get(reverse("dashboard"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(title="Nuovo", budget=Decimal("500"))
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["totals"]["budget"], Decimal("1500"))
+        self.assertEqual(len(response.context["latest"]), 2)
+
+    def test_known_school_skips_project_lookup(self):
+        expense = Expense.objects.select_related("project").get(project=self.project)
+        expense.amount = Decimal("12")
+        with CaptureQueriesContext(connection) as ctx:
+            expense.save()
+        lookups = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "projects_project"."school_id"')]
+        self.assertEqual(lookups, [])
+
+    @override_settings(VERSIONED_CACHE_ENABLED=False)
+    def test_per_process_cache_is_not_used(self):
+        # come con LocMemCache (il default): ogni lettura ricalcola, nessuna versione da incrementare
+        self.client.get(reverse("dashboard"))
+        Project.objects.filter(pk=self.project.pk).update(budget=Decimal("2000"))
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["totals"]["budget"], Decimal("2000"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Expense.objects.create(project=self.project, category="SERVICES", amount=Decimal("5"))
+        self.assertEqual(callbacks, [])
+
+    def test_versions_are_namespaced(self):
+        dashboard, calendar = VersionedCache("dashboard"), VersionedCache("calendar")
+        before = dashboard.versions("school:1", "all") + calendar.versions("school:1")
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard.invalidate("school:1")
+        after = dashboard.versions("school:1", "all") + calendar.versions("school:1")
+        self.assertEqual(after, [before[0] + 1, before[1], before[2]])
+
+
+@override_settings(UNREAD_COUNTER_CACHED=True)
+class UnreadCounterTests(TestCase):
+    """Contatore delle notifiche non lette in cache (projects/unread.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.prof = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Progetto", budget=Decimal("1000"))
+
+    def setUp(self):
+        cache.clear()
+
+    def unread_json(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse("unread_notifications_json")).json()["unread"]
+
+    def test_hot_path_skips_notifications_table(self):
+        self.assertEqual(self.unread_json(self.prof), 0)
+        # solo sessione e utente
+        with self.assertNumQueries(2):
+            self.client.get(reverse("unread_notifications_json"))
+
+    def test_counter_follows_create_read_delete(self):
+        self.assertEqual(self.unread_json(self.prof), 0)
+
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("deleghe"), {
+                "op": "add_delegation", "project_id": self.project.pk, "collaborator_id": self.prof.pk,
+            })
+        self.assertEqual(self.unread_json(self.prof), 1)
+
+        notification = Notification.objects.get(user=self.prof)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("notification_detail", args=[notification.pk]))
+        self.assertEqual(self.unread_json(self.prof), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.prof, message="Altra")
+        self.assertEqual(self.unread_json(self.prof), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(user=self.prof, is_read=False).get().delete()
+        self.assertEqual(self.unread_json(self.prof), 0)
+
+    def test_counter_expires(self):
+        self.assertEqual(self.unread_json(self.prof), 0)
+        # incr perso (altro processo): il valore sbagliato scade
+        Notification.objects.bulk_create([Notification(user=self.prof, message="Persa")])
+        self.assertEqual(self.unread_json(self.prof), 0)
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + unread.UNREAD_CACHE_TIMEOUT + 1):
+            self.assertEqual(self.unread_json(self.prof), 1)
+
+    @override_settings(UNREAD_COUNTER_CACHED=False)
+    def test_process_local_cache_recounts(self):
+        self.assertEqual(self.unread_json(self.prof), 0)
+        Notification.objects.bulk_create([Notification(user=self.prof, message="Da un altro worker")])
+        self.assertEqual(self.unread_json(self.prof), 1)
+
+
+class NotificationInboxTests(TestCase):
+    """Inbox a pagine con cursore e "segna come lette" con un solo UPDATE."""
+
+    TOTAL = 120
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("admin", password="pwd")
+        Notification.objects.bulk_create(
+            Notification(user=cls.user, message=f"Risposta {i}") for i in range(cls.TOTAL)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def notification_updates(self, ctx):
+        return [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "projects_notification"')]
+
+    def test_pages_cover_inbox_once(self):
+        seen, url = [], reverse("notifications_inbox")
+        while url:
+            response = self.client.get(url)
+            seen += [n.pk for n in response.context["notifications"]]
+            next_url = response.context["next_url"]
+            url = reverse("notifications_inbox") + next_url if next_url else None
+        self.assertEqual(len(seen), self.TOTAL)
+        self.assertEqual(len(set(seen)), self.TOTAL)
+
+    def test_bad_cursor_shows_first_page(self):
+        first = [n.pk for n in self.client.get(reverse("notifications_inbox")).context["notifications"]]
+        created = Notification.objects.values_list("created_at", flat=True).first().isoformat()
+        for values in ([created, "x"], [5, 1], ["ieri", 1], ["a"]):
+            for direction in ("after", "before"):
+                response = self.client.get(reverse("notifications_inbox"), {direction: pagination.encode_cursor(values)})
+                self.assertEqual(response.status_code, 200, (direction, values))
+                self.assertEqual([n.pk for n in response.context["notifications"]], first)
+        response = self.client.get(reverse("notifications_inbox"), {"after": "%%%"})
+        self.assertEqual([n.pk for n in response.context["notifications"]], first)
+
+    def test_mark_selected_and_all(self):
+        ids = list(Notification.objects.filter(user=self.user).values_list("pk", flat=True)[:3])
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("notifications_inbox"), {"op": "mark_selected", "ids": ids})
+        self.assertEqual(len(self.notification_updates(ctx)), 1)
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=True).count(), 3)
+        self.assertEqual(self.client.get(reverse("unread_notifications_json")).json()["unread"], self.TOTAL - 3)
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("notifications_inbox"), {"op": "mark_all"})
+        self.assertEqual(len(self.notification_updates(ctx)), 1)
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+        self.assertEqual(self.client.get(reverse("unread_notifications_json")).json()["unread"], 0)
+
+
+class BatchDelegationTests(TestCase):
+    """Delega multipla: letture e scritture in blocco, indipendenti dal numero di righe."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.teachers = User.objects.bulk_create(User(username=f"prof{i:02d}") for i in range(40))
+        cls.projects = Project.objects.bulk_create(Project(title=f"Progetto {i:02d}") for i in range(25))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def post_batch(self, projects, teachers):
+        return self.client.post(reverse("deleghe"), {
+            "op": "add_delegations_batch",
+            "project_ids": [p.pk for p in projects],
+            "collaborator_ids": [t.pk for t in teachers],
+            "role_label": "Docente",
+        })
+
+    def test_thousand_delegations_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.post_batch(self.projects, self.teachers)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Delegation.objects.count(), 1000)
+        self.assertEqual(Notification.objects.filter(delegation__isnull=False).count(), 1000)
+        # nessuna query per riga: solo INSERT multi-riga (divisi dal limite
+        # di parametri di SQLite) più le letture iniziali
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        teacher = self.teachers[0]
+        self.client.force_login(teacher)
+        self.assertEqual(self.client.get(reverse("unread_notifications_json")).json()["unread"], 25)
+
+    def test_existing_delegations_are_not_duplicated(self):
+        self.post_batch(self.projects[:2], self.teachers[:3])
+        self.post_batch(self.projects[:3], self.teachers[:3])
+        self.assertEqual(Delegation.objects.count(), 9)
+
+
+@override_settings(NOTIFICATIONS_SSE=True)
+class NotificationStreamTests(TestCase):
+    """Stream SSE delle notifiche (vista asincrona + hub in memoria)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+
+    def create_notification(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=self.user, message=message)
+
+    async def open_stream(self, **headers):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("notifications_stream"), headers=headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+        return stream
+
+    async def test_pushes_created_notification(self):
+        stream = await self.open_stream()
+        self.assertEqual(hub.connections(self.user.pk), 1)
+
+        await sync_to_async(self.create_notification)("Nuova delega")
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(b"event: notification", chunk)
+        self.assertIn(b"Nuova delega", chunk)
+
+        # disconnessione del client: il server ASGI cancella la lettura in corso
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(hub.connections(self.user.pk), 0)
+
+    async def test_replays_missed_after_last_event_id(self):
+        first = await sync_to_async(self.create_notification)("Vista")
+        await sync_to_async(self.create_notification)("Persa")
+        stream = await self.open_stream(**{"Last-Event-ID": str(first.pk)})
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(b"Persa", chunk)
+        await stream.aclose()
+
+    async def test_requires_login(self):
+        response = await self.async_client.get(reverse("notifications_stream"))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(NOTIFICATIONS_SSE=False)
+    def test_wsgi_falls_back_to_polling(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("notifications_stream"))
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b"retry: 60000\n\n")
+        self.assertEqual(hub.connections(self.user.pk), 0)
+        dashboard = self.client.get(reverse("dashboard"))
+        self.assertNotContains(dashboard, "EventSource")
+        self.assertContains(dashboard, "setInterval(refreshBadge, 60000)")
+
+
+class OutboxTests(TestCase):
+    """Email accodate dalle viste e consegnate a blocchi dal worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        cls.prof = User.objects.create_user("prof", email="prof@example.com", password="pwd")
+        cls.project = Project.objects.create(title="Progetto", budget=Decimal("1000"))
+
+    def test_view_enqueues_without_sending(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse("deleghe"), {
+            "op": "add_delegation", "project_id": self.project.pk, "collaborator_id": self.prof.pk,
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, "prof@example.com")
+        self.assertEqual(email.status, "PENDING")
+
+    def test_worker_delivers_batches_on_one_connection(self):
+        for i in range(5):
+            outbox.enqueue("prof@example.com", f"Oggetto {i}", "Testo")
+        out = StringIO()
+        call_command("run_mail_worker", "--once", "--batch-size", "2", stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(OutboxEmail.objects.filter(status="SENT").count(), 5)
+        self.assertIn("Totale: 5 inviate", out.getvalue())
+
+    def test_failures_back_off_then_dead_letter(self):
+        class Broken:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                raise OSError("SMTP non raggiungibile")
+
+        email = outbox.enqueue("prof@example.com", "Oggetto", "Testo")
+        self.assertEqual(outbox.deliver_batch(connection=Broken()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("PENDING", 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # non ancora scaduta: il worker non la riprende
+        self.assertEqual(outbox.deliver_batch(connection=Broken()), (0, 0))
+
+        for _ in range(outbox.MAX_ATTEMPTS - 1):
+            OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            outbox.deliver_batch(connection=Broken())
+        email.refresh_from_db()
+        self.assertEqual(email.status, "DEAD")
+        self.assertIn("SMTP non raggiungibile", email.last_error)
+
+    def test_connection_outage_does_not_consume_attempts(self):
+        class Down:
+            def open(self):
+                raise ConnectionRefusedError("SMTP giù")
+
+        for i in range(3):
+            outbox.enqueue("prof@example.com", f"Oggetto {i}", "Testo")
+        for _ in range(outbox.MAX_ATTEMPTS + 1):
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            with self.assertRaises(ConnectionRefusedError):
+                outbox.deliver_batch(connection=Down())
+        rows = list(OutboxEmail.objects.values_list("status", "attempts", "claim_token"))
+        self.assertEqual(rows, [("PENDING", 0, None)] * 3)
+        self.assertTrue(OutboxEmail.objects.filter(next_attempt_at__gt=timezone.now(), last_error__contains="SMTP giù").exists())
+
+        err = StringIO()
+        with mock.patch("projects.outbox.get_connection", return_value=Down()):
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            call_command("run_mail_worker", "--once", stdout=StringIO(), stderr=err)
+        self.assertIn("Connessione non riuscita", err.getvalue())
+
+    def test_reclaimed_stale_claim_counts_an_attempt(self):
+        email = outbox.enqueue("prof@example.com", "Oggetto", "Testo")
+        stale = timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(minutes=1)
+        # il worker muore a ogni invio di questa email: la prenotazione resta SENDING
+        for attempt in range(1, outbox.MAX_ATTEMPTS):
+            OutboxEmail.objects.filter(pk=email.pk).update(status="SENDING", claim_token=uuid.uuid4(), claimed_at=stale)
+            [row] = outbox.claim()
+            self.assertEqual(row.attempts, attempt)
+        OutboxEmail.objects.filter(pk=email.pk).update(status="SENDING", claim_token=uuid.uuid4(), claimed_at=stale)
+        self.assertEqual(outbox.claim(), [])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("DEAD", outbox.MAX_ATTEMPTS))
+
+    def test_slow_worker_does_not_touch_reclaimed_rows(self):
+        class Slow:
+            """Dopo il primo invio un altro worker riprende il blocco (CLAIM_TIMEOUT scaduto)."""
+            sent = []
+
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                self.sent.extend(messages)
+                OutboxEmail.objects.update(claim_token=uuid.uuid4())
+
+        for i in range(3):
+            outbox.enqueue("prof@example.com", f"Oggetto {i}", "Testo")
+        self.assertEqual(outbox.deliver_batch(connection=Slow()), (1, 0))
+        self.assertEqual(len(Slow.sent), 1)
+        # l'esito non sovrascrive le righe ora prenotate dall'altro worker
+        self.assertEqual(set(OutboxEmail.objects.values_list("status", flat=True)), {"SENDING"})
+
+        class Reclaimed(Slow):
+            def open(self):
+                OutboxEmail.objects.update(claim_token=uuid.uuid4())
+
+            def send_messages(self, messages):
+                raise AssertionError("email di un altro worker")
+
+        OutboxEmail.objects.update(status="PENDING", claim_token=None)
+        self.assertEqual(outbox.deliver_batch(connection=Reclaimed()), (0, 0))
+
+    def test_delegation_answer_is_atomic(self):
+        delegation = Delegation.objects.create(project=self.project, collaborator=self.prof, creator=self.admin)
+        notification = Notification.objects.create(user=self.prof, message="Delega", delegation=delegation)
+        self.client.force_login(self.prof)
+        with mock.patch.object(outbox, "enqueue", side_effect=RuntimeError("coda non disponibile")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("notification_detail", args=[notification.pk]), {"action": "accept"})
+        delegation.refresh_from_db()
+        self.assertEqual(delegation.status, "PENDING")
+        self.assertFalse(Notification.objects.filter(user=self.admin, delegation=delegation).exists())
+
+
+class PruneNotificationsTests(TestCase):
+    """Archiviazione e cancellazione a blocchi delle notifiche lette vecchie."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        old = timezone.now() - timedelta(days=400)
+        # 10 vecchie lette, 2 vecchie non lette, 3 recenti lette
+        for i in range(15):
+            n = Notification.objects.create(user=cls.user, message=f"N{i}", is_read=(i not in (4, 7)))
+            if i < 10:
+                Notification.objects.filter(pk=n.pk).update(created_at=old + timedelta(minutes=i))
+
+    def test_archives_only_old_read_notifications(self):
+        out = StringIO()
+        call_command("prune_notifications", "--older-than", "180d", "--batch-size", "3", stdout=out)
+        self.assertEqual(NotificationArchive.objects.count(), 8)
+        self.assertEqual(Notification.objects.count(), 7)
+        self.assertFalse(Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=180)).exists())
+        self.assertIn("8 notifiche", out.getvalue())
+
+        # seconda esecuzione: nulla da fare
+        call_command("prune_notifications", "--older-than", "26w", stdout=StringIO())
+        self.assertEqual(NotificationArchive.objects.count(), 8)
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command("prune_notifications", "--older-than", "180", "--dry-run", stdout=out)
+        self.assertEqual(Notification.objects.count(), 15)
+        self.assertFalse(NotificationArchive.objects.exists())
+        self.assertIn("8 notifiche", out.getvalue())
+
+
+@skipUnless(search.available(connection), "indice full-text non disponibile su questo database")
+class FullTextSearchTests(TestCase):
+    """Indice full-text dei bandi: pertinenza, filtri e allineamento su save/delete."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.in_notes = Call.objects.create(title="Laboratori", program="PNRR", source="MIM", notes="Fondi per la robotica")
+        cls.in_title = Call.objects.create(title="Robotica educativa", program="FESR", source="Regione")
+        cls.unrelated = Call.objects.create(title="Mensa scolastica", program="PNRR", source="Comune")
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(search.search(Call.objects.all(), "robotica"), [self.in_title, self.in_notes])
+
+    def test_prefix_accents_and_syntax_are_safe(self):
+        Call.objects.create(title="Mobilità studenti", program="ERASMUS", source="INDIRE")
+        self.assertEqual([c.title for c in search.search(Call.objects.all(), "mobilita")], ["Mobilità studenti"])
+        self.assertEqual(search.search(Call.objects.all(), "robot"), [self.in_title, self.in_notes])
+        self.assertEqual(search.search(Call.objects.all(), 'robotica" OR NEAR('), [])
+        self.assertEqual(search.search(Call.objects.all(), "  "), [])
+
+    def test_queryset_filters_apply(self):
+        self.assertEqual(search.search(Call.objects.filter(program="PNRR"), "robotica"), [self.in_notes])
+
+    def test_index_follows_save_update_and_delete(self):
+        self.in_title.title = "Coding"
+        self.in_title.save()
+        self.assertEqual(search.search(Call.objects.all(), "robotica"), [self.in_notes])
+        Call.objects.filter(pk=self.unrelated.pk).update(tags="robotica")
+        self.assertEqual(search.search(Call.objects.all(), "robotica"), [self.unrelated, self.in_notes])
+        self.in_notes.delete()
+        self.assertEqual(search.search(Call.objects.all(), "robotica"), [self.unrelated])
+
+    def test_calls_for_proposal(self):
+        cfp = CallForProposal.objects.create(
+            title="Scuola 4.0", source_name="MIM", summary="Ambienti di apprendimento innovativi",
+            requirements="Robotica e coding",
+        )
+        self.assertEqual(search.search(CallForProposal.objects.all(), "robotica"), [cfp])
+        self.assertEqual(search.search(CallForProposal.objects.all(), "ambienti innovativi"), [cfp])
+
+    def test_bandi_list_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("bandi_list"), {"q": "robotica"})
+        self.assertEqual(list(response.context["calls"]), [self.in_title, self.in_notes])
+
+    def test_facets_count_all_matches_beyond_the_result_limit(self):
+        self.assertEqual(set(search.matching(Call.objects.all(), "robotica")), {self.in_title, self.in_notes})
+        self.client.force_login(self.user)
+        with mock.patch.object(search, "MAX_RESULTS", 1):
+            response = self.client.get(reverse("bandi_list"), {"q": "robotica"})
+        self.assertEqual(list(response.context["calls"]), [self.in_title])
+        programs = {item["label"]: item["count"] for item in response.context["facet_groups"][0][1]}
+        self.assertEqual(programs, {"PNRR": 1, "FESR": 1})
+
+
+class CallTagTests(TestCase):
+    """Tag normalizzati: allineamento al testo, filtri esatti e conteggi per faccetta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.a = Call.objects.create(title="A", program="PNRR", source="MIM", tags="Digitale, STEM; mobilità")
+        cls.b = Call.objects.create(title="B", program="PNRR", source="MIM", status="SCADUTO", tags="digitale")
+        cls.c = Call.objects.create(title="C", program="FESR", source="Regione", tags="Arte digitale, stem")
+
+    def slugs(self, call):
+        return sorted(call.normalized_tags.values_list("slug", flat=True))
+
+    def test_parse_normalizes(self):
+        self.assertEqual(
+            tags.parse(" Digitale ,STEM;; digitale , Mobilità  internazionale"),
+            [("digitale", "Digitale"), ("stem", "STEM"), ("mobilita-internazionale", "Mobilità internazionale")],
+        )
+
+    def test_save_keeps_links_in_sync(self):
+        self.assertEqual(self.slugs(self.a), ["digitale", "mobilita", "stem"])
+        self.assertEqual(Tag.objects.count(), 4)
+
+        self.a.tags = "STEM, lingue"
+        self.a.save()
+        self.assertEqual(self.slugs(self.a), ["lingue", "stem"])
+
+        with self.assertNumQueries(1):
+            # tag invariati: nessuna sincronizzazione
+            self.a.save()
+
+    def test_bulk_sync(self):
+        calls = Call.objects.bulk_create([
+            Call(title=f"X{i}", program="FSE", source="MIM", tags="Inclusione, digitale") for i in range(5)
+        ])
+        # tag esistenti, INSERT dei nuovi e rilettura, collegamenti attuali, INSERT
+        with self.assertNumQueries(5):
+            tags.sync(calls)
+        self.assertEqual(CallTag.objects.filter(call__in=calls).count(), 10)
+
+    def test_split_migration(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        CallTag.objects.all().delete()
+        Tag.objects.all().delete()
+        import_module("projects.migrations.0025_call_tags").split_tags(apps, None)
+        self.assertEqual(self.slugs(self.a), ["digitale", "mobilita", "stem"])
+        self.assertEqual(self.slugs(self.c), ["arte-digitale", "stem"])
+
+    def test_facet_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = facets.facet_counts(Call.objects.filter(program="PNRR"))
+        self.assertEqual(counts["program"], {"PNRR": 2})
+        self.assertEqual(counts["status"], {"APERTO": 1, "SCADUTO": 1})
+        self.assertEqual(counts["tag"], [("digitale", "Digitale", 2), ("mobilita", "mobilità", 1), ("stem", "STEM", 1)])
+
+    def test_bandi_list_exact_tag_filters(self):
+        self.client.force_login(self.user)
+        url = reverse("bandi_list")
+
+        response = self.client.get(url, {"tag": "digitale"})
+        self.assertEqual({c.title for c in response.context["calls"]}, {"A", "B"})   # non "Arte digitale"
+
+        response = self.client.get(url + "?tag=digitale&tag=stem")
+        self.assertEqual([c.title for c in response.context["calls"]], ["A"])
+        program = dict(response.context["facet_groups"])["Programma"]
+        self.assertEqual([(i["label"], i["count"]) for i in program], [("PNRR", 1)])
+        tag_items = {i["label"]: i for i in dict(response.context["facet_groups"])["Tag"]}
+        self.assertTrue(tag_items["STEM"]["selected"])
+        self.assertEqual(tag_items["STEM"]["url"], "?tag=digitale")
+
+
+class IngestCallsTests(TestCase):
+    """manage.py ingest_calls: formati, upsert per codice/link e record invariati senza scritture."""
+
+    CSV = (
+        "Codice;Titolo;Programma;Fonte;Scadenza;Importo;Sintesi\n"
+        "PNRR-01;Scuola 4.0;PNRR;MIM;31/12/2030;€ 1.500.000,00;Ambienti innovativi\n"
+        "FESR-07;Laboratori green;fesr;Regione;2030-06-30;250000;\n"
+        ";Senza chiave;PNRR;MIM;;;\n"
+    )
+    RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Bandi</title>
+  <item><title>Erasmus KA1</title><link>https://Example.org/ka1#top</link>
+    <category>Erasmus+</category><pubDate>Mon, 05 Jan 2026 10:00:00 +0100</pubDate>
+    <description>Mobilità del personale</description></item>
+  <item><title>Data sbagliata</title><link>https://example.org/x</link><pubDate>ieri</pubDate></item>
+</channel></rss>"""
+
+    def setUp(self):
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        (self.dir / "bandi.csv").write_text(self.CSV, encoding="utf-8")
+        (self.dir / "feed.xml").write_text(self.RSS, encoding="utf-8")
+        (self.dir / "api.json").write_text(json.dumps([
+            {"internal_code": "FSE-3", "title": "Inclusione", "program": "FSE", "source_name": "MIM",
+             "amount_available": 1000.5, "deadline_date": "2020-01-31"},
+            {"internal_code": "FSE-3", "title": "Inclusione (rettifica)", "program": "FSE", "source_name": "MIM"},
+        ]), encoding="utf-8")
+        (self.dir / "note.txt").write_text("ignorato", encoding="utf-8")
+
+    def run_command(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("ingest_calls", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_all_formats_from_directory(self):
+        out, err = self.run_command(str(self.dir))
+        self.assertIn("Totale: 7 letti, 4 nuovi, 0 aggiornati, 0 invariati, 2 scartati", out)
+        self.assertIn("né codice né link", err)
+        self.assertIn("data non valida", err)
+
+        scuola = CallForProposal.objects.get(ingest_key="code:PNRR-01")
+        self.assertEqual(scuola.amount_available, Decimal("1500000.00"))
+        self.assertEqual(str(scuola.deadline_date), "2030-12-31")
+        self.assertEqual(scuola.status, "OPEN")
+        self.assertEqual(CallForProposal.objects.get(internal_code="FESR-07").program, "FESR")
+
+        ka1 = CallForProposal.objects.get(ingest_key="url:https://example.org/ka1")
+        self.assertEqual((ka1.program, ka1.source_name, str(ka1.publication_date)), ("ERASMUS", "example.org", "2026-01-05"))
+
+        # stessa chiave due volte nel file: vale l'ultima
+        fse = CallForProposal.objects.get(internal_code="FSE-3")
+        self.assertEqual(fse.title, "Inclusione (rettifica)")
+        self.assertEqual(search.search(CallForProposal.objects.all(), "mobilita"), [ka1])
+
+    def test_reingest_is_idempotent_and_read_only(self):
+        self.run_command(str(self.dir))
+        with CaptureQueriesContext(connection) as ctx:
+            out, _ = self.run_command(str(self.dir))
+        self.assertIn("0 nuovi, 0 aggiornati, 4 invariati", out)
+        self.assertEqual([q["sql"] for q in ctx.captured_queries if not q["sql"].startswith("SELECT")], [])
+        self.assertEqual(CallForProposal.objects.count(), 4)
+
+    def test_changed_record_is_updated_keeping_staff_fields(self):
+        self.run_command(str(self.dir / "bandi.csv"))
+        scuola = CallForProposal.objects.get(internal_code="PNRR-01")
+        CallForProposal.objects.filter(pk=scuola.pk).update(status="IN_PREP", notes="Referente: prof. Rossi")
+
+        (self.dir / "bandi.csv").write_text(self.CSV.replace("Ambienti innovativi", "Ambienti e laboratori"), encoding="utf-8")
+        out, _ = self.run_command(str(self.dir / "bandi.csv"), "--batch-size", "1")
+        self.assertIn("0 nuovi, 1 aggiornati, 1 invariati", out)
+
+        scuola.refresh_from_db()
+        self.assertEqual((scuola.summary, scuola.status, scuola.notes), ("Ambienti e laboratori", "IN_PREP", "Referente: prof. Rossi"))
+        self.assertEqual(CallForProposal.objects.count(), 2)
+
+    def test_json_lines_and_dry_run(self):
+        path = self.dir / "feed.jsonl"
+        path.write_text('{"codice": "A1", "titolo": "Uno"}\n\n{"codice": "A2", "titolo": "Due", "stato": "chiuso"}\n', encoding="utf-8")
+        out, _ = self.run_command(str(path), "--dry-run")
+        self.assertIn("[dry-run] Totale: 2 letti, 2 nuovi", out)
+        self.assertFalse(CallForProposal.objects.exists())
+
+        self.run_command(str(path))
+        self.assertEqual(CallForProposal.objects.get(internal_code="A2").status, "CLOSED")
+
+    def test_streaming_json_array_across_chunks(self):
+        items = [{"code": f"C{i}", "title": "x" * (i % 50 + 1)} for i in range(300)]
+        path = self.dir / "big.json"
+        path.write_text(json.dumps(items, indent=2), encoding="utf-8")
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(list(ingest._iter_json_array(f, chunk_size=64)), items)
+
+    def test_amounts_and_dates(self):
+        self.assertEqual(ingest.parse_amount("1.234.567,89"), Decimal("1234567.89"))
+        self.assertEqual(ingest.parse_amount("1,234,567.89"), Decimal("1234567.89"))
+        self.assertEqual(ingest.parse_amount("€ 2.500"), Decimal("2500.00"))
+        self.assertEqual(ingest.parse_amount("12,5"), Decimal("12.50"))
+        self.assertEqual(str(ingest.parse_date("2026-03-01T09:00:00Z")), "2026-03-01")
+        self.assertEqual(str(ingest.parse_date("1.3.2026")), "2026-03-01")
+
+    def test_manual_calls_are_matched_not_duplicated(self):
+        manual = CallForProposal.objects.create(title="Scuola 4.0 (a mano)", internal_code="PNRR-01", source_name="MIM", status="IN_PREP")
+        self.assertEqual(manual.ingest_key, "code:PNRR-01")
+        legacy = CallForProposal.objects.create(title="Laboratori green", source_name="Regione", source_url="https://Example.org/ka1#top")
+        CallForProposal.objects.filter(pk=legacy.pk).update(ingest_key=None)      # inserito prima dell'import
+        from importlib import import_module
+        from django.apps import apps
+        import_module("projects.migrations.0031_callforproposal_ingest_key_backfill").backfill_ingest_key(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.ingest_key, "url:https://example.org/ka1")
+
+        out, _ = self.run_command(str(self.dir / "bandi.csv"))
+        self.assertIn("1 nuovi, 1 aggiornati", out)
+        out, _ = self.run_command(str(self.dir / "feed.xml"))
+        self.assertIn("0 nuovi, 1 aggiornati", out)
+        self.assertEqual(CallForProposal.objects.count(), 3)
+        manual.refresh_from_db()
+        self.assertEqual((manual.title, manual.status), ("Scuola 4.0", "IN_PREP"))
+
+    def test_derived_status_does_not_change_hash(self):
+        raw = {"codice": "A1", "titolo": "Uno", "scadenza": "2026-03-01"}
+        before = ingest.normalize(raw, today=date(2026, 2, 1))
+        after = ingest.normalize(raw, today=date(2026, 4, 1))
+        self.assertEqual((before["status"], after["status"]), ("OPEN", "CLOSED"))
+        self.assertEqual(before["content_hash"], after["content_hash"])
+        # stato fornito dal feed: fa parte del record
+        closed = ingest.normalize({**raw, "stato": "chiuso"}, today=date(2026, 2, 1))
+        self.assertNotEqual(closed["content_hash"], before["content_hash"])
+
+
+class DeadlineReminderTests(TestCase):
+    """Promemoria scadenze: fasce delle finestre, destinatari e registro anti-doppioni."""
+
+    today = timezone.localdate()
+
+    @classmethod
+    def setUpTestData(cls):
+        school, other_school = School.objects.create(name="IC Uno"), School.objects.create(name="IC Due")
+        cls.staff = User.objects.create_user("segreteria", password="pwd", is_staff=True)
+        cls.other_staff = User.objects.create_user("altra", password="pwd", is_staff=True)
+        cls.teacher = User.objects.create_user("docente", password="pwd")
+        cls.delegate = User.objects.create_user("prof", password="pwd")
+        pending = User.objects.create_user("attesa", password="pwd")
+        UserProfile.objects.create(user=cls.staff, school=school)
+        UserProfile.objects.create(user=cls.other_staff, school=other_school)
+        UserProfile.objects.create(user=cls.teacher, school=other_school)
+
+        cls.project = Project.objects.create(title="Laboratori", school=school)
+        confirmed = Delegation.objects.create(project=cls.project, collaborator=cls.delegate, creator=cls.staff)
+        Delegation.objects.filter(pk=confirmed.pk).update(status="CONFIRMED")   # save() forza PENDING
+        Delegation.objects.create(project=cls.project, collaborator=pending, creator=cls.staff, status="PENDING")
+
+        cls.milestones = {
+            days: Milestone.objects.create(project=cls.project, title=f"M{days}", due_date=cls.today + timedelta(days=days))
+            for days in (0, 1, 5, 20, 40)
+        }
+        Milestone.objects.create(project=cls.project, title="Fatta", due_date=cls.today, status="COMPLETED")
+        Call.objects.create(title="Scuola 4.0", program="PNRR", source="MIM", deadline=cls.today + timedelta(days=3))
+        Call.objects.create(title="Vecchio", program="PNRR", source="MIM", status="SCADUTO", deadline=cls.today)
+
+    def test_bands(self):
+        self.assertEqual(
+            [(w, (a - self.today).days, (b - self.today).days) for w, a, b in reminders.bands([30, 1, 7], self.today)],
+            [(1, 0, 1), (7, 2, 7), (30, 8, 30)],
+        )
+
+    def test_sends_once_per_window_to_delegates_and_staff(self):
+        result = reminders.send_reminders(today=self.today)
+        self.assertEqual((result.milestones, result.calls), (4, 1))
+        # milestone: segreteria della scuola + delegato confermato; bando: amministratori delle scuole
+        self.assertEqual(result.notifications, 4 * 2 + 2)
+        self.assertEqual(Notification.objects.filter(user=self.delegate).count(), 4)
+        self.assertEqual(Notification.objects.filter(user=self.other_staff).count(), 1)
+        self.assertFalse(Notification.objects.filter(user=self.teacher).exists())
+        self.assertTrue(Notification.objects.filter(user=self.staff, message__contains="'M0' del progetto 'Laboratori' scade oggi").exists())
+
+        again = reminders.send_reminders(today=self.today)
+        self.assertEqual((again.milestones, again.calls, again.notifications, again.already_sent), (0, 0, 0, 5))
+
+        # quattro giorni dopo M5 entra nella finestra di 1 giorno: nuovo promemoria
+        later = reminders.send_reminders(today=self.today + timedelta(days=4))
+        self.assertEqual(later.milestones, 1)
+        self.assertTrue(DeadlineReminder.objects.filter(object_id=self.milestones[5].pk, window_days=1).exists())
+
+    def test_call_reminders_reach_all_admins_in_small_blocks(self):
+        Call.objects.create(title="Bando STEM", program="PNRR", source="MIM", status="APERTO", deadline=self.today + timedelta(days=3))
+        admins = reminders.call_recipients()
+        self.assertEqual(len(admins), 2)
+        # tetto più basso dei destinatari di un bando: un bando per blocco, nessuno escluso
+        with mock.patch.object(reminders, "MAX_NOTIFICATIONS_PER_BATCH", 1), \
+                mock.patch.object(reminders, "_send", wraps=reminders._send) as send:
+            result = reminders.send_reminders(today=self.today, windows=[7])
+        self.assertEqual(result.calls, 2)
+        self.assertEqual([len(c.args[2]) for c in send.call_args_list if c.args[0] == "CALL"], [1, 1])
+        for call in Call.objects.filter(status="APERTO"):
+            self.assertEqual(
+                set(Notification.objects.filter(message__contains=f"'{call.title}'").values_list("user_id", flat=True)),
+                admins,
+            )
+        self.assertEqual(set(DeadlineReminder.objects.filter(kind="CALL").values_list("recipients", flat=True)), {2})
+
+    def test_overlapping_run_does_not_crash(self):
+        reminders.send_reminders(today=self.today)
+        notifications = Notification.objects.count()
+        # l'altra esecuzione ha letto il registro prima che questa lo scrivesse
+        with mock.patch.object(reminders, "_already_sent", return_value=set()):
+            result = reminders.send_reminders(today=self.today)
+        self.assertEqual((result.milestones, result.calls, result.notifications, result.already_sent), (0, 0, 0, 5))
+        self.assertEqual(Notification.objects.count(), notifications)
+
+    def test_moved_deadline_is_reminded_again(self):
+        reminders.send_reminders(today=self.today)
+        milestone = self.milestones[20]
+        milestone.due_date += timedelta(days=2)
+        milestone.save()
+        self.assertEqual(reminders.send_reminders(today=self.today).milestones, 1)
+
+    def test_command_dry_run_and_windows(self):
+        out = StringIO()
+        call_command("send_deadline_reminders", "--windows", "7", "--dry-run", stdout=out)
+        self.assertIn("[dry-run] Promemoria: 3 milestone, 1 bandi, 8 notifiche", out.getvalue())
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(DeadlineReminder.objects.exists())
+
+
+@override_settings(VERSIONED_CACHE_ENABLED=True)
+class CalendarFeedTests(TestCase):
+    """Calendario unificato: eventi, milestone e scadenze dei bandi per giorno, in cache per mese."""
+
+    today = timezone.localdate()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school, other_school = School.objects.create(name="IC Uno"), School.objects.create(name="IC Due")
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Laboratori", school=cls.school)
+        other = Project.objects.create(title="Altrove", school=other_school)
+        Event.objects.create(owner=cls.user, school=cls.school, project=cls.project, title="Riunione", date=cls.today)
+        Milestone.objects.create(project=cls.project, title="Collaudo", due_date=cls.today)
+        Milestone.objects.create(project=cls.project, title="Annullata", due_date=cls.today, status="CANCELED")
+        Milestone.objects.create(project=other, title="Non mia", due_date=cls.today)
+        cls.call = Call.objects.create(title="Scuola 4.0", program="PNRR", source="MIM", deadline=cls.today)
+
+    def setUp(self):
+        cache.clear()
+        self.first = self.today.replace(day=1)
+        self.last = (self.first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+    def titles(self, school=None):
+        days = calendar_feed.month_entries(self.user, school or self.school, self.first, self.last)
+        return [(e.kind, e.title) for e in days.get(self.today, [])]
+
+    def test_merges_sources_for_school(self):
+        with self.assertNumQueries(3):     # una query per fonte
+            self.assertEqual(
+                self.titles(),
+                [("event", "Riunione"), ("milestone", "Collaudo"), ("call", "Scuola 4.0")],
+            )
+        with self.assertNumQueries(0):
+            self.titles()
+
+    def test_writes_invalidate_month(self):
+        self.titles()
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.create(owner=self.user, school=self.school, title="Consiglio", date=self.today)
+        self.assertIn(("event", "Consiglio"), self.titles())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Milestone.objects.create(project=self.project, title="Rendicontazione", due_date=self.today)
+        self.assertIn(("milestone", "Rendicontazione"), self.titles())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.call.deadline = self.today - timedelta(days=40)
+            self.call.save()
+        self.assertNotIn(("call", "Scuola 4.0"), self.titles())
+
+    def test_view_shows_entries(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("calendar"))
+        self.assertContains(response, "Collaudo")
+        self.assertContains(response, reverse("bando_detail", args=[self.call.pk]))
+        self.assertNotContains(response, "Annullata")
+        # mese già in cache: sessione, utente e link del feed
+        with self.assertNumQueries(3):
+            self.client.get(reverse("calendar"))
+
+
+class RecurringEventTests(TestCase):
+    """Serie ricorrenti: una riga per serie, occorrenze calcolate solo per l'intervallo richiesto."""
+
+    today = timezone.localdate()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.weekly = Event.objects.create(
+            owner=cls.user, title="Collegio", date=cls.today - timedelta(days=7 * 52 * 5), repeat="WEEKLY",
+            repeat_until=cls.today + timedelta(days=7 * 52 * 5),
+        )
+        Event.objects.create(owner=cls.user, title="Gita", date=cls.today + timedelta(days=3))
+
+    def test_rules(self):
+        weekly = recurrence.Rule(date(2020, 1, 6), "WEEKLY", until=date(2030, 1, 1))
+        self.assertEqual(
+            list(weekly.between(date(2029, 3, 1), date(2029, 3, 31))),
+            [date(2029, 3, 5), date(2029, 3, 12), date(2029, 3, 19), date(2029, 3, 26)],
+        )
+        self.assertEqual(list(weekly.between(date(2030, 1, 1), date(2030, 2, 1))), [])
+
+        monthly = recurrence.Rule(date(2025, 1, 31), "MONTHLY", count=4, exceptions=["2025-03-31"])
+        self.assertEqual(list(monthly.between(date(2025, 1, 1), date(2025, 12, 31))),
+                         [date(2025, 1, 31), date(2025, 2, 28), date(2025, 4, 30)])
+        self.assertEqual(monthly.end(), date(2025, 4, 30))
+
+        every_other_day = recurrence.Rule(date(2025, 1, 1), "DAILY", interval=2)
+        self.assertEqual(list(every_other_day.between(date(2025, 1, 4), date(2025, 1, 9))),
+                         [date(2025, 1, 5), date(2025, 1, 7), date(2025, 1, 9)])
+        self.assertEqual(every_other_day.end(), date.max)
+
+    def test_series_end_beyond_date_max(self):
+        self.assertEqual(recurrence.Rule(date(2025, 1, 1), "DAILY", count=10 ** 7).end(), date.max)
+        self.assertEqual(recurrence.Rule(date(2025, 1, 1), "MONTHLY", count=10 ** 6).end(), date.max)
+
+    def test_repeat_limits_are_validated(self):
+        self.client.force_login(self.user)
+        base = {"title": "Troppe", "date": self.today.isoformat(), "repeat": "DAILY"}
+        for extra in ({"repeat_count": "10000000"}, {"repeat_interval": "40000"}):
+            response = self.client.post(reverse("calendar"), {**base, **extra}, follow=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(list(response.context["messages"])), 1)
+            response = self.client.post(reverse("calendar_events_json"), {**base, **extra})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("massimo", response.json()["error"])
+        self.assertFalse(Event.objects.filter(title="Troppe").exists())
+        response = self.client.post(reverse("calendar_events_json"), {**base, "repeat_count": str(recurrence.MAX_COUNT)})
+        self.assertEqual(response.status_code, 201)
+
+    def test_series_end_saved(self):
+        self.assertEqual(self.weekly.series_end, self.weekly.date + timedelta(weeks=52 * 10))
+        single = Event.objects.get(title="Gita")
+        self.assertIsNone(single.series_end)
+
+    def test_calendar_month_expands_running_series(self):
+        first = self.today.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        days = calendar_feed.month_entries(self.user, None, first, last)
+        weekly = [day for day, entries in days.items() for e in entries if e.title == "Collegio"]
+        self.assertIn(len(weekly), (4, 5))
+        self.assertTrue(all((day - self.weekly.date).days % 7 == 0 for day in weekly))
+
+    def test_skip_single_occurrence(self):
+        self.client.force_login(self.user)
+        skipped = next(recurrence.Rule.for_event(self.weekly).between(self.today))
+        self.client.post(reverse("event_delete", args=[self.weekly.pk]), {"occurrence": skipped.isoformat()})
+        self.weekly.refresh_from_db()
+        self.assertEqual(self.weekly.repeat_exceptions, [skipped.isoformat()])
+        self.assertNotIn(skipped, recurrence.Rule.for_event(self.weekly).between(skipped, skipped + timedelta(days=6)))
+
+    def test_dashboard_upcoming_merges_series(self):
+        self.client.force_login(self.user)
+        upcoming = self.client.get(reverse("dashboard")).context["upcoming_events"]
+        self.assertEqual(len(upcoming), 5)
+        self.assertEqual([e.date for e in upcoming], sorted(e.date for e in upcoming))
+        self.assertIn("Gita", [e.title for e in upcoming])
+        self.assertGreaterEqual(upcoming[0].date, self.today)
+
+
+class CalendarIcsFeedTests(TestCase):
+    """Feed iCalendar con token: streaming, RRULE per le serie, 304 con ETag."""
+
+    today = timezone.localdate()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        project = Project.objects.create(title="Laboratori")
+        confirmed = Delegation.objects.create(project=project, collaborator=cls.user, creator=cls.user)
+        Delegation.objects.filter(pk=confirmed.pk).update(status="CONFIRMED")
+        Milestone.objects.create(project=project, title="Collaudo", due_date=cls.today)
+        Milestone.objects.create(project=Project.objects.create(title="Altro"), title="Non mia", due_date=cls.today)
+        cls.event = Event.objects.create(
+            owner=cls.user, title="Collegio; docenti", date=cls.today, repeat="WEEKLY", repeat_count=10,
+            repeat_exceptions=[(cls.today + timedelta(days=7)).isoformat()],
+        )
+        cls.url = reverse("calendar_ics", args=[ical.new_token(cls.user).token])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b"".join(response.streaming_content).decode() if response.streaming else ""
+        return response, body
+
+    def test_feed_content(self):
+        response, body = self.get()
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn("SUMMARY:Collegio\\; docenti\r\n", body)
+        self.assertIn("RRULE:FREQ=WEEKLY;COUNT=10\r\n", body)
+        self.assertIn(f"EXDATE;VALUE=DATE:{self.today + timedelta(days=7):%Y%m%d}", body)
+        self.assertIn("SUMMARY:Scadenza: Collaudo", body)
+        self.assertNotIn("Non mia", body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split("\r\n")))
+
+    def test_unchanged_poll_gets_304_without_rows(self):
+        response, _ = self.get()
+        with self.assertNumQueries(3):          # token e i due aggregati
+            again, body = self.get(if_none_match=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(body, "")
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        self.event.title = "Collegio docenti"
+        self.event.save()
+        changed, body = self.get(if_none_match=response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn("SUMMARY:Collegio docenti", body)
+
+        Milestone.objects.filter(title="Collaudo").delete()
+        self.assertNotEqual(self.get()[0]["ETag"], changed["ETag"])
+
+    def test_deleted_event_is_not_304(self):
+        newer = Event.objects.create(owner=self.user, title="Consiglio", date=self.today)
+        response, _ = self.get()
+        self.event.delete()           # il più vecchio: l'ultima modifica non cambia
+        again, body = self.get(if_none_match=response["ETag"], if_modified_since="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(again.status_code, 200)
+        self.assertIn("SUMMARY:Consiglio", body)
+        self.assertNotIn("Collegio", body)
+        # stesso numero di eventi ma uno diverso, ultima modifica invariata
+        Event.objects.filter(pk=newer.pk).update(title="Rinominato")
+        replacement = Event.objects.create(owner=self.user, title="Altro", date=self.today)
+        Event.objects.filter(pk=replacement.pk).update(updated_at=newer.updated_at)
+        newer.delete()
+        self.assertNotEqual(self.get()[0]["ETag"], again["ETag"])
+
+    def test_revoked_delegation_changes_etag(self):
+        response, _ = self.get()
+        Delegation.objects.filter(collaborator=self.user).update(status="REVOKED")
+        again, body = self.get(if_none_match=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotIn("Collaudo", body)
+
+    def test_monthly_end_of_month_rule(self):
+        rule = recurrence.Rule(date(2025, 1, 31), "MONTHLY", until=date(2025, 12, 31))
+        self.assertEqual(ical.rrule(rule), "RRULE:FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1;UNTIL=20251231")
+
+    def test_unknown_or_regenerated_token(self):
+        self.assertEqual(self.client.get(reverse("calendar_ics", args=["nope"])).status_code, 404)
+        self.client.force_login(self.user)
+        self.client.post(reverse("calendar_feed_token"))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CalendarRangeTests(TestCase):
+    """JSON a colonne per settimana/agenda: una query, occorrenze delle serie comprese."""
+
+    start = date(2025, 3, 3)           # lunedì
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Laboratori")
+        Event.objects.create(owner=cls.user, title="Gita", date=cls.start + timedelta(days=2), project=cls.project)
+        Event.objects.create(owner=cls.user, title="Collegio", date=date(2024, 1, 1), repeat="WEEKLY")
+        Event.objects.create(owner=User.objects.create_user("altro"), title="Non mia", date=cls.start)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_columns_for_week(self):
+        url = reverse("calendar_events_json")
+        with self.assertNumQueries(3):       # sessione, utente, eventi
+            data = self.client.get(url, {"start": "2025-03-03", "end": "2025-03-09"}).json()
+        self.assertEqual(data["title"], ["Collegio", "Gita"])
+        self.assertEqual(data["day"], [0, 2])
+        self.assertEqual(data["series"], [1, 0])
+        self.assertEqual(data["project"], [None, self.project.pk])
+        self.assertEqual(data["projects"], {str(self.project.pk): "Laboratori"})
+
+    def test_invalid_ranges(self):
+        url = reverse("calendar_events_json")
+        self.assertEqual(self.client.get(url, {"start": "ieri", "end": "2025-03-09"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"start": "2025-03-09", "end": "2025-03-03"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"start": "2025-01-01", "end": "2025-12-31"}).status_code, 400)
+
+    def test_post_creates_without_redirect(self):
+        response = self.client.post(reverse("calendar_events_json"), {"title": "Consiglio", "date": "2025-03-04"})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Event.objects.filter(pk=response.json()["id"], owner=self.user).exists())
+        self.assertEqual(self.client.post(reverse("calendar_events_json"), {"title": ""}).status_code, 400)
+
+    def test_week_view_starts_on_monday(self):
+        response = self.client.get(reverse("calendar_week"), {"start": "2025-03-06"})
+        self.assertEqual(response.context["start"], self.start)
+        self.assertEqual(response.context["days"], 7)
+
+
+class ChunkedUploadTests(TestCase):
+    """Caricamento a blocchi: offset confermati, ripresa, SHA-256 calcolato durante l'invio."""
+
+    CONTENT = bytes(range(256)) * 1000        # 256 kB
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def start(self, **extra):
+        data = {"title": "Relazione finale", "filename": "relazione.pdf", "size": len(self.CONTENT), **extra}
+        response = self.client.post(reverse("document_upload_start"), data)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def put(self, url, offset, data):
+        return self.client.put(url, data, content_type="application/octet-stream", headers={"Upload-Offset": str(offset)})
+
+    def test_chunks_resume_and_finalize(self):
+        upload = self.start()
+        url, step = upload["url"], 100_000
+        self.assertEqual(self.put(url, 0, self.CONTENT[:step]).json()["offset"], step)
+
+        # offset sbagliato: rifiutato, con l'offset da cui riprendere
+        conflict = self.put(url, 0, self.CONTENT[:step])
+        self.assertEqual((conflict.status_code, conflict.json()["offset"]), (409, step))
+
+        # blocco successivo in un altro processo: stato SHA-256 ricostruito dal file parziale
+        uploads._hashers.clear()
+        self.assertEqual(self.client.get(url).json()["offset"], step)
+        self.put(url, step, self.CONTENT[step:2 * step])
+        done = self.put(url, 2 * step, self.CONTENT[2 * step:]).json()
+
+        document = Document.objects.get(pk=done["document"])
+        self.assertEqual(document.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+        self.assertEqual(document.size, len(self.CONTENT))
+        self.assertEqual(document.uploaded_by, self.user)
+        with document.file.open("rb") as f:
+            self.assertEqual(f.read(), self.CONTENT)
+        self.assertFalse(any(uploads._partial_dir().iterdir()))
+
+    def test_checksum_mismatch_discards(self):
+        upload = self.start(sha256="0" * 64)
+        response = self.put(upload["url"], 0, self.CONTENT)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(Document.objects.exists())
+
+    def test_validation_and_ownership(self):
+        self.assertEqual(self.client.post(reverse("document_upload_start"), {"title": "x", "filename": "a.pdf"}).status_code, 400)
+        upload = self.start()
+        self.assertEqual(self.put(upload["url"], 0, self.CONTENT + b"x").status_code, 413)
+        self.client.force_login(User.objects.create_user("altro", password="pwd"))
+        self.assertEqual(self.client.get(upload["url"]).status_code, 404)
+
+    def stored_files(self):
+        root = Path(settings.MEDIA_ROOT)
+        return [p for p in root.rglob("*") if p.is_file() and uploads.PARTIAL_DIR not in p.relative_to(root).as_posix()]
+
+    def test_failed_finish_leaves_no_orphan_and_can_be_retried(self):
+        upload = self.start()
+        url, step = upload["url"], 200_000
+        self.put(url, 0, self.CONTENT[:step])
+
+        real_store = uploads._store
+
+        def store_then_fail(session, name):
+            real_store(session, name)
+            raise OSError("disco pieno")
+
+        for failure in (
+            mock.patch.object(Document.objects, "create", side_effect=RuntimeError("insert fallito")),
+            mock.patch.object(uploads, "_store", side_effect=store_then_fail),
+        ):
+            with failure, self.assertRaises((RuntimeError, OSError)):
+                self.put(url, step, self.CONTENT[step:])
+            self.assertEqual(self.stored_files(), [])
+            self.assertFalse(Document.objects.exists())
+            session = UploadSession.objects.get()
+            self.assertEqual((session.received, session.document_id, session.claim_token), (step, None, None))
+
+        done = self.put(url, step, self.CONTENT[step:]).json()
+        document = Document.objects.get(pk=done["document"])
+        self.assertEqual(document.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_claimed_chunk_is_not_written_twice(self):
+        upload = self.start()
+        url = upload["url"]
+        self.put(url, 0, self.CONTENT[:1000])
+        # un'altra richiesta sta scrivendo il blocco da 1000
+        UploadSession.objects.update(claim_token=uuid.uuid4(), claimed_at=timezone.now())
+        busy = self.put(url, 1000, b"x" * 500)
+        self.assertEqual((busy.status_code, busy.json()["offset"]), (409, 1000))
+        self.assertEqual(uploads.partial_path(UploadSession.objects.get()).stat().st_size, 1000)
+
+        # prenotazione abbandonata: scade
+        UploadSession.objects.update(claimed_at=timezone.now() - uploads.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(self.put(url, 1000, self.CONTENT[1000:2000]).json()["offset"], 2000)
+        self.assertIsNone(UploadSession.objects.get().claim_token)
+
+    def test_same_name_uploads_do_not_clobber(self):
+        other = bytes(reversed(self.CONTENT))
+        first, second = self.start(), self.start()
+        self.put(first["url"], 0, self.CONTENT)
+        # l'altro caricamento ha scelto lo stesso nome prima che il primo lo occupasse
+        taken = Document.objects.get().file.name
+        with mock.patch.object(uploads.default_storage, "get_available_name", side_effect=[taken, "documents/relazione_2.pdf"]):
+            self.put(second["url"], 0, other)
+        contents = {}
+        for document in Document.objects.all():
+            with document.file.open("rb") as f:
+                contents[document.file.name] = f.read()
+        self.assertEqual(contents, {taken: self.CONTENT, "documents/relazione_2.pdf": other})
+        self.assertFalse(any(uploads._partial_dir().iterdir()))
+
+    def test_delete_waits_for_claimed_chunk(self):
+        url = self.start()["url"]
+        self.put(url, 0, self.CONTENT[:1000])
+        UploadSession.objects.update(claim_token=uuid.uuid4(), claimed_at=timezone.now())
+        self.assertEqual(self.client.delete(url).status_code, 409)
+        session = UploadSession.objects.get()
+        self.assertTrue(uploads.partial_path(session).exists())
+
+        UploadSession.objects.update(claim_token=None, claimed_at=None)
+        self.assertEqual(self.client.delete(url).json(), {"deleted": True})
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(uploads.partial_path(session).exists())
+
+    def test_prune_command(self):
+        upload = self.start()
+        self.put(upload["url"], 0, self.CONTENT[:1000])
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=3))
+        out = StringIO()
+        call_command("prune_uploads", stdout=out)
+        self.assertIn("Caricamenti eliminati: 1", out.getvalue())
+        self.assertFalse(any(uploads._partial_dir().iterdir()))
+
+
+class ExpenseImportTests(TestCase):
+    """Import spese da CSV/XLSX: formati, importi, righe non valide, totali allineati."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Laboratori", budget=Decimal("100000"))
+
+    def upload(self, name, content, **options):
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        return expense_import.import_expenses(self.project, SimpleUploadedFile(name, data), **options)
+
+    def assert_totals_consistent(self):
+        self.project.refresh_from_db()
+        expenses = Expense.objects.filter(project=self.project)
+        self.assertEqual(self.project.spent, sum((e.amount for e in expenses), Decimal("0")))
+        rollup = {r.category: (r.total, r.count) for r in ExpenseRollup.objects.filter(project=self.project)}
+        for category in {e.category for e in expenses}:
+            rows = [e.amount for e in expenses if e.category == category]
+            self.assertEqual(rollup[category], (sum(rows, Decimal("0")), len(rows)))
+
+    def test_amount_formats(self):
+        cases = {
+            "1.234,56": "1234.56", "1,234.56": "1234.56", "1.234": "1234.00", "12,5": "12.50",
+            "12.50": "12.50", "€ 2.500,00": "2500.00", "1.500.000": "1500000.00", 7: "7.00", 19.9: "19.90",
+            0.1 + 0.2: "0.30",
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(expense_import.parse_amount(raw), Decimal(expected), raw)
+        for raw in ("", "abc", "-5", "1e12", "1,234", "12,345", "0,005", 12.345):
+            with self.assertRaises(ValueError, msg=raw):
+                expense_import.parse_amount(raw)
+        # stesso helper dell'import dei bandi
+        self.assertIs(ingest.parse_amount, amounts.parse_amount)
+
+    def test_csv_dialects(self):
+        semicolon = "Data;Fornitore;Categoria;Importo\n2025-03-01;Rossi srl;Materiali;1.234,56\n05/03/2025;Bianchi;SERVICES;99\n"
+        result = self.upload("spese.csv", "\ufeff" + semicolon)
+        self.assertEqual((result.created, result.error_count), (2, 0))
+        comma = 'date,vendor,category,amount,note\n2025-04-01,"Verdi, snc",training,"1,234.56",corso\n'
+        result = self.upload("spese.csv", comma)
+        self.assertEqual((result.created, result.error_count), (1, 0))
+        verdi = Expense.objects.get(vendor="Verdi, snc")
+        self.assertEqual((verdi.category, verdi.amount, verdi.note), ("TRAINING", Decimal("1234.56"), "corso"))
+        self.assertEqual(Expense.objects.get(vendor="Bianchi").date, date(2025, 3, 5))
+        self.assert_totals_consistent()
+        self.assertEqual(self.project.spent, Decimal("2568.12"))
+
+    @skipUnless(importlib.util.find_spec("openpyxl"), "openpyxl non installato")
+    def test_xlsx(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Data", "Categoria", "Importo", "Documento"])
+        sheet.append([date(2025, 5, 2), "Arredi", 1500, "FT-1"])
+        sheet.append([date(2025, 5, 3), "Materiali", "1.234,5", None])
+        sheet.append([None, None, None, None])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        result = self.upload("spese.xlsx", buffer.getvalue())
+        self.assertEqual((result.created, result.error_count), (2, 0))
+        self.assertEqual(Expense.objects.get(document="FT-1").amount, Decimal("1500.00"))
+        self.assert_totals_consistent()
+        self.assertEqual(self.project.spent, Decimal("2734.50"))
+
+    def test_invalid_rows_roll_back_unless_skipped(self):
+        content = (
+            "data;categoria;importo\n"
+            "2025-01-10;Materiali;100\n"
+            "31/02/2025;Materiali;10\n"          # data inesistente
+            "2025-01-11;Viaggi;10\n"             # categoria sconosciuta
+            "2025-01-12;Servizi;\n"              # importo mancante
+            "2025-01-13;Servizi;50,5\n"
+        )
+        result = self.upload("spese.csv", content, batch_size=1)
+        self.assertTrue(result.rolled_back)
+        self.assertEqual((result.created, result.error_count), (0, 3))
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        self.assertFalse(Expense.objects.exists())
+        self.assertFalse(ExpenseRollup.objects.exists())
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.spent, Decimal("0"))
+
+        result = self.upload("spese.csv", content, batch_size=1, skip_invalid=True)
+        self.assertFalse(result.rolled_back)
+        self.assertEqual((result.created, result.error_count), (2, 3))
+        self.assert_totals_consistent()
+        self.assertEqual(self.project.spent, Decimal("150.50"))
+
+    def test_format_errors(self):
+        with self.assertRaisesMessage(expense_import.ImportFormatError, "Colonne obbligatorie mancanti: amount"):
+            self.upload("spese.csv", "data;categoria\n2025-01-01;Materiali\n")
+        with self.assertRaisesMessage(expense_import.ImportFormatError, "Formato non supportato"):
+            self.upload("spese.pdf", "x")
+
+    def test_view_reports_result(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("spese.csv", b"data;categoria;importo\n2025-01-10;Materiali;1.000\n")
+        response = self.client.post(reverse("expense_import", args=[self.project.pk]), {"file": upload})
+        self.assertEqual(response.context["result"].created, 1)
+        self.assert_totals_consistent()
+        self.assertEqual(self.project.spent, Decimal("1000.00"))
+
+
+class KeysetPaginationTests(TestCase):
+    """Paginazione a cursore (projects/pagination.py) e pagine delle spese del progetto."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("prof", password="pwd")
+        cls.project = Project.objects.create(title="Laboratori", budget=Decimal("1000"))
+        # date ripetute: l'ordine tra spese dello stesso giorno lo decide l'id
+        days = [date(2025, 1, d) for d in (5, 5, 5, 4, 4, 3, 2, 2)]
+        cls.expenses = [
+            Expense.objects.create(project=cls.project, date=day, category="MATERIALS" if i % 2 else "SERVICES", amount=Decimal("1"))
+            for i, day in enumerate(days)
+        ]
+        cls.expected = [e.pk for e in sorted(cls.expenses, key=lambda e: (e.date, e.pk), reverse=True)]
+
+    def page(self, **cursors):
+        return pagination.keyset_page(Expense.objects.all(), ("date", "id"), size=3, **cursors)
+
+    def test_forward_and_backward_cover_every_row_once(self):
+        pages, cursor = [], None
+        while True:
+            page = self.page(after=cursor)
+            pages.append([e.pk for e in page.items])
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([pk for items in pages for pk in items], self.expected)
+        self.assertEqual([len(items) for items in pages], [3, 3, 2])
+        self.assertIsNone(self.page().prev_cursor)
+
+        # a ritroso dall'ultima pagina: stesse pagine, nello stesso ordine
+        back, cursor = [pages[-1]], page.prev_cursor
+        while cursor:
+            page = self.page(before=cursor)
+            back.insert(0, [e.pk for e in page.items])
+            self.assertIsNotNone(page.next_cursor)
+            cursor = page.prev_cursor
+        self.assertEqual(back, pages)
+
+    def test_ascending(self):
+        page = pagination.keyset_page(Expense.objects.all(), ("date", "id"), size=4, descending=False)
+        rest = pagination.keyset_page(Expense.objects.all(), ("date", "id"), size=4, descending=False, after=page.next_cursor)
+        self.assertEqual([e.pk for e in page.items + rest.items], self.expected[::-1])
+        self.assertIsNone(rest.next_cursor)
+
+    def test_garbage_or_tampered_cursor_falls_back_to_first_page(self):
+        first = [e.pk for e in self.page().items]
+        garbage = [
+            "!!!", "bm90IGpzb24", pagination.encode_cursor(["2025-01-05"]),       # non JSON, lunghezza errata
+            pagination.encode_cursor([True, 1]), pagination.encode_cursor([None, 1]),
+            pagination.encode_cursor(["2025-13-40", 1]), pagination.encode_cursor(["ieri", "x"]),
+            # ben formati ma con tipi sbagliati per (date, id)
+            pagination.encode_cursor(["2025-01-05", "x"]), pagination.encode_cursor([5, 1]),
+        ]
+        for cursor in garbage:
+            for direction in ("after", "before"):
+                page = self.page(**{direction: cursor})
+                self.assertEqual([e.pk for e in page.items], first, (direction, cursor))
+                self.assertIsNone(page.prev_cursor)
+        # cursore modificato ma ben formato: è solo una posizione
+        page = self.page(after=pagination.encode_cursor([date(2025, 1, 4), 0]))
+        self.assertEqual([e.date for e in page.items], [date(2025, 1, 3), date(2025, 1, 2), date(2025, 1, 2)])
+
+    def test_project_detail_ignores_wrongly_typed_cursor(self):
+        self.client.force_login(self.user)
+        url = reverse("project_detail", args=[self.project.pk])
+        for cursor in (pagination.encode_cursor(["2025-01-05", "x"]), pagination.encode_cursor([5, 1])):
+            response = self.client.get(url, {"after": cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([e.pk for e in response.context["expenses"]], self.expected)
+
+    def test_project_detail_keeps_filters_across_pages(self):
+        Expense.objects.bulk_create([
+            Expense(project=self.project, date=date(2024, 12, 1), category="MATERIALS", amount=Decimal("1"))
+            for _ in range(pagination.PAGE_SIZE)
+        ])
+        self.client.force_login(self.user)
+        url = reverse("project_detail", args=[self.project.pk])
+        response = self.client.get(url, {"category": "MATERIALS"})
+        self.assertEqual(len(response.context["expenses"]), pagination.PAGE_SIZE)
+        next_url = response.context["expenses_next_url"]
+        self.assertIn("category=MATERIALS", next_url)
+        self.assertIsNone(response.context["expenses_prev_url"])
+
+        following = self.client.get(url + next_url)
+        self.assertEqual(len(following.context["expenses"]), 4)
+        self.assertEqual({e.category for e in following.context["expenses"]}, {"MATERIALS"})
+        self.assertIsNone(following.context["expenses_next_url"])
+        self.assertIn("before=", following.context["expenses_prev_url"])
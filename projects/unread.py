@@ -0,0 +1,73 @@
+# projects/unread.py
+"""
+Contatore delle notifiche non lette per utente, tenuto in cache.
+
+La lettura (badge, context processor, endpoint JSON) legge solo la cache;
+la tabella delle notifiche si interroga soltanto se la chiave manca
+(prima lettura o chiave espulsa) e il risultato torna in cache.
+Gli aggiornamenti sono incr/decr atomici, eseguiti dopo il commit:
+- signals di Notification (creazione, lettura, eliminazione)
+- adjust()/forget() per le scritture bulk che non emettono signals
+
+La chiave scade dopo UNREAD_CACHE_TIMEOUT secondi: un incr perso (chiave
+assente tra il COUNT e l'add) si corregge da solo al ricalcolo successivo.
+Con la cache in memoria del processo (LocMemCache, il default) ogni worker
+avrebbe il proprio contatore e gli incr arriverebbero solo a quello che ha
+gestito la scrittura: in quel caso il contatore si ricalcola a ogni lettura
+(COUNT sull'indice user/is_read). La cache si usa con un backend condiviso,
+es. Redis (CACHE_BACKEND in settings), o forzandola con
+UNREAD_COUNTER_CACHED=True (un solo processo).
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_CACHE_TIMEOUT = getattr(settings, "UNREAD_CACHE_TIMEOUT", 300)
+
+
+def _cached():
+    shared = not isinstance(caches["default"], LocMemCache)
+    return getattr(settings, "UNREAD_COUNTER_CACHED", shared)
+
+
+def _key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def _count(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    if not _cached():
+        return _count(user_id)
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = _count(user_id)
+        # add: non sovrascrive un valore scritto nel frattempo da un incr
+        if not cache.add(_key(user_id), count, UNREAD_CACHE_TIMEOUT):
+            count = cache.get(_key(user_id), count)
+    return max(count, 0)
+
+
+def adjust(user_id, delta):
+    """Somma delta al contatore dell'utente, dopo il commit della transazione."""
+    if not user_id or not delta or not _cached():
+        return
+
+    def apply():
+        try:
+            cache.incr(_key(user_id), delta)
+        except ValueError:
+            # Chiave assente: verrà ricalcolata alla prossima lettura
+            pass
+    transaction.on_commit(apply)
+
+
+def forget(user_id):
+    """Scarta il contatore (ricalcolo alla prossima lettura)."""
+    if _cached():
+        transaction.on_commit(lambda: cache.delete(_key(user_id)))
@@ -0,0 +1,300 @@
+# projects/uploads.py
+"""
+Caricamento di documenti a blocchi, con ripresa.
+
+Protocollo (viste document_upload_*):
+1. POST con titolo, nome e dimensione del file: nasce una UploadSession.
+2. PUT di ogni blocco, con l'header Upload-Offset = byte già confermati.
+   Il corpo si legge dallo stream della richiesta e si scrive sul file
+   parziale a pezzi da READ_SIZE: nessun blocco passa interamente in memoria
+   né da un file temporaneo di Django.
+3. GET restituisce l'offset confermato: un caricamento interrotto riprende
+   da lì. Un blocco arrivato a metà non viene confermato e si riscrive.
+Prima di toccare il file parziale una richiesta prenota la sessione con un
+UPDATE condizionato (offset atteso e nessuna prenotazione attiva, come
+projects/outbox.py): due PUT dello stesso blocco non scrivono mai insieme.
+Una prenotazione rimasta appesa (processo morto) scade dopo CLAIM_TIMEOUT.
+L'ultimo blocco completa il caricamento: nella stessa transazione si crea il
+Document, si conferma la sessione e, come ultimo passo, si sposta il file
+parziale nella posizione di Document.file, senza rileggerlo: os.link (che
+non sovrascrive mai, stesso filesystem) e poi rimozione del parziale. Se
+intanto un altro caricamento ha preso lo stesso nome si riprova con un nome
+nuovo. Se qualcosa fallisce il file torna al suo posto e l'ultimo blocco si
+può rinviare. Lo SHA-256 si calcola mentre i blocchi arrivano.
+Anche l'annullamento (cancel) prenota la sessione: non si cancella il file
+parziale sotto a un blocco in scrittura.
+
+Lo stato dello SHA-256 non si può salvare nel database (hashlib non è
+serializzabile): resta in memoria nel processo che riceve i blocchi.
+Se un blocco arriva a un altro processo (o dopo un riavvio) lo stato si
+ricostruisce rileggendo una volta la parte già ricevuta.
+Con uno storage non locale (senza path()) il file completo si carica con
+storage.save(), che lo rilegge.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import Document, UploadSession
+
+CHUNK_SIZE = getattr(settings, "UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024)
+MAX_CHUNK_SIZE = 4 * CHUNK_SIZE
+MAX_UPLOAD_SIZE = getattr(settings, "UPLOAD_MAX_SIZE", 4 * 1024 ** 3)
+READ_SIZE = 64 * 1024
+
+PARTIAL_DIR = "uploads/partial"
+# Oltre questo tempo la prenotazione di un blocco si considera abbandonata
+CLAIM_TIMEOUT = timedelta(minutes=10)
+# Nomi alternativi provati se il file di destinazione nasce nel frattempo
+MAX_NAME_ATTEMPTS = 10
+UPLOAD_TO = Document._meta.get_field("file").upload_to
+
+# Stato SHA-256 dei caricamenti in corso nel processo: id -> (offset, hasher)
+MAX_HASHERS = 256
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Richiesta non accettabile; status è il codice HTTP da restituire."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _partial_dir():
+    try:
+        path = Path(default_storage.path(PARTIAL_DIR))
+    except NotImplementedError:
+        path = Path(settings.BASE_DIR) / "tmp" / "uploads"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def partial_path(session):
+    return _partial_dir() / f"{session.pk}.part"
+
+
+def start(user, title, filename, size, project=None, is_final=False, expected_sha256=""):
+    """Apre un caricamento (file parziale vuoto)."""
+    if not title or not filename:
+        raise UploadError("Titolo e nome del file sono obbligatori.")
+    if size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"Dimensione non valida (massimo {MAX_UPLOAD_SIZE} byte).")
+    session = UploadSession.objects.create(
+        user=user, title=title, filename=get_valid_filename(os.path.basename(filename)) or "documento",
+        size=size, project=project, is_final=is_final, expected_sha256=(expected_sha256 or "").lower(),
+    )
+    partial_path(session).touch()
+    return session
+
+
+def _take_hasher(session):
+    """Hasher dei primi session.received byte: dalla memoria o rileggendo il file parziale."""
+    with _hashers_lock:
+        cached = _hashers.pop(session.pk, None)
+    if cached and cached[0] == session.received:
+        return cached[1]
+    hasher = hashlib.sha256()
+    remaining = session.received
+    with open(partial_path(session), "rb") as f:
+        while remaining:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                raise UploadError("File parziale incompleto: ricominciare il caricamento.", status=410)
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def _keep_hasher(session_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def _claim(session, offset):
+    """Prenota la scrittura del blocco che parte da offset; token o UploadError."""
+    now = timezone.now()
+    token = uuid.uuid4()
+    free = Q(claim_token=None) | Q(claimed_at__lt=now - CLAIM_TIMEOUT)
+    claimed = (
+        UploadSession.objects
+        .filter(free, pk=session.pk, received=offset, document=None)
+        .update(claim_token=token, claimed_at=now)
+    )
+    if not claimed:
+        raise UploadError("Blocco già in scrittura da un'altra richiesta o offset superato.", status=409)
+    return token
+
+
+def _release(session, token):
+    UploadSession.objects.filter(pk=session.pk, claim_token=token).update(claim_token=None, claimed_at=None)
+
+
+def write_chunk(session, offset, stream, length):
+    """
+    Scrive `length` byte letti da stream a partire da offset (deve essere
+    l'offset confermato). Restituisce il nuovo offset; all'ultimo blocco
+    crea il Document (session.document).
+    """
+    if session.document_id:
+        raise UploadError("Caricamento già completato.", status=409)
+    if offset != session.received:
+        raise UploadError("Offset non corrispondente.", status=409)
+    if length <= 0 or length > MAX_CHUNK_SIZE or offset + length > session.size:
+        raise UploadError("Dimensione del blocco non valida.", status=413)
+
+    token = _claim(session, offset)
+    try:
+        hasher = _take_hasher(session)
+        with open(partial_path(session), "r+b") as f:
+            # eventuali byte di un blocco interrotto oltre l'offset si sovrascrivono
+            f.seek(offset)
+            f.truncate()
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError("Blocco incompleto: riprendere dall'offset confermato.")
+                f.write(data)
+                hasher.update(data)
+                remaining -= len(data)
+
+        new_offset = offset + length
+        if new_offset == session.size:
+            finish(session, token, hasher.hexdigest())
+            return new_offset
+        # conferma solo se la prenotazione è ancora nostra
+        if not UploadSession.objects.filter(pk=session.pk, claim_token=token).update(
+            received=new_offset, claim_token=None, claimed_at=None, updated_at=timezone.now(),
+        ):
+            raise UploadError("Prenotazione scaduta: riprendere dall'offset confermato.", status=409)
+    except BaseException:
+        _release(session, token)
+        raise
+    session.received = new_offset
+    _keep_hasher(session.pk, new_offset, hasher)
+    return new_offset
+
+
+def _store(session, name):
+    """Sposta il file parziale nello storage con il nome `name`; restituisce il nome salvato."""
+    try:
+        default_storage.path(name)
+    except NotImplementedError:
+        with open(partial_path(session), "rb") as f:
+            return default_storage.save(name, File(f))
+    for _ in range(MAX_NAME_ATTEMPTS):
+        target = Path(default_storage.path(name))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(partial_path(session), target)
+        except FileExistsError:
+            # nome preso da un altro caricamento dopo get_available_name()
+            name = default_storage.get_available_name(name)
+            continue
+        try:
+            partial_path(session).unlink()
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+        return name
+    raise UploadError("Impossibile assegnare un nome al file: riprovare.", status=409)
+
+
+def _unstore(session, name):
+    """Annulla _store: il file torna parziale (per rinviare l'ultimo blocco)."""
+    try:
+        target = Path(default_storage.path(name))
+    except NotImplementedError:
+        default_storage.delete(name)
+        return
+    os.replace(target, partial_path(session))
+
+
+def finish(session, token, digest):
+    """
+    Crea il Document dal file completo: Document, conferma della sessione e
+    spostamento del file insieme. Va chiamata con la prenotazione `token`
+    dell'ultimo blocco, fuori da transazioni esterne (il file si sposta prima
+    del commit e si ripristina solo se il commit fallisce qui).
+    """
+    if session.expected_sha256 and session.expected_sha256 != digest:
+        abort(session)
+        raise UploadError("SHA-256 non corrispondente: file scartato.", status=422)
+    name = default_storage.get_available_name(os.path.join(UPLOAD_TO, session.filename))
+    stored = None
+    try:
+        with transaction.atomic():
+            document = Document.objects.create(
+                title=session.title, file=name, project_id=session.project_id,
+                uploaded_by_id=session.user_id, is_final=session.is_final, size=session.size, sha256=digest,
+            )
+            if not UploadSession.objects.filter(pk=session.pk, claim_token=token).update(
+                document=document, received=session.size, claim_token=None, claimed_at=None,
+                updated_at=timezone.now(),
+            ):
+                raise UploadError("Prenotazione scaduta: rinviare l'ultimo blocco.", status=409)
+            # ultimo passo: se fallisce, Document e sessione tornano indietro
+            stored = _store(session, name)
+            if stored != name:
+                Document.objects.filter(pk=document.pk).update(file=stored)
+                document.file.name = stored
+    except BaseException:
+        # anche se _store si è interrotta dopo aver spostato il file
+        if stored or not partial_path(session).exists():
+            _unstore(session, stored or name)
+        raise
+    # storage senza path(): il file è stato copiato, il parziale si elimina ora
+    partial_path(session).unlink(missing_ok=True)
+    session.received = session.size
+    session.document = document
+    return document
+
+
+def cancel(session):
+    """
+    Annulla un caricamento (DELETE). Un caricamento in corso va prima
+    prenotato: se un blocco è in scrittura UploadError 409.
+    """
+    if not session.document_id:
+        _claim(session, session.received)
+    abort(session)
+
+
+def abort(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    partial_path(session).unlink(missing_ok=True)
+    session.delete()
+
+
+def prune(older_than=timedelta(days=2)):
+    """
+    Elimina i caricamenti fermi da più di older_than (file parziale compreso;
+    per quelli completati resta il Document). Restituisce quanti.
+    """
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - older_than)
+    count = 0
+    for session in stale.iterator():
+        try:
+            cancel(session)
+        except UploadError:
+            continue            # blocco in arrivo proprio ora: non è fermo
+        count += 1
+    return count
@@ -0,0 +1,62 @@
+# projects/versioned_cache.py
+"""
+Invalidazione a versioni per le cache della dashboard e del calendario.
+
+La chiave di un blocco in cache contiene le versioni delle fonti ("scope")
+da cui dipende. Le scritture non cancellano nulla: incrementano (dopo il
+commit) la versione dello scope toccato e i blocchi vecchi scadono da soli.
+Ogni modulo ha il proprio namespace, es. "dashboard:version:school:3".
+
+Con la cache in memoria del processo (LocMemCache, il default) un
+incremento di versione arriverebbe solo al worker che ha gestito la
+scrittura e gli altri servirebbero blocchi vecchi fino alla scadenza: in
+quel caso, come per projects/unread.py, la cache non si usa (enabled()).
+Si usa con un backend condiviso (CACHE_BACKEND in settings) o forzandola
+con VERSIONED_CACHE_ENABLED=True (un solo processo).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def enabled():
+    shared = not isinstance(caches["default"], LocMemCache)
+    return getattr(settings, "VERSIONED_CACHE_ENABLED", shared)
+
+
+def school_scope(school_id):
+    return f"school:{school_id}" if school_id else "school:none"
+
+
+class VersionedCache:
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def version_key(self, scope):
+        return f"{self.namespace}:version:{scope}"
+
+    def versions(self, *scopes):
+        """Versioni correnti degli scope, nell'ordine indicato."""
+        keys = [self.version_key(scope) for scope in scopes]
+        found = cache.get_many(keys)
+        # Valore iniziale legato all'orologio: una chiave espulsa non torna a
+        # una versione già usata (e a blocchi vecchi)
+        return [found.get(key) or cache.get_or_set(key, time.time_ns()) for key in keys]
+
+    def bump(self, *scopes):
+        for scope in scopes:
+            key = self.version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    def invalidate(self, *scopes):
+        """Incrementa le versioni degli scope dopo il commit della transazione."""
+        if not enabled():
+            return
+        transaction.on_commit(lambda: self.bump(*scopes))
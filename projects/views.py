@@ -1,17 +1,23 @@
 from decimal import Decimal, InvalidOperation
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, F, FloatField, Value, Case, When, Q
-from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+import asyncio
 import calendar
+import csv
+from urllib.parse import urlencode
 from django.urls import reverse
 from django.db import transaction
 
 from django.contrib import messages
 from django.conf import settings
 
-from .models import Project, School, Expense, SpendingLimit, Event, Delegation, Milestone
+from .models import Project, School, Expense, SpendingLimit, Event, Delegation, Milestone, CalendarToken, UploadSession
+from . import calendar_feed, dashboard_cache, delegations, facets, ical, limits, live, outbox, pagination, recurrence, rollups, search, unread, uploads
+from . import expense_import
 
 from datetime import date, timedelta
 from django.contrib.auth import get_user_model
@@ -38,43 +44,23 @@ def dashboard(request):
     profile = getattr(request.user, "profile", None)
     school = getattr(profile, "school", None)
 
-    # --- PROGETTI DELLA SCUOLA
-    projects_qs = Project.objects.all()
-    if school:
-        projects_qs = projects_qs.filter(school=school)
-
-    # KPI: budget totale e spesa totale (somma delle Expense)
-    totals = {}
-    totals["budget"] = projects_qs.aggregate(b=Sum("budget"))["b"] or 0
-
-    expenses_qs = Expense.objects.filter(project__in=projects_qs)
-    totals["spent"] = expenses_qs.aggregate(s=Sum("amount"))["s"] or 0
-
-    # Progetti recenti (ultimi 6) con spesa calcolata dalle expense
-    latest = list(projects_qs.order_by("-start_date", "-id")[:6])
-
-    # Mappa project.id -> somma spese
-    sums_per_project = (
-        Expense.objects
-        .filter(project__in=latest)
-        .values("project_id")
-        .annotate(total=Sum("amount"))
-    )
-    sums_map = {row["project_id"]: row["total"] or 0 for row in sums_per_project}
-
-    for p in latest:
-        # attributo usato nel template
-        p.spent_from_expenses = sums_map.get(p.id, 0)
+    # --- KPI E PROGETTI RECENTI DELLA SCUOLA
+    # Uguali per tutta la scuola: in cache, invalidati dalle scritture
+    # su Project/Expense (vedi projects/dashboard_cache.py)
+    blocks = dashboard_cache.school_blocks(school)
+    totals = blocks["totals"]
+    latest = blocks["latest"]
 
     # --- NOTIFICHE PER L'UTENTE
     notifications = Notification.objects.filter(user=request.user).order_by("-created_at")[:5]
 
     # --- PROSSIMI EVENTI (CALENDARIO)
     today = timezone.localdate()
-    events_qs = Event.objects.filter(owner=request.user, date__gte=today)
+    events_qs = Event.objects.filter(owner=request.user)
     if school:
         events_qs = events_qs.filter(school=school)
-    upcoming_events = events_qs.order_by("date")[:5]
+    # serie ricorrenti espanse solo fino alle prime occorrenze
+    upcoming_events = recurrence.upcoming(events_qs.select_related("project"), today, limit=5)
 
     context = {
         "school": school,
@@ -82,6 +68,7 @@ def dashboard(request):
         "latest": latest,
         "notifications": notifications,
         "upcoming_events": upcoming_events,
+        "notifications_sse": settings.NOTIFICATIONS_SSE,
     }
     return render(request, "dashboard.html", context)
 
@@ -102,6 +89,8 @@ def projects_list(request):
     if program:
         qs = qs.filter(program=program)
 
+    # Project.spent è mantenuto allineato alle Expense dai signals:
+    # la lista resta una semplice scansione della tabella progetti.
     projects = qs.annotate(
         percent_spent=Case(
             When(budget__gt=0, then=100.0 * F("spent") / F("budget")),
@@ -148,12 +137,23 @@ from .models import School, Document, CallForProposal, Call, Notification
 
 # ... (Il resto degli import e delle funzioni sono invariati) ...
 
+def _filtered_expenses(project, request):
+    """Spese del progetto con i filtri GET ?category= e ?vendor= (dettaglio ed export)."""
+    exp_qs = project.expenses.all().order_by("-date", "-id")
+
+    cat = request.GET.get("category") or ""
+    if cat: exp_qs = exp_qs.filter(category=cat)
+    vendor_q = request.GET.get("vendor") or ""
+    if vendor_q: exp_qs = exp_qs.filter(vendor__icontains=vendor_q)
+    return exp_qs, cat, vendor_q
+
+
 @login_required
 def project_detail(request, pk: int):
     # La data di oggi deve essere acquisita in modo coerente
     today = timezone.localdate()  # Usa localdate per coerenza di fuso orario con il database
 
-    project = get_object_or_404(Project, pk=pk)
+    project = get_object_or_404(Project.objects.select_related("school"), pk=pk)
     project_pk = project.pk
 
     profile = getattr(request.user, "profile", None)
@@ -241,16 +241,27 @@ def project_detail(request, pk: int):
     # ---------------------------
     # B) Gestione GET (Calcoli Finanziari) - Logica invariata
     # ---------------------------
-    exp_qs = project.expenses.all().order_by("-date", "-id")
-
-    cat = request.GET.get("category") or ""
-    if cat: exp_qs = exp_qs.filter(category=cat)
-    vendor_q = request.GET.get("vendor") or ""
-    if vendor_q: exp_qs = exp_qs.filter(vendor__icontains=vendor_q)
+    exp_qs, cat, vendor_q = _filtered_expenses(project, request)
 
-    expenses = list(exp_qs)
-    filtered_total = exp_qs.aggregate(total=Sum("amount"))["total"] or Decimal("0")
-    total_spent = project.expenses.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+    # Paginazione a cursore sull'ordinamento (-date, -id)
+    page = pagination.keyset_page(
+        exp_qs, ("date", "id"),
+        after=request.GET.get("after"), before=request.GET.get("before"),
+    )
+    expenses = page.items
+    filter_params = {k: v for k, v in (("category", cat), ("vendor", vendor_q)) if v}
+    next_url = f"?{urlencode({**filter_params, 'after': page.next_cursor})}" if page.next_cursor else None
+    prev_url = f"?{urlencode({**filter_params, 'before': page.prev_cursor})}" if page.prev_cursor else None
+
+    # Totali da Project.spent e dai rollup per categoria; la SUM sulle Expense
+    # serve solo quando c'è il filtro per fornitore (non pre-aggregabile).
+    total_spent = project.spent or Decimal("0")
+    if vendor_q:
+        filtered_total = exp_qs.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+    elif cat:
+        filtered_total = rollups.category_totals(project).get(cat, Decimal("0"))
+    else:
+        filtered_total = total_spent
     budget = project.budget or Decimal("0")
     progress_percent = Decimal("0")
     if budget > 0:
@@ -260,31 +271,14 @@ def project_detail(request, pk: int):
     # ---------------------------
     # C) Limiti - Logica invariata
     # ---------------------------
-    by_cat = project.expenses.values("category").annotate(total=Sum("amount"))
-    sums_by_cat = {row["category"]: row["total"] or Decimal("0") for row in by_cat}
-    limits_ctx = []
-    for lim in project.limits.all().order_by("category", "base", "id"):
-        base_total = total_spent if lim.base == "TOTAL_SPENT" else budget
-        allowed_total = (lim.percentage / Decimal("100")) * base_total
-        spent_in_cat = sums_by_cat.get(lim.category, Decimal("0"))
-        remaining = allowed_total - spent_in_cat
-        pct_used = Decimal("0")
-        if allowed_total > 0:
-            pct_used = (spent_in_cat * Decimal("100")) / allowed_total
-            if pct_used > 100: pct_used = Decimal("100")
-        limits_ctx.append({
-            "limit_id": lim.id, "category": lim.category,
-            "category_label": dict(Expense.CATEGORY_CHOICES).get(lim.category, lim.category),
-            "base": lim.base, "base_label": {"TOTAL_SPENT": "Percentuale sul totale speso",
-                                             "TOTAL_BUDGET": "Percentuale sul budget totale"}.get(lim.base, lim.base),
-            "percentage": lim.percentage, "allowed_total": allowed_total, "spent_in_cat": spent_in_cat,
-            "remaining": remaining, "pct_used": pct_used, "note": getattr(lim, "note", None),
-        })
+    # Stessa valutazione usata dal report dei limiti (projects/limits.py)
+    limits_ctx = list(limits.evaluate_limits(project.limits.all()))
 
     # ---------------------------
     # D) Milestone (Recupero e Calcoli POSIZIONE) - Logica corretta per 0%
     # ---------------------------
-    milestones = project.milestones.all().order_by('due_date')
+    # una sola query: conteggi e posizioni si calcolano sulla lista
+    milestones = list(project.milestones.all().order_by('due_date'))
 
     project_start = project.start_date
     project_end = project.end_date
@@ -328,14 +322,15 @@ def project_detail(request, pk: int):
             ms.pos_percent = None
 
             # Calcoli Avanzamento Milestone
-    total_milestones = milestones.count()
-    completed_milestones = milestones.filter(status='COMPLETED').count()
+    total_milestones = len(milestones)
+    completed_milestones = sum(1 for ms in milestones if ms.status == 'COMPLETED')
     milestone_progress_percent = Decimal("0")
     if total_milestones > 0:
         milestone_progress_percent = (completed_milestones * Decimal("100")) / total_milestones
 
     context = {
         "project": project, "expenses": expenses, "filtered_total": filtered_total, "total_spent": total_spent,
+        "expenses_next_url": next_url, "expenses_prev_url": prev_url,
         "progress_percent": progress_percent, "category_choices": Expense.CATEGORY_CHOICES,
         "base_choices": [("TOTAL_SPENT", "Percentuale sul totale speso"),
                          ("TOTAL_BUDGET", "Percentuale sul budget totale")],
@@ -350,6 +345,89 @@ def project_detail(request, pk: int):
 
 
 
+class _Echo:
+    """Pseudo-buffer per csv.writer: restituisce la riga invece di scriverla."""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+def expenses_export_csv(request, pk: int):
+    """
+    Export CSV delle spese di un progetto, con gli stessi filtri del dettaglio.
+    Risposta in streaming: le righe vengono lette a blocchi dal DB e inviate
+    man mano, quindi la memoria resta costante anche con molte spese.
+    """
+    project = get_object_or_404(Project, pk=pk)
+
+    profile = getattr(request.user, "profile", None)
+    school = getattr(profile, "school", None)
+    if school and project.school_id and project.school_id != school.id and not request.user.is_superuser:
+        raise Http404("Progetto non trovato")
+
+    exp_qs, _, _ = _filtered_expenses(project, request)
+    rows = exp_qs.values_list("date", "vendor", "category", "amount", "document", "note")
+    category_labels = dict(Expense.CATEGORY_CHOICES)
+
+    def stream():
+        writer = csv.writer(_Echo(), delimiter=";")
+        # BOM per far riconoscere l'UTF-8 a Excel; stesse intestazioni dell'import
+        yield "\ufeff" + writer.writerow(["data", "fornitore", "categoria", "importo", "documento", "note", "categoria_descrizione"])
+        for exp_date, vendor, category, amount, document, note in rows.iterator(chunk_size=2000):
+            yield writer.writerow([
+                exp_date.isoformat(), vendor or "", category, amount,
+                document or "", note or "", category_labels.get(category, category),
+            ])
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="spese_progetto_{project.pk}.csv"'
+    return response
+
+
+@login_required
+def expense_import_view(request, pk: int):
+    """
+    Import massivo di spese da CSV/XLSX per un progetto.
+    GET: form di caricamento. POST: import e report degli errori per riga.
+    """
+    project = get_object_or_404(Project, pk=pk)
+
+    profile = getattr(request.user, "profile", None)
+    school = getattr(profile, "school", None)
+    if school and project.school_id and project.school_id != school.id and not request.user.is_superuser:
+        raise Http404("Progetto non trovato")
+
+    result = None
+    error = None
+    if request.method == "POST":
+        uploaded_file = request.FILES.get("file")
+        skip_invalid = bool(request.POST.get("skip_invalid"))
+        try:
+            batch_size = int(request.POST.get("batch_size") or expense_import.DEFAULT_BATCH_SIZE)
+        except ValueError:
+            batch_size = expense_import.DEFAULT_BATCH_SIZE
+        batch_size = max(1, min(batch_size, 5000))
+
+        if not uploaded_file:
+            error = "Seleziona un file da importare."
+        else:
+            try:
+                result = expense_import.import_expenses(
+                    project, uploaded_file, batch_size=batch_size, skip_invalid=skip_invalid,
+                )
+            except expense_import.ImportFormatError as e:
+                error = str(e)
+
+    return render(request, "projects/expense_import.html", {
+        "project": project,
+        "result": result,
+        "error": error,
+        "category_choices": Expense.CATEGORY_CHOICES,
+        "default_batch_size": expense_import.DEFAULT_BATCH_SIZE,
+    })
+
+
 @login_required
 def projects_by_school(request, school_id: int):
     # (opzionale: se non la usi più puoi rimuoverla e togliere la rotta)
@@ -433,6 +511,52 @@ def limit_update(request, pk: int):
     return redirect("project_detail", pk=project.pk)
 
 
+def _limits_report_rows(request):
+    """
+    Filtri comuni a report HTML e JSON dei limiti:
+    ?school=<id>&program=PNRR&status=BREACHED|WARN
+    Un utente legato a una scuola vede solo la propria (salvo superuser).
+    """
+    profile = getattr(request.user, "profile", None)
+    school = getattr(profile, "school", None)
+
+    school_id = request.GET.get("school") or None
+    if school and not request.user.is_superuser:
+        school_id = school.id
+    try:
+        school_id = int(school_id) if school_id else None
+    except ValueError:
+        school_id = None
+
+    program = request.GET.get("program") or ""
+    status = request.GET.get("status") or ""
+    statuses = (status,) if status in ("WARN", "BREACHED") else ("WARN", "BREACHED")
+
+    rows = limits.limits_report(school_id=school_id, program=program or None, statuses=statuses)
+    filters = {"school": school_id, "program": program, "status": status}
+    return rows, filters
+
+
+@login_required
+def limits_report(request):
+    """Report dei limiti di spesa superati o oltre l'80% su tutti i progetti (non paginato)."""
+    rows, filters = _limits_report_rows(request)
+    return render(request, "projects/limits_report.html", {
+        "rows": rows,
+        "filters": filters,
+        "schools": School.objects.order_by("name"),
+        "program_choices": Project.PROGRAM_CHOICES,
+        "status_labels": limits.STATUS_LABELS,
+    })
+
+
+@login_required
+def limits_report_json(request):
+    """Stesso report in JSON (importi come stringhe decimali), anche qui senza paginazione."""
+    rows, filters = _limits_report_rows(request)
+    return JsonResponse({"filters": filters, "count": len(rows), "results": rows})
+
+
 # (se ancora lo usi in urls per test rapido; altrimenti rimuovi anche la rotta)
 @login_required
 def db_check(request):
@@ -444,9 +568,10 @@ def db_check(request):
 @login_required
 def calendar_view(request):
     """
-    Calendario mensile:
-    - ogni utente vede i propri eventi (owner = request.user)
-    - facoltativamente filtrati per scuola (profile.school)
+    Calendario mensile (projects/calendar_feed.py):
+    - eventi dell'utente (owner = request.user), filtrati per scuola (profile.school)
+    - milestone dei progetti della scuola (tutte, per chi non ha una scuola)
+    - scadenze dei bandi
     """
     profile = getattr(request.user, "profile", None)
     school = getattr(profile, "school", None)
@@ -464,33 +589,10 @@ def calendar_view(request):
 
     # --- A) Se POST: aggiungo un nuovo evento
     if request.method == "POST":
-        title = (request.POST.get("title") or "").strip()
-        date_str = request.POST.get("date")
-        description = (request.POST.get("description") or "").strip()
-        project_id = request.POST.get("project_id") or None  # ← IMPORTANTE: NOME CAMPO
-
-        if title and date_str:
-            try:
-                ev_date = date.fromisoformat(date_str)
-            except ValueError:
-                ev_date = today
-
-            project = None
-            if project_id:
-                try:
-                    project = Project.objects.get(pk=project_id)
-                except Project.DoesNotExist:
-                    project = None
-
-            Event.objects.create(
-                school=school or (project.school if project else None),
-                project=project,
-                owner=request.user,
-                title=title,
-                description=description,
-                date=ev_date,
-            )
-
+        try:
+            _create_event(request, school, today)
+        except ValueError as e:
+            messages.error(request, str(e))
         return redirect(f"{reverse('calendar')}?year={year}&month={month}")
 
     # --- B) Intervallo del mese
@@ -498,18 +600,8 @@ def calendar_view(request):
     _, last_day_num = calendar.monthrange(year, month)
     last_day = date(year, month, last_day_num)
 
-    # Eventi dell'utente nel mese
-    events_qs = Event.objects.filter(
-        owner=request.user,
-        date__gte=first_day,
-        date__lte=last_day,
-    )
-    if school:
-        events_qs = events_qs.filter(school=school)
-
-    events_by_day = {}
-    for ev in events_qs.select_related("project"):
-        events_by_day.setdefault(ev.date, []).append(ev)
+    # Eventi, milestone e bandi del mese, per giorno (in cache)
+    entries_by_day = calendar_feed.month_entries(request.user, school, first_day, last_day)
 
     cal = calendar.Calendar(firstweekday=0)
     weeks = []
@@ -518,7 +610,7 @@ def calendar_view(request):
         cell = {
             "date": d,
             "in_month": (d.month == month),
-            "events": events_by_day.get(d, []),
+            "entries": entries_by_day.get(d, []),
             "is_today": (d == today),
         }
         week.append(cell)
@@ -538,27 +630,190 @@ def calendar_view(request):
     ]
     month_label = f"{months_it[month - 1]} {year}"
 
-    # Progetti della scuola / tutti
-    projects_qs = Project.objects.all()
-    if school:
-        projects_qs = projects_qs.filter(school=school)
-
     context = {
         "school": school,
         "weeks": weeks,
         "month_label": month_label,
+        "month_name": months_it[month - 1],
         "year": year,
         "month": month,
         "prev_year": prev_month_date.year,
         "prev_month": prev_month_date.month,
         "next_year": next_month_date.year,
         "next_month": next_month_date.month,
-        "projects": projects_qs.order_by("title"),  # ← QUI PASSIAMO I PROGETTI
+        "projects": calendar_feed.project_choices(school),  # (id, titolo) per il modulo
         "today": today,
+        "feed_url": _calendar_feed_url(request),
     }
     return render(request, "calendar.html", context)
 
 
+def _create_event(request, school, today):
+    """
+    Evento (o serie) dai campi del modulo "Aggiungi evento"; None se mancano
+    titolo o data, ValueError (con il messaggio per l'utente) se la
+    ripetizione è fuori dai limiti di recurrence.
+    """
+    title = (request.POST.get("title") or "").strip()
+    date_str = request.POST.get("date")
+    description = (request.POST.get("description") or "").strip()
+    project_id = request.POST.get("project_id") or None  # ← IMPORTANTE: NOME CAMPO
+
+    if not (title and date_str):
+        return None
+
+    try:
+        ev_date = date.fromisoformat(date_str)
+    except ValueError:
+        ev_date = today
+
+    project = None
+    if project_id:
+        try:
+            project = Project.objects.get(pk=project_id)
+        except Project.DoesNotExist:
+            project = None
+
+    repeat = request.POST.get("repeat") or ""
+    if repeat not in dict(recurrence.FREQUENCY_CHOICES):
+        repeat = ""
+    try:
+        interval = max(int(request.POST.get("repeat_interval") or 1), 1)
+    except ValueError:
+        interval = 1
+    try:
+        until = date.fromisoformat(request.POST.get("repeat_until") or "")
+    except ValueError:
+        until = None
+    try:
+        count = max(int(request.POST.get("repeat_count") or 0), 0) or None
+    except ValueError:
+        count = None
+    if interval > recurrence.MAX_INTERVAL:
+        raise ValueError(f"Intervallo di ripetizione troppo grande (massimo {recurrence.MAX_INTERVAL}).")
+    if count and count > recurrence.MAX_COUNT:
+        raise ValueError(f"Troppe occorrenze (massimo {recurrence.MAX_COUNT}).")
+
+    return Event.objects.create(
+        school=school or (project.school if project else None),
+        project=project,
+        owner=request.user,
+        title=title,
+        description=description,
+        date=ev_date,
+        repeat=repeat,
+        repeat_interval=interval,
+        repeat_until=until if repeat else None,
+        repeat_count=count if repeat else None,
+    )
+
+
+# Giorni mostrati dalle viste caricate dal browser e intervallo massimo del JSON
+CALENDAR_RANGE_DAYS = {"week": 7, "agenda": 28}
+CALENDAR_RANGE_MAX_DAYS = 92
+
+
+@login_required
+def calendar_range_view(request, mode):
+    """
+    Viste settimana e agenda: la pagina contiene solo struttura e modulo,
+    gli eventi dell'intervallo visibile li carica il browser da
+    calendar_events_json (anche quando si cambia settimana o si aggiunge un evento).
+    """
+    profile = getattr(request.user, "profile", None)
+    school = getattr(profile, "school", None)
+
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET.get("start") or "")
+    except ValueError:
+        start = today
+    if mode == "week":
+        start -= timedelta(days=start.weekday())
+
+    return render(request, "calendar_range.html", {
+        "mode": mode,
+        "start": start,
+        "days": CALENDAR_RANGE_DAYS[mode],
+        "today": today,
+        "projects": calendar_feed.project_choices(school),
+    })
+
+
+@login_required
+def calendar_events_json(request):
+    """
+    GET ?start=AAAA-MM-GG&end=AAAA-MM-GG (estremi inclusi): occorrenze degli
+    eventi dell'utente in formato a colonne (calendar_feed.event_columns), una query.
+    POST: crea un evento con i campi del modulo del calendario e risponde con
+    il suo id, senza redirect né nuova pagina.
+    """
+    profile = getattr(request.user, "profile", None)
+    school = getattr(profile, "school", None)
+
+    if request.method == "POST":
+        try:
+            event = _create_event(request, school, timezone.localdate())
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if event is None:
+            return JsonResponse({"error": "Titolo e data sono obbligatori."}, status=400)
+        return JsonResponse({"id": event.pk, "date": event.date.isoformat()}, status=201)
+
+    try:
+        start = date.fromisoformat(request.GET.get("start") or "")
+        end = date.fromisoformat(request.GET.get("end") or "")
+    except ValueError:
+        return JsonResponse({"error": "Parametri start/end non validi (AAAA-MM-GG)."}, status=400)
+    if end < start or (end - start).days >= CALENDAR_RANGE_MAX_DAYS:
+        return JsonResponse(
+            {"error": f"Intervallo non valido (massimo {CALENDAR_RANGE_MAX_DAYS} giorni)."}, status=400,
+        )
+
+    return JsonResponse(calendar_feed.event_columns(request.user, school, start, end))
+
+
+def _calendar_feed_url(request):
+    token = CalendarToken.objects.filter(user=request.user).values_list("token", flat=True).first()
+    return request.build_absolute_uri(reverse("calendar_ics", args=[token])) if token else ""
+
+
+@login_required
+def calendar_feed_token(request):
+    """Crea (o rigenera, disattivando il precedente) il link del feed iCalendar personale."""
+    if request.method == "POST":
+        ical.new_token(request.user)
+    return redirect("calendar")
+
+
+def calendar_ics(request, token):
+    """
+    Feed iCalendar personale (senza login: il token identifica l'utente).
+    L'ETag arriva da due aggregati su indice: un client che ha già la
+    versione corrente riceve 304 senza che il feed venga generato.
+    """
+    feed_token = (
+        CalendarToken.objects.select_related("user")
+        .filter(token=token, user__is_active=True)
+        .first()
+    )
+    if feed_token is None:
+        raise Http404("Calendario non trovato")
+    user = feed_token.user
+
+    etag = ical.etag(user)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = StreamingHttpResponse(ical.stream(user), content_type="text/calendar; charset=utf-8")
+    response["ETag"] = etag
+    # il client deve sempre ricontrollare: costa solo la richiesta condizionale
+    response["Cache-Control"] = "private, no-cache"
+    response["Content-Disposition"] = 'inline; filename="scuolahub.ics"'
+    return response
+
+
 from datetime import date, timedelta
 import calendar
 from decimal import Decimal
@@ -582,11 +837,21 @@ def event_delete(request, pk: int):
     Elimina un evento dal calendario.
     Per ora NON controlliamo l'owner dell'evento, perché il modello Event
     non ha ancora un campo 'user'. Qualsiasi utente autenticato può eliminare.
+    Per un evento ricorrente, con il campo "occurrence" (data ISO) si salta
+    solo quell'occorrenza; senza, si elimina l'intera serie.
     """
     event = get_object_or_404(Event, pk=pk)
 
     if request.method == "POST":
-        event.delete()
+        try:
+            occurrence = date.fromisoformat(request.POST.get("occurrence") or "")
+        except ValueError:
+            occurrence = None
+        if event.repeat and occurrence:
+            event.repeat_exceptions = sorted({*event.repeat_exceptions, occurrence.isoformat()})
+            event.save(update_fields=["repeat_exceptions"])
+        else:
+            event.delete()
         return redirect("calendar")
 
     # Se qualcuno arriva in GET, lo rimandiamo comunque al calendario
@@ -645,6 +910,82 @@ def documents_view(request):
     return render(request, "documents.html", context)
 
 
+def _upload_state(session):
+    state = {
+        "id": str(session.pk),
+        "url": reverse("document_upload", args=[session.pk]),
+        "offset": session.received,
+        "size": session.size,
+        "chunk_size": uploads.CHUNK_SIZE,
+    }
+    if session.document_id:
+        state["document"] = session.document_id
+    return state
+
+
+@login_required
+def document_upload_start(request):
+    """
+    Apre un caricamento a blocchi (projects/uploads.py) per i file grandi:
+    POST con title, filename, size, project_id, is_final, sha256 (facoltativo).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Metodo non consentito."}, status=405)
+
+    project_id = request.POST.get("project_id") or ""
+    project = Project.objects.filter(pk=project_id).first() if project_id.isdigit() else None
+    try:
+        size = int(request.POST.get("size") or 0)
+    except ValueError:
+        size = 0
+    try:
+        session = uploads.start(
+            request.user,
+            title=(request.POST.get("title") or "").strip(),
+            filename=request.POST.get("filename") or "",
+            size=size,
+            project=project,
+            is_final=bool(request.POST.get("is_final")),
+            expected_sha256=request.POST.get("sha256") or "",
+        )
+    except uploads.UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(_upload_state(session), status=201)
+
+
+@login_required
+def document_upload(request, pk):
+    """
+    GET: stato e offset confermato (per riprendere).
+    PUT: un blocco, corpo grezzo, header Upload-Offset; l'ultimo crea il documento.
+    DELETE: annulla il caricamento.
+    """
+    session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+
+    if request.method == "GET":
+        return JsonResponse(_upload_state(session))
+    if request.method == "DELETE":
+        try:
+            uploads.cancel(session)
+        except uploads.UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+        return JsonResponse({"deleted": True})
+    if request.method != "PUT":
+        return JsonResponse({"error": "Metodo non consentito."}, status=405)
+
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return JsonResponse({"error": "Header Upload-Offset o Content-Length non valido."}, status=400)
+    try:
+        uploads.write_chunk(session, offset, request, length)
+    except uploads.UploadError as e:
+        confirmed = UploadSession.objects.filter(pk=session.pk).values_list("received", flat=True).first()
+        return JsonResponse({"error": str(e), "offset": confirmed}, status=e.status)
+    return JsonResponse(_upload_state(session))
+
+
 @login_required
 def document_delete(request, pk: int):
     """
@@ -692,8 +1033,7 @@ def deleghe_view(request):
 
     projects = Project.objects.all().order_by("title")
     collaborators = User.objects.filter(is_active=True).order_by("username")
-    #deleghe = Delegation.objects.select_related("project", "collaborator").order_by("-created_at")
-    deleghe = Delegation.objects.all().order_by("-created_at")
+    deleghe = Delegation.objects.select_related("project", "collaborator").order_by("-created_at")
 
     if request.method == "POST" and request.POST.get("op") == "add_delegation":
         project_id = request.POST.get("project_id")
@@ -706,22 +1046,29 @@ def deleghe_view(request):
                 project = get_object_or_404(Project, pk=project_id)
                 collaborator = get_object_or_404(User, pk=collaborator_id)
 
-                # 1) creo la DELEGA con stato PENDING e nota salvata
-                delega = Delegation.objects.create(
-                    project=project,
-                    collaborator=collaborator,
-                    role_label=role_label,
-                    note=note,
-                    status="PENDING",
-                    creator=request.user,
-                )
-
-                # 2) creo la NOTIFICA AGGANCIATA alla delega
-                Notification.objects.create(
-                    user=collaborator,
-                    message=f"Ti è stata assegnata una delega sul progetto '{project.title}'.",
-                    delegation=delega,
-                )
+                with transaction.atomic():
+                    # 1) creo la DELEGA con stato PENDING e nota salvata
+                    delega = Delegation.objects.create(
+                        project=project,
+                        collaborator=collaborator,
+                        role_label=role_label,
+                        note=note,
+                        status="PENDING",
+                        creator=request.user,
+                    )
+
+                    # 2) creo la NOTIFICA AGGANCIATA alla delega
+                    notifica = Notification.objects.create(
+                        user=collaborator,
+                        message=f"Ti è stata assegnata una delega sul progetto '{project.title}'.",
+                        delegation=delega,
+                    )
+
+                    # 3) email accodata: la invia manage.py run_mail_worker
+                    if collaborator.email:
+                        outbox.enqueue(**delegations.assignment_email(
+                            collaborator, project.title, notifica, request.build_absolute_uri("/"),
+                        ))
 
                 messages.success(
                     request,
@@ -734,6 +1081,26 @@ def deleghe_view(request):
 
         return redirect("deleghe")
 
+    # Delega multipla: più progetti × più collaboratori in un'unica transazione
+    if request.method == "POST" and request.POST.get("op") == "add_delegations_batch":
+        result = delegations.create_batch(
+            request.user,
+            request.POST.getlist("project_ids"),
+            request.POST.getlist("collaborator_ids"),
+            role_label=(request.POST.get("role_label") or "").strip(),
+            note=(request.POST.get("note") or "").strip(),
+            base_url=request.build_absolute_uri("/"),
+        )
+        if result.created:
+            messages.success(request, f"{result.created} deleghe create e notificate.")
+        if result.skipped:
+            messages.warning(request, f"{result.skipped} deleghe già presenti non sono state duplicate.")
+        if result.missing_projects or result.missing_collaborators:
+            messages.error(request, "Alcuni progetti o collaboratori selezionati non esistono più.")
+        if not (result.created or result.skipped):
+            messages.error(request, "Seleziona almeno un progetto e un collaboratore.")
+        return redirect("deleghe")
+
     context = {
         "projects": projects,
         "collaborators": collaborators,
@@ -806,41 +1173,202 @@ def bando_detail(request, pk: int):
 from django.db.models import Q
 from .models import Call
 
+# Tag mostrati nei conteggi (i più frequenti)
+FACET_TAG_LIMIT = 20
+
+
 @login_required
 def bandi_list(request):
     """
     Elenco bandi/call:
     - filtro per programma
     - filtro per stato
-    - ricerca testuale su titolo / fonte / tag
+    - filtro esatto per uno o più tag (?tag=slug, ripetibile: tutti i tag)
+    - ricerca full-text su titolo / tag / fonte / note, per pertinenza
+      (projects/search.py); icontains sui database senza indice full-text
+    - conteggi per programma, stato e tag di tutti i bandi filtrati (una
+      query), anche oltre i MAX_RESULTS mostrati dalla ricerca
     """
     qs = Call.objects.all().order_by("deadline", "title")
 
     program = request.GET.get("program") or ""
     status = request.GET.get("status") or ""
+    selected_tags = list(dict.fromkeys(t for t in request.GET.getlist("tag") if t))
     q = (request.GET.get("q") or "").strip()
 
     if program:
         qs = qs.filter(program=program)
     if status:
         qs = qs.filter(status=status)
-    if q:
-        qs = qs.filter(
-            Q(title__icontains=q) |
-            Q(source__icontains=q) |
-            Q(tags__icontains=q)
-        )
+    for slug in selected_tags:
+        # un filtro per tag: il bando deve averli tutti
+        qs = qs.filter(normalized_tags__slug=slug)
+    qs = qs.prefetch_related("normalized_tags")
+
+    calls = search.search(qs, q) if q else None
+    if calls is None:
+        if q:
+            qs = qs.filter(
+                Q(title__icontains=q) |
+                Q(source__icontains=q) |
+                Q(tags__icontains=q)
+            )
+        calls = qs
+        counted = qs
+    else:
+        counted = search.matching(qs, q)
+    counts = facets.facet_counts(counted)
+
+    def toggle(key, value):
+        """URL dei filtri correnti con value attivato/disattivato per key."""
+        params = {"program": program, "status": status, "q": q}
+        tag_list = list(selected_tags)
+        if key == "tag":
+            tag_list = [t for t in tag_list if t != value] if value in tag_list else tag_list + [value]
+        else:
+            params[key] = "" if params[key] == value else value
+        query = [(k, v) for k, v in params.items() if v] + [("tag", t) for t in tag_list]
+        return f"?{urlencode(query)}" if query else request.path
+
+    facet_groups = [
+        ("Programma", [
+            {"label": label, "count": counts["program"][value], "url": toggle("program", value),
+             "selected": value == program}
+            for value, label in Call.PROGRAM_CHOICES if value in counts["program"]
+        ]),
+        ("Stato", [
+            {"label": label, "count": counts["status"][value], "url": toggle("status", value),
+             "selected": value == status}
+            for value, label in Call.STATUS_CHOICES if value in counts["status"]
+        ]),
+        ("Tag", [
+            {"label": name, "count": n, "url": toggle("tag", slug), "selected": slug in selected_tags}
+            for slug, name, n in counts["tag"][:FACET_TAG_LIMIT]
+        ]),
+    ]
 
     context = {
-        "calls": qs,
+        "calls": calls,
         "PROGRAM_CHOICES": Call.PROGRAM_CHOICES,
         "STATUS_CHOICES": Call.STATUS_CHOICES,
         "selected_program": program,
         "selected_status": status,
+        "selected_tags": selected_tags,
         "search_query": q,
+        "facet_groups": facet_groups,
     }
     return render(request, "calls/list.html", context)
 
+@login_required
+def notifications_inbox(request):
+    """
+    Tutte le notifiche dell'utente, dalla più recente, a pagine con cursore
+    su (created_at, id). In POST:
+    - op=mark_selected: segna come lette le notifiche spuntate (al massimo una pagina)
+    - op=mark_all: segna come lette tutte le non lette
+    Entrambe sono un solo UPDATE, senza caricare le righe.
+    """
+    if request.method == "POST":
+        op = request.POST.get("op", "")
+        unread_qs = Notification.objects.filter(user=request.user, is_read=False)
+
+        if op == "mark_selected":
+            ids = [int(v) for v in request.POST.getlist("ids") if v.isdigit()][:pagination.PAGE_SIZE]
+            updated = unread_qs.filter(pk__in=ids).update(is_read=True) if ids else 0
+        elif op == "mark_all":
+            updated = unread_qs.update(is_read=True)
+        else:
+            updated = 0
+
+        # update() non emette signals: il contatore si aggiorna qui
+        unread.adjust(request.user.pk, -updated)
+        if updated:
+            messages.success(request, f"{updated} notifiche segnate come lette.")
+
+        # si resta sulla stessa pagina
+        back = {k: v for k, v in request.GET.items() if k in ("after", "before")}
+        return redirect(f"{reverse('notifications_inbox')}?{urlencode(back)}" if back else "notifications_inbox")
+
+    page = pagination.keyset_page(
+        Notification.objects.filter(user=request.user),
+        ["created_at", "id"],
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+    next_url = f"?{urlencode({'after': page.next_cursor})}" if page.next_cursor else None
+    prev_url = f"?{urlencode({'before': page.prev_cursor})}" if page.prev_cursor else None
+
+    return render(request, "notifications/inbox.html", {
+        "notifications": page.items,
+        "next_url": next_url,
+        "prev_url": prev_url,
+    })
+
+
+@login_required
+def unread_notifications_json(request):
+    """Badge notifiche: contatore in cache, nessuna query sulle notifiche."""
+    return JsonResponse({"unread": unread.unread_count(request.user.pk)})
+
+
+# Commento SSE periodico: tiene aperta la connessione attraverso proxy e
+# bilanciatori e fa accorgere il server dei client disconnessi
+SSE_KEEPALIVE_SECONDS = 25
+SSE_RETRY_MS = 5000
+# Senza ASGI (NOTIFICATIONS_SSE spento) il client riprova dopo un minuto,
+# come il polling del badge
+SSE_DISABLED_RETRY_MS = 60000
+
+
+async def notifications_stream(request):
+    """
+    Stream Server-Sent Events delle nuove notifiche dell'utente.
+    Vista asincrona: una connessione inattiva è solo una coda asyncio in
+    attesa, senza thread né query. Alla riconnessione (header Last-Event-ID)
+    invia prima le notifiche perse nel frattempo.
+
+    Sotto WSGI uno stream infinito terrebbe occupato un worker per ogni
+    scheda aperta: se NOTIFICATIONS_SSE è spento la risposta si chiude
+    subito, con il solo intervallo di riconnessione.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden("Accesso richiesto.")
+
+    if not settings.NOTIFICATIONS_SSE:
+        response = HttpResponse(f"retry: {SSE_DISABLED_RETRY_MS}\n\n", content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or 0)
+    except ValueError:
+        last_id = 0
+
+    async def events():
+        queue = live.hub.subscribe(user.pk)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if last_id:
+                missed = Notification.objects.filter(user_id=user.pk, pk__gt=last_id).order_by("pk")
+                async for n in missed[:pagination.PAGE_SIZE]:
+                    yield live.format_event(live.payload(n))
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield live.format_event(data)
+        finally:
+            live.hub.unsubscribe(user.pk, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"   # niente buffering su nginx
+    return response
+
+
 @login_required
 def notification_read(request, pk: int):
     """
@@ -876,7 +1404,9 @@ def notification_detail(request, pk: int):
     # 1. Recupero notifica (filtrata anche per l'utente, per sicurezza)
     # Assicurati che l'utente loggato sia il destinatario
     notification = get_object_or_404(
-        Notification.objects.filter(user=request.user),
+        Notification.objects.filter(user=request.user).select_related(
+            "delegation__project", "delegation__collaborator"
+        ),
         pk=pk
     )
 
@@ -908,32 +1438,46 @@ def notification_detail(request, pk: int):
 
 
         if action == "accept" and can_accept:
-            delegation.status = "CONFIRMED"
-            delegation.save(update_fields=["status"])
+            # stato della delega, notifica ed email accodata: tutto o niente
+            with transaction.atomic():
+                delegation.status = "CONFIRMED"
+                delegation.save(update_fields=["status"])
 
 
-            # 2. NOTIFICA ALL'ADMIN
-            Notification.objects.create(
-                user=admin_recipient,  # Usa il nome pulito
-                message=f"✅ La delega per '{delegation.project.title}' è stata **ACCETTATA** dal professore {user_collaborator.username}.",
-                delegation=delegation,
-            )
+                # 2. NOTIFICA ALL'ADMIN
+                risposta = Notification.objects.create(
+                    user=admin_recipient,  # Usa il nome pulito
+                    message=f"✅ La delega per '{delegation.project.title}' è stata **ACCETTATA** dal professore {user_collaborator.username}.",
+                    delegation=delegation,
+                )
+                # email al delegante, accodata nell'outbox
+                if admin_recipient.email:
+                    outbox.enqueue(**delegations.answer_email(
+                        delegation, True, risposta, request.build_absolute_uri("/"),
+                    ))
 
             messages.success(request, "Hai accettato la delega.")
             # Crea notifica di risposta all'Admin qui...
             return redirect("dashboard")
 
         if action == "reject" and can_reject:
-            delegation.status = "REJECTED"
-            delegation.save(update_fields=["status"])
+            # stato della delega, notifica ed email accodata: tutto o niente
+            with transaction.atomic():
+                delegation.status = "REJECTED"
+                delegation.save(update_fields=["status"])
 
 
-            # 2. NOTIFICA ALL'ADMIN
-            Notification.objects.create(
-                user=admin_recipient,
-                message=f"❌ La delega per '{delegation.project.title}' è stata **RIFIUTATA** dal professore {user_collaborator.username}.",
-                delegation=delegation,
-            )
+                # 2. NOTIFICA ALL'ADMIN
+                risposta = Notification.objects.create(
+                    user=admin_recipient,
+                    message=f"❌ La delega per '{delegation.project.title}' è stata **RIFIUTATA** dal professore {user_collaborator.username}.",
+                    delegation=delegation,
+                )
+                # email al delegante, accodata nell'outbox
+                if admin_recipient.email:
+                    outbox.enqueue(**delegations.answer_email(
+                        delegation, False, risposta, request.build_absolute_uri("/"),
+                    ))
 
             messages.success(request, "Hai rifiutato la delega.")
             # Crea notifica di risposta all'Admin qui...
@@ -75,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'projects.context_processors.unread_notifications',
             ],
         },
     },
@@ -82,6 +83,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'scuolahub.wsgi.application'
 
+# Notifiche in tempo reale (SSE, projects/live.py): solo con il server ASGI,
+#     NOTIFICATIONS_SSE=True gunicorn scuolahub.asgi:application -k uvicorn.workers.UvicornWorker
+# Con WSGI (gunicorn scuolahub.wsgi, runserver) ogni stream aperto occuperebbe
+# un worker: la dashboard aggiorna il badge con il polling.
+NOTIFICATIONS_SSE = os.getenv("NOTIFICATIONS_SSE", "False") == "True"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -96,6 +103,20 @@ DATABASES = {
 }
 
 
+# Cache (dashboard, calendario, contatori). Con la cache in memoria del processo
+# (il default) le invalidazioni arriverebbero a un solo worker, quindi quei
+# blocchi non si mettono in cache (vedi projects/versioned_cache.py); con una
+# cache condivisa si attivano da soli, es.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("CACHE_LOCATION", "scuolahub"),
+    }
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -144,6 +165,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
+# In sviluppo: conteggio query per richiesta e segnalazione dei pattern N+1
+# (vedi projects/queryinspect.py per i budget per vista)
+if DEBUG:
+    MIDDLEWARE.append('projects.middleware.QueryInspectorMiddleware')
+
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-only-unsafe-key")
 CSRF_TRUSTED_ORIGINS = ['https://*.onrender.com']
 
@@ -154,8 +180,10 @@ import os
 if os.environ.get("RENDER"):
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 else:
-    # In locale puoi usare davvero Gmail se vuoi testare l'invio
-    EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    # In locale puoi usare davvero Gmail se vuoi testare l'invio, oppure
+    # EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend per vedere
+    # a terminale le email consegnate da manage.py run_mail_worker
+    EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
     EMAIL_HOST = "smtp.gmail.com"
     EMAIL_PORT = 587
     EMAIL_USE_TLS = True
@@ -14,15 +14,21 @@ urlpatterns = [
     # Progetti
     path('progetti/', pviews.projects_list, name='projects_list'),
     path('progetti/<int:pk>/', pviews.project_detail, name='project_detail'),
+    path('progetti/<int:pk>/spese/importa/', pviews.expense_import_view, name='expense_import'),
+    path('progetti/<int:pk>/spese/export.csv', pviews.expenses_export_csv, name='expenses_export_csv'),
     path('scuole/<int:school_id>/progetti/', pviews.projects_by_school, name='projects_by_school'),
 
     # Sezioni (per ora placeholder)
     path('calendario/view/', pviews.calendar_view, name='calendar_view'),
     path('calendario/', pviews.calendar_view, name='calendar'),
+    path('calendario/settimana/', pviews.calendar_range_view, {'mode': 'week'}, name='calendar_week'),
+    path('calendario/agenda/', pviews.calendar_range_view, {'mode': 'agenda'}, name='calendar_agenda'),
+    path('calendario/eventi.json', pviews.calendar_events_json, name='calendar_events_json'),
+    path('calendario/feed/', pviews.calendar_feed_token, name='calendar_feed_token'),
+    path('calendario/feed/<str:token>.ics', pviews.calendar_ics, name='calendar_ics'),
 # Eliminazione evento calendario
     path('eventi/<int:pk>/elimina/', pviews.event_delete, name='event_delete'),
 
-    path('documenti/', TemplateView.as_view(template_name='documents.html'), name='documents'),
     path('impostazioni/', TemplateView.as_view(template_name='settings.html'), name='settings'),
 
     # Auth (login/logout)
@@ -33,6 +39,8 @@ urlpatterns = [
     path('spese/<int:pk>/elimina/', pviews.expense_delete, name='expense_delete'),
     path('limiti/<int:pk>/elimina/', pviews.limit_delete, name='limit_delete'),
     path('limiti/<int:pk>/modifica/', pviews.limit_update, name='limit_update'),
+    path('limiti/report/', pviews.limits_report, name='limits_report'),
+    path('limiti/report.json', pviews.limits_report_json, name='limits_report_json'),
 
 
     path("deleghe/", pviews.deleghe_view, name="deleghe"),
@@ -41,6 +49,8 @@ urlpatterns = [
     # DOCUMENTI
     path('documenti/', pviews.documents_view, name='documents'),
     path('documenti/<int:pk>/elimina/', pviews.document_delete, name='document_delete'),
+    path('documenti/caricamenti/', pviews.document_upload_start, name='document_upload_start'),
+    path('documenti/caricamenti/<uuid:pk>/', pviews.document_upload, name='document_upload'),
 
     path("mie-deleghe/", pviews.my_delegations_view, name="my_delegations"),
     path('deleghe/<int:pk>/conferma/', pviews.delegation_confirm, name='delegation_confirm'),
@@ -50,7 +60,10 @@ urlpatterns = [
 
     path('bandi/<int:pk>/', pviews.bando_detail, name='bando_detail'),
 
+    path('notifiche/', pviews.notifications_inbox, name='notifications_inbox'),
     path('notifiche/<int:pk>/', pviews.notification_detail, name='notification_detail'),
+    path('notifiche/non-lette.json', pviews.unread_notifications_json, name='unread_notifications_json'),
+    path('notifiche/stream/', pviews.notifications_stream, name='notifications_stream'),
     path("deleghe/<int:pk>/accetta/", pviews.accept_delegation, name="accept_delegation"),
 
 